@@ -0,0 +1,8 @@
+"""
+Meta
+====
+    $Id$
+    $DateTime$
+    $Author$
+    $Change$
+"""
@@ -0,0 +1,223 @@
+'''
+A small threaded HTTP(S) server answering slack API requests locally.
+
+Requests to /api/<method> are parsed into an L{APIRequest} and handed to an
+API object, which answers them with a status, a JSON payload and, if it
+needs them, extra response headers. Request
+bodies are only parsed when the API asks for them, so an API can also just
+drain a large upload.
+'''
+
+import BaseHTTPServer
+import SocketServer
+import cgi
+import json
+import ssl
+import threading
+import urlparse
+
+_READ_SIZE = 64 * 1024
+
+
+class APIRequest(object):
+    '''
+    One request to a slack API method.
+
+    @ivar http_method: The HTTP method, e.g. "POST"
+    @ivar api_method: The API method, e.g. "files.list"
+    @ivar query: The URL parameters
+    @ivar headers: The request headers
+    '''
+
+    def __init__(self, handler, http_method, api_method, query):
+        self._handler = handler
+        self.http_method = http_method
+        self.api_method = api_method
+        self.query = query
+        self.headers = handler.headers
+        self._form = None
+        self._remaining = int(handler.headers.get('content-length') or 0)
+
+    def form(self):
+        '''
+        Parses the body, urlencoded or multipart.
+
+        @return: The parsed form, empty if there is no body.
+        @rtype: C{cgi.FieldStorage}
+        '''
+        if self._form is None:
+            environ = {'REQUEST_METHOD': 'POST',
+                       'CONTENT_TYPE': self.headers.get(
+                           'content-type', 'application/octet-stream'),
+                       'CONTENT_LENGTH': str(self._remaining)}
+            self._form = cgi.FieldStorage(fp=self._handler.rfile,
+                                          headers=self.headers,
+                                          environ=environ,
+                                          keep_blank_values=True)
+            self._remaining = 0
+        return self._form
+
+    def params(self):
+        '''
+        Returns the URL parameters and the plain form fields of the body,
+        slack accepts arguments in either.
+
+        @rtype: dict
+        '''
+        params = dict(self.query)
+        if self._form is None and not self._remaining:
+            return params
+        form = self.form()
+        if form.list:
+            for field in form.list:
+                if field.filename is None:
+                    params[field.name] = field.value
+        return params
+
+    def drain(self):
+        '''
+        Reads and drops the body without parsing it.
+
+        @return: The number of bytes read.
+        @rtype: int
+        '''
+        read = 0
+        rfile = self._handler.rfile
+        while self._remaining > 0:
+            data = rfile.read(min(_READ_SIZE, self._remaining))
+            if not data:
+                break
+            self._remaining -= len(data)
+            read += len(data)
+        return read
+
+
+class SlackAPIHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    '''
+    Hands every request to the API of the server and writes its answer.
+    '''
+    protocol_version = 'HTTP/1.1'
+    # the status line, headers and body go out in separate writes, with
+    # Nagle's algorithm each response would wait for a delayed ACK
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+    def _dispatch(self, http_method):
+        url = urlparse.urlsplit(self.path)
+        query = dict(urlparse.parse_qsl(url.query, keep_blank_values=True))
+        api_method = url.path.rstrip('/').rsplit('/', 1)[-1]
+        request = APIRequest(self, http_method, api_method, query)
+        headers = {}
+        try:
+            answer = self.server.api.handle(request)
+            status, payload = answer[:2]
+            if len(answer) > 2:
+                headers = answer[2]
+        except Exception as err:
+            self.server.errors.append(err)
+            status, payload = 500, {'ok': False, 'error': 'internal_error'}
+        # whatever the API didn't read must go, or it would be taken for
+        # the next request on this connection
+        request.drain()
+        body = payload if isinstance(payload, str) else json.dumps(payload)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class SlackAPIServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    '''
+    Serves an API object on a local port, in a background thread.
+
+    >>> with SlackAPIServer(api) as server:
+    ...     slack.uri_base = lambda: server.uri_base
+
+    @ivar api: Object with a C{handle(request)} method returning a
+               (status, payload) tuple, the payload a dict or a string,
+               or a (status, payload, headers) tuple to send more headers
+    @ivar errors: Exceptions raised by the API while handling requests
+    '''
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 512
+
+    def __init__(self, api, host='127.0.0.1', port=0, certfile=None,
+                 keyfile=None):
+        '''
+        Creates a new server listening on host and port, with TLS if a
+        certificate is given.
+
+        @param api: The API answering the requests.
+        @param host: The address to listen on.
+        @type host: str
+        @param port: The port to listen on, 0 picks a free one.
+        @type port: int
+        @param certfile: PEM certificate to serve HTTPS with.
+        @type certfile: str
+        @param keyfile: PEM private key of the certificate.
+        @type keyfile: str
+        '''
+        BaseHTTPServer.HTTPServer.__init__(self, (host, port),
+                                           SlackAPIHandler)
+        self.api = api
+        self.errors = []
+        self._tls = certfile is not None
+        if self._tls:
+            self.socket = ssl.wrap_socket(self.socket, certfile=certfile,
+                                          keyfile=keyfile, server_side=True)
+        self._thread = None
+
+    @property
+    def uri_base(self):
+        '''
+        The URI base to point a slack deployment at, e.g.
+        "http://127.0.0.1:8080/".
+
+        @rtype: str
+        '''
+        host, port = self.server_address[:2]
+        return '{s}://{h}:{p}/'.format(s='https' if self._tls else 'http',
+                                       h=host, p=port)
+
+    def start(self):
+        '''
+        Starts serving in a background thread.
+
+        @return: This server.
+        '''
+        self._thread = threading.Thread(target=self.serve_forever,
+                                        name='slack api server')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        '''
+        Stops serving and closes the socket.
+        '''
+        if self._thread is not None:
+            self.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
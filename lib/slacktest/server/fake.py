@@ -0,0 +1,338 @@
+'''
+An in-memory fake of the slack files API, served by L{SlackAPIServer}.
+
+Every token is a workspace of its own, with its own files, so tests that
+each create a workspace never see each other's files. files.upload (a
+multipart file or text content), files.list (type, user and time filters,
+paging), files.info and files.delete behave as slack documents them,
+errors included: they answer HTTP 200 with C{{"ok": false, "error": ...}}.
+files.uploadChunk and files.uploadDone are not slack methods, they serve
+the chunked upload protocol L{ChunkedUpload} assumes.
+
+>>> api = FakeSlackAPI()
+>>> with SlackAPIServer(api) as server:
+...     workspace = api.create_workspace()
+...     slack.uri_base = lambda: server.uri_base
+'''
+
+import itertools
+import mimetypes
+import os
+import threading
+import time
+from collections import OrderedDict
+
+FILE_URL = 'https://files.slack.com/files-pri/{team}-{id}/{name}'
+THUMB_SIZES = (64, 80, 160, 360, 480)
+# filetype of an extension, where it is not the extension itself
+FILETYPES = {'txt': 'text', 'py': 'python', 'js': 'javascript',
+             'md': 'markdown', 'jpeg': 'jpg', 'htm': 'html',
+             'sh': 'shell', 'yml': 'yaml', 'rb': 'ruby'}
+PRETTY_TYPES = {'text': 'Plain Text', 'png': 'PNG', 'jpg': 'JPEG',
+                'gif': 'GIF', 'pdf': 'PDF', 'zip': 'Zip', 'docx': 'Word '
+                'Document', 'python': 'Python', 'binary': 'Binary'}
+# the files.list types filter, what each type matches
+TYPES = {
+    'all': lambda record: True,
+    'spaces': lambda record: record['filetype'] == 'space',
+    'snippets': lambda record: record['mode'] == 'snippet',
+    'images': lambda record: record['mimetype'].startswith('image/'),
+    'gdocs': lambda record: record['filetype'].startswith('gdoc'),
+    'zips': lambda record: record['filetype'] == 'zip',
+    'pdfs': lambda record: record['filetype'] == 'pdf',
+}
+DEFAULT_COUNT = 100
+MAX_COUNT = 1000
+
+
+class Workspace(object):
+    '''
+    The files of one token.
+
+    @ivar token: The token the workspace is accessed with
+    @ivar team_id: The id of the team
+    @ivar user_id: The id of the user files are uploaded as
+    @ivar files: Maps the id of each file to its record, oldest first
+    @ivar contents: Maps the id of each file to its data
+    @ivar chunks: Maps the id of each unfinished chunked upload to its
+                  chunks by index
+    @ivar revoked: Whether the token has been revoked
+    '''
+
+    def __init__(self, token, team_id, user_id):
+        self.token = token
+        self.team_id = team_id
+        self.user_id = user_id
+        self.files = OrderedDict()
+        self.contents = {}
+        self.chunks = {}
+        self.revoked = False
+        self.lock = threading.Lock()
+
+
+class FakeSlackAPI(object):
+    '''
+    The API object of a L{SlackAPIServer} serving the fake.
+
+    @ivar workspaces: Maps each token to its L{Workspace}
+    '''
+
+    def __init__(self):
+        self.workspaces = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._methods = {'files.upload': self._upload,
+                         'files.list': self._list,
+                         'files.info': self._info,
+                         'files.delete': self._delete,
+                         'files.uploadChunk': self._upload_chunk,
+                         'files.uploadDone': self._upload_done}
+
+    def create_workspace(self, token=None):
+        '''
+        Creates a new empty workspace.
+
+        @param token: The token of the workspace, a new one if None.
+        @type token: str
+        @rtype: L{Workspace}
+        '''
+        number = self._next_id()
+        workspace = Workspace(token or 'xoxp-fake-{n}'.format(n=number),
+                              'T{n:08d}'.format(n=number),
+                              'U{n:08d}'.format(n=number))
+        with self._lock:
+            self.workspaces[workspace.token] = workspace
+        return workspace
+
+    def remove_workspace(self, token):
+        '''
+        Forgets a workspace and its files, its token is invalid afterwards.
+
+        @param token: The token of the workspace.
+        @type token: str
+        '''
+        with self._lock:
+            self.workspaces.pop(token, None)
+
+    def revoke(self, token):
+        '''
+        Revokes the token of a workspace, requests with it fail with
+        token_revoked from now on.
+
+        @param token: The token of the workspace.
+        @type token: str
+        '''
+        with self._lock:
+            self.workspaces[token].revoked = True
+
+    def add_file(self, token, name, data, mode='hosted'):
+        '''
+        Puts a file in a workspace as if it had been uploaded, to seed it.
+
+        @param token: The token of the workspace.
+        @type token: str
+        @param name: The file name.
+        @type name: str
+        @param data: The content.
+        @type data: str
+        @param mode: "hosted" for an uploaded file, "snippet" for content.
+        @type mode: str
+        @return: The record of the file.
+        @rtype: dict
+        '''
+        with self._lock:
+            workspace = self.workspaces[token]
+        return self._add_file(workspace, {}, name, mode, data)['file']
+
+    def handle(self, request):
+        '''
+        Answers a request.
+
+        @type request: L{APIRequest}
+        @return: (status, payload)
+        @rtype: tuple
+        '''
+        method = self._methods.get(request.api_method)
+        if method is None:
+            return 200, _error('unknown_method')
+        params = request.params()
+        token = params.get('token') or _bearer(request.headers)
+        if not token:
+            return 200, _error('not_authed')
+        with self._lock:
+            workspace = self.workspaces.get(token)
+        if workspace is None:
+            return 200, _error('invalid_auth')
+        if workspace.revoked:
+            return 200, _error('token_revoked')
+        return 200, method(workspace, request, params)
+
+    def _upload(self, workspace, request, params):
+        name = params.get('filename')
+        mode = 'snippet'
+        if 'content' in params:
+            data = params['content']
+        else:
+            upload = _file_field(request, 'file')
+            if upload is None:
+                return _error('no_file_data')
+            data = upload.value
+            name = name or upload.filename
+            mode = 'hosted'
+        return self._add_file(workspace, params, name or 'Untitled', mode,
+                              data)
+
+    def _add_file(self, workspace, params, name, mode, data):
+        filetype = params.get('filetype') or _filetype(name, mode)
+        file_id = 'F{n:08d}'.format(n=self._next_id())
+        created = int(time.time())
+        url = FILE_URL.format(team=workspace.team_id, id=file_id, name=name)
+        mimetype = (mimetypes.guess_type(name)[0] or
+                    ('text/plain' if mode == 'snippet'
+                     else 'application/octet-stream'))
+        channels = [c for c in params.get('channels', '').split(',') if c]
+        record = {'id': file_id, 'created': created, 'timestamp': created,
+                  'name': name, 'title': params.get('title') or name,
+                  'mimetype': mimetype, 'filetype': filetype,
+                  'pretty_type': PRETTY_TYPES.get(filetype, filetype.upper()),
+                  'user': workspace.user_id, 'mode': mode,
+                  'editable': mode == 'snippet', 'is_external': False,
+                  'external_type': '', 'is_public': bool(channels),
+                  'size': len(data), 'url_private': url,
+                  'url_private_download': url.replace(
+                      '/files-pri/', '/files-pri/download/', 1),
+                  'permalink': 'https://fake.slack.com/files/{u}/{i}/{n}'
+                               .format(u=workspace.user_id, i=file_id,
+                                       n=name),
+                  'channels': channels, 'groups': [], 'ims': [],
+                  'comments_count': 0}
+        if mimetype.startswith('image/'):
+            thumb = FILE_URL.format(team=workspace.team_id, id=file_id,
+                                    name=name.lower())
+            for size in THUMB_SIZES:
+                root, ext = os.path.splitext(thumb)
+                record['thumb_{s}'.format(s=size)] = '{r}_{s}{e}'.format(
+                    r=root, s=size, e=ext)
+        with workspace.lock:
+            workspace.files[file_id] = record
+            workspace.contents[file_id] = data
+        return {'ok': True, 'file': record}
+
+    def _upload_chunk(self, workspace, request, params):
+        upload = _file_field(request, 'file')
+        if upload is None:
+            return _error('no_file_data')
+        try:
+            index = int(params['chunk'])
+            offset = int(params['offset'])
+        except (KeyError, ValueError):
+            return _error('invalid_arg_type')
+        with workspace.lock:
+            chunks = workspace.chunks.setdefault(params.get('upload_id'), {})
+            chunks[index] = (offset, upload.value)
+        return {'ok': True}
+
+    def _upload_done(self, workspace, request, params):
+        with workspace.lock:
+            chunks = workspace.chunks.get(params.get('upload_id'))
+        if chunks is None:
+            return _error('upload_not_found')
+        try:
+            count, size = int(params['chunks']), int(params['size'])
+        except (KeyError, ValueError):
+            return _error('invalid_arg_type')
+        if sorted(chunks) != range(count):
+            return _error('upload_incomplete')
+        parts = []
+        position = 0
+        for index in range(count):
+            offset, part = chunks[index]
+            if offset != position:
+                return _error('upload_incomplete')
+            parts.append(part)
+            position += len(part)
+        if position != size:
+            return _error('upload_incomplete')
+        data = ''.join(parts)
+        with workspace.lock:
+            workspace.chunks.pop(params['upload_id'], None)
+        return self._add_file(workspace, params,
+                              params.get('filename') or 'Untitled', 'hosted',
+                              data)
+
+    def _list(self, workspace, request, params):
+        try:
+            count = min(int(params.get('count', DEFAULT_COUNT)), MAX_COUNT)
+            page = max(int(params.get('page', 1)), 1)
+            ts_from = float(params.get('ts_from', 0))
+            ts_to = float(params.get('ts_to', 'inf'))
+        except ValueError:
+            return _error('invalid_arg_type')
+        if count < 1:
+            count = DEFAULT_COUNT
+        matches = []
+        for name in params.get('types', 'all').split(','):
+            if name not in TYPES:
+                return _error('unknown_type')
+            matches.append(TYPES[name])
+        user = params.get('user')
+        channel = params.get('channel')
+        with workspace.lock:
+            records = [r for r in reversed(workspace.files.values())
+                       if any(match(r) for match in matches)
+                       and (not user or r['user'] == user)
+                       and (not channel or channel in r['channels'])
+                       and ts_from <= r['created'] <= ts_to]
+        total = len(records)
+        start = (page - 1) * count
+        return {'ok': True, 'files': records[start:start + count],
+                'paging': {'count': count, 'total': total, 'page': page,
+                           'pages': (total + count - 1) // count}}
+
+    def _info(self, workspace, request, params):
+        with workspace.lock:
+            record = workspace.files.get(params.get('file'))
+        if record is None:
+            return _error('file_not_found')
+        return {'ok': True, 'file': record, 'comments': [],
+                'paging': {'count': 100, 'total': 0, 'page': 1, 'pages': 0}}
+
+    def _delete(self, workspace, request, params):
+        file_id = params.get('file')
+        with workspace.lock:
+            if workspace.files.pop(file_id, None) is None:
+                return _error('file_not_found')
+            workspace.contents.pop(file_id, None)
+        return {'ok': True}
+
+    def _next_id(self):
+        with self._lock:
+            return next(self._ids)
+
+
+def _error(error):
+    return {'ok': False, 'error': error}
+
+
+def _bearer(headers):
+    '''
+    Returns the token of a "Bearer" authorization header, if any.
+    '''
+    scheme, _, token = headers.get('authorization', '').partition(' ')
+    return token.strip() if scheme.lower() == 'bearer' else None
+
+
+def _file_field(request, name):
+    form = request.form()
+    if form.list:
+        for field in form.list:
+            if field.name == name and field.filename is not None:
+                return field
+    return None
+
+
+def _filetype(name, mode):
+    extension = os.path.splitext(name)[1][1:].lower()
+    if not extension:
+        return 'text' if mode == 'snippet' else 'binary'
+    return FILETYPES.get(extension, extension)
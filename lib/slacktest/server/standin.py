@@ -0,0 +1,66 @@
+'''
+A stateless stand-in for files.upload, files.list and files.delete that
+answers with canned responses, for measuring the client side.
+'''
+
+import json
+
+
+class StandInAPI(object):
+    '''
+    Answers every files.* request with a fixed successful response. Upload
+    bodies are read and dropped, files.list always returns the same page.
+
+    >>> server = SlackAPIServer(StandInAPI(list_size=1000)).start()
+
+    @ivar received: Number of body bytes received
+    '''
+
+    def __init__(self, list_size=100):
+        '''
+        Creates a new stand-in.
+
+        @param list_size: Number of files on the files.list page.
+        @type list_size: int
+        '''
+        self.received = 0
+        self._list = json.dumps(canned_list(list_size))
+        self._upload = json.dumps({'ok': True, 'file': _file(0)})
+
+    def handle(self, request):
+        '''
+        @type request: L{APIRequest}
+        @return: (status, payload)
+        @rtype: tuple
+        '''
+        if request.api_method == 'files.upload':
+            self.received += request.drain()
+            return 200, self._upload
+        if request.api_method == 'files.list':
+            return 200, self._list
+        if request.api_method == 'files.delete':
+            return 200, '{"ok": true}'
+        return 404, {'ok': False, 'error': 'unknown_method'}
+
+
+def canned_list(count):
+    '''
+    Returns a files.list response with count files.
+
+    @param count: The number of files.
+    @type count: int
+    @rtype: dict
+    '''
+    return {'ok': True, 'files': [_file(i) for i in range(count)],
+            'paging': {'count': count, 'total': count, 'page': 1,
+                       'pages': 1}}
+
+
+def _file(index):
+    name = 'file{0}.txt'.format(index)
+    return {'id': 'F{0:08d}'.format(index), 'name': name, 'title': name,
+            'filetype': 'text', 'mimetype': 'text/plain', 'user': 'U0001',
+            'size': 1024, 'created': 1476316800 + index,
+            'url_private': 'https://files.slack.com/' + name,
+            'thumb_64': 'https://files.slack.com/thumb_64/' + name,
+            'channels': [], 'comments_count': 0}
@@ -0,0 +1,317 @@
+'''
+Chunked, resumable upload of large files over a RESTConnector.
+
+A file is split into fixed size chunks and every chunk is posted as its own
+multipart request, with the upload id, the chunk index and its offset as
+form fields. Completed chunks are recorded in a journal file on disk, so an
+upload that failed half way through (dropped connection, SSLError, ...) is
+resumed from the first incomplete chunk by running it again.
+
+Slack has no chunked upload method. The protocol is one this module
+assumes, and L{FakeSlackAPI} serves it as files.uploadChunk and
+files.uploadDone:
+
+  - every chunk is a multipart POST to the chunk URI, with the fields
+    upload_id, filename, chunks, size, chunk (its index) and offset, and
+    the data as the file part; C{{"ok": true}} accepts it
+  - once all chunks are accepted, the complete URI gets the same fields
+    but no chunk, urlencoded, and answers like files.upload
+
+A server implementing it has to store chunks by upload id and may get a
+chunk more than once.
+'''
+
+import json
+import os
+import tempfile
+import threading
+import uuid
+import hashlib
+from multiprocessing.pool import ThreadPool
+from testingframework.log import Logging
+from testingframework.connector.response import extract_keys
+from slacktest.util.multipart_formdata import encode_multipart_formdata_stream, \
+    FileRange
+
+
+class ChunkedUpload(Logging):
+    '''
+    Uploads one file in chunks with a bounded number of chunks in flight.
+
+    >>> upload = ChunkedUpload(restconn, 'slack.com/api/files.uploadChunk',
+    ...                        path, urlparam={'token': token},
+    ...                        complete_uri='slack.com/api/files.uploadDone')
+    >>> response, content = upload.run()
+
+    @cvar CHUNK_SIZE: Default chunk size in bytes
+    @cvar CONCURRENCY: Default number of chunks sent at the same time
+    @cvar RETRIES: Default number of attempts per chunk within one run
+    @ivar _done: Indices of the chunks the server accepted
+    '''
+    CHUNK_SIZE = 8 * 1024 * 1024
+    CONCURRENCY = 4
+    RETRIES = 3
+
+    def __init__(self, connector, uri, path, chunk_size=None,
+                 concurrency=None, journal_path=None, urlparam=None,
+                 complete_uri=None, filename=None):
+        '''
+        Creates a new chunked upload, picking up the journal of an earlier
+        unfinished upload of the same file if there is one.
+
+        @param connector: The connector to send the chunks with.
+        @type connector: L{RESTConnector}
+        @param uri: URI of the endpoint receiving the chunks.
+        @type uri: str
+        @param path: The file to upload.
+        @type path: str
+        @param chunk_size: Chunk size in bytes.
+        @type chunk_size: int
+        @param concurrency: Max number of chunks sent at the same time.
+        @type concurrency: int
+        @param journal_path: Where to keep the journal, defaults to a file
+                             in the temp directory named after the path.
+        @type journal_path: str
+        @param urlparam: URL parameters sent with every request.
+        @type urlparam: dict
+        @param complete_uri: URI called once all chunks are uploaded.
+        @type complete_uri: str
+        @param filename: File name sent to the server, defaults to the
+                         base name of the path.
+        @type filename: str
+        '''
+        Logging.__init__(self)
+        self._connector = connector
+        self._uri = uri
+        self._path = os.path.abspath(path)
+        self._filename = filename or os.path.basename(path)
+        self._chunk_size = chunk_size or self.CHUNK_SIZE
+        self._concurrency = concurrency or self.CONCURRENCY
+        self._urlparam = dict(urlparam or {})
+        self._complete_uri = complete_uri
+        self._journal_path = journal_path or _default_journal_path(self._path)
+        self._lock = threading.Lock()
+
+        stat = os.stat(self._path)
+        self._size = stat.st_size
+        self._mtime = stat.st_mtime
+        self._chunks = max(1, -(-self._size // self._chunk_size))
+        self._upload_id = uuid.uuid4().hex
+        self._done = set()
+        self._load_journal()
+
+    @property
+    def upload_id(self):
+        '''
+        The id of this upload, kept across resumed runs.
+
+        @rtype: str
+        '''
+        return self._upload_id
+
+    @property
+    def chunks(self):
+        '''
+        The total number of chunks.
+
+        @rtype: int
+        '''
+        return self._chunks
+
+    @property
+    def pending_chunks(self):
+        '''
+        The indices of the chunks not uploaded yet, in file order. The first
+        one is where a resumed upload starts.
+
+        @rtype: list
+        '''
+        with self._lock:
+            return [i for i in range(self._chunks) if i not in self._done]
+
+    def run(self):
+        '''
+        Uploads all pending chunks and then calls the complete URI.
+
+        @return: The (response, content) of the complete URI, or None if
+                 there is no complete URI.
+        @raise ChunkUploadError: If a chunk still failed after the retries.
+                                 The journal is kept, so calling L{run}
+                                 again resumes the upload.
+        '''
+        pending = self.pending_chunks
+        if pending:
+            self.logger.info('Uploading {n} of {total} chunks of {path}, '
+                             'starting at chunk {first}'.format(
+                                 n=len(pending), total=self._chunks,
+                                 path=self._path, first=pending[0]))
+        workers = ThreadPool(min(self._concurrency, len(pending) or 1))
+        try:
+            failed = [index for index, ok in
+                      workers.imap_unordered(self._send_chunk, pending)
+                      if not ok]
+        finally:
+            workers.close()
+            workers.join()
+        if failed:
+            raise ChunkUploadError(self._path, sorted(failed),
+                                   self._journal_path)
+
+        result = None
+        if self._complete_uri:
+            result = self._connector.make_request(
+                'POST', self._complete_uri, body=self._fields(),
+                urlparam=self._urlparam,
+                headers={'content-type': 'application/x-www-form-urlencoded'})
+            if not _accepted(*result):
+                raise ChunkUploadError(self._path, [], self._journal_path)
+        self._remove_journal()
+        return result
+
+    def _send_chunk(self, index):
+        '''
+        Sends one chunk, retrying it a few times.
+
+        @param index: The chunk index.
+        @type index: int
+        @return: (index, True if the server accepted the chunk)
+        @rtype: tuple
+        '''
+        offset = index * self._chunk_size
+        length = min(self._chunk_size, self._size - offset)
+        fields = self._fields() + [('chunk', str(index)),
+                                   ('offset', str(offset))]
+        files = [('file', self._filename,
+                  FileRange(self._path, offset, length))]
+        content_type, body = encode_multipart_formdata_stream(fields, files)
+        for attempt in range(1, self.RETRIES + 1):
+            try:
+                response, content = self._connector.make_request(
+                    'POST', self._uri, body=body, urlparam=self._urlparam,
+                    headers={'content-type': content_type})
+                if _accepted(response, content):
+                    self._mark_done(index)
+                    return index, True
+                self.logger.warn('Chunk {i} rejected (attempt {a}): '
+                                 '{c}'.format(i=index, a=attempt,
+                                              c=content[:200]))
+            except Exception as err:
+                self.logger.warn('Chunk {i} failed (attempt {a}): '
+                                 '{e}'.format(i=index, a=attempt, e=err))
+            finally:
+                body.close()
+        return index, False
+
+    def _fields(self):
+        '''
+        The form fields describing this upload.
+
+        @rtype: list
+        '''
+        return [('upload_id', self._upload_id),
+                ('filename', self._filename),
+                ('chunks', str(self._chunks)),
+                ('size', str(self._size))]
+
+    def _mark_done(self, index):
+        '''
+        Records a completed chunk in the journal.
+
+        @param index: The chunk index.
+        @type index: int
+        '''
+        with self._lock:
+            self._done.add(index)
+            self._write_journal()
+
+    def _load_journal(self):
+        '''
+        Picks up an earlier journal if it belongs to the same, unchanged file
+        and chunk size.
+        '''
+        try:
+            with open(self._journal_path, 'r') as fp:
+                journal = json.load(fp)
+        except (IOError, ValueError):
+            return
+        if (journal.get('path') != self._path or
+                journal.get('size') != self._size or
+                journal.get('mtime') != self._mtime or
+                journal.get('chunk_size') != self._chunk_size):
+            self.logger.info('Ignoring stale upload journal {j}'.format(
+                j=self._journal_path))
+            return
+        self._upload_id = str(journal['upload_id'])
+        self._done = set(journal['done'])
+
+    def _write_journal(self):
+        '''
+        Writes the journal to a temporary file and renames it into place, so
+        a crash never leaves a half written journal. The lock must be held.
+        '''
+        journal = {'upload_id': self._upload_id, 'path': self._path,
+                   'size': self._size, 'mtime': self._mtime,
+                   'chunk_size': self._chunk_size,
+                   'done': sorted(self._done)}
+        temp_path = self._journal_path + '.tmp'
+        with open(temp_path, 'w') as fp:
+            json.dump(journal, fp)
+        if os.name == 'nt' and os.path.exists(self._journal_path):
+            os.remove(self._journal_path)
+        os.rename(temp_path, self._journal_path)
+
+    def _remove_journal(self):
+        '''
+        Removes the journal of a finished upload.
+        '''
+        if os.path.exists(self._journal_path):
+            os.remove(self._journal_path)
+
+
+def _default_journal_path(path):
+    '''
+    Returns the default journal location for a file.
+
+    @param path: The absolute path of the file to upload.
+    @type path: str
+    @rtype: str
+    '''
+    digest = hashlib.sha1(path).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(),
+                        'slack-upload-{d}.journal'.format(d=digest))
+
+
+def _accepted(response, content):
+    '''
+    Checks whether the server accepted a request, slack answers 200 with
+    "ok": false on errors. A body that is not a JSON object with "ok":
+    true, e.g. the HTML error page of a proxy, is not an acceptance.
+
+    @rtype: bool
+    '''
+    if int(response['status']) // 100 != 2:
+        return False
+    try:
+        return extract_keys(content, ['ok']).get('ok') is True
+    except ValueError:
+        return False
+
+
+class ChunkUploadError(RuntimeError):
+    '''
+    Raised when chunks of a file could not be uploaded.
+    '''
+
+    def __init__(self, path, chunks, journal_path):
+        self.path = path
+        self.chunks = chunks
+        self.journal_path = journal_path
+        super(ChunkUploadError, self).__init__(self._error_message)
+
+    @property
+    def _error_message(self):
+        if not self.chunks:
+            return 'Upload of {0} could not be completed'.format(self.path)
+        message = ('Chunks {0} of {1} failed to upload, run again to resume '
+                   'from journal {2}')
+        return message.format(self.chunks, self.path, self.journal_path)
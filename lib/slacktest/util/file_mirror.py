@@ -0,0 +1,167 @@
+'''
+A local, indexed copy of the files of a workspace.
+
+The mirror is fed with the file records slack sends back from files.upload,
+files.list and files.info, and told about deletes. Lookups by id, name,
+filetype or uploader are dict lookups and don't go to the network.
+'''
+
+import threading
+
+
+class FileMirror(object):
+    '''
+    File records of one workspace indexed by id, name, filetype and user.
+
+    >>> mirror = FileMirror()
+    >>> files = FilesAPI(restconn, token, mirror=mirror)
+    >>> files.sync()
+    >>> record = mirror.first_by_name('slack_api_test.png')
+
+    @cvar INDEXED_FIELDS: The record fields files can be looked up by
+    @ivar _files: Maps a file id to its record
+    @ivar _indexes: Maps an indexed field to a dict mapping a value of the
+                    field to the ids of the files that have it
+    '''
+    INDEXED_FIELDS = ('name', 'filetype', 'user')
+
+    def __init__(self, records=()):
+        '''
+        Creates a new mirror.
+
+        @param records: File records to start with.
+        @type records: list
+        '''
+        self._files = {}
+        self._indexes = dict((field, {}) for field in self.INDEXED_FIELDS)
+        self._lock = threading.Lock()
+        self.update(records)
+
+    def add(self, record):
+        '''
+        Adds a file record, replacing the record of the same id.
+
+        @param record: A file record as sent by slack.
+        @type record: dict
+        '''
+        with self._lock:
+            self._add(record)
+
+    def update(self, records):
+        '''
+        Adds file records, e.g. the "files" of a files.list page.
+
+        @param records: File records as sent by slack.
+        @type records: list
+        '''
+        with self._lock:
+            for record in records:
+                self._add(record)
+
+    def remove(self, file_id):
+        '''
+        Removes a deleted file.
+
+        @param file_id: The id of the file.
+        @type file_id: str
+        @return: The removed record, None if the file wasn't mirrored.
+        @rtype: dict
+        '''
+        with self._lock:
+            return self._remove(file_id)
+
+    def replace(self, records):
+        '''
+        Replaces all records, e.g. with a complete files.list.
+
+        @param records: File records as sent by slack.
+        @type records: list
+        '''
+        with self._lock:
+            self._files.clear()
+            for index in self._indexes.values():
+                index.clear()
+            for record in records:
+                self._add(record)
+
+    def get(self, file_id):
+        '''
+        Returns the record of a file id.
+
+        @rtype: dict
+        '''
+        return self._files.get(file_id)
+
+    def by_name(self, name):
+        '''
+        Returns the records of the files with a name, names aren't unique.
+
+        @rtype: list
+        '''
+        return self._lookup('name', name)
+
+    def first_by_name(self, name):
+        '''
+        Returns the record of one file with a name, None if there is none.
+
+        @rtype: dict
+        '''
+        records = self.by_name(name)
+        return records[0] if records else None
+
+    def by_filetype(self, filetype):
+        '''
+        Returns the records of the files of a filetype, e.g. "png".
+
+        @rtype: list
+        '''
+        return self._lookup('filetype', filetype)
+
+    def by_user(self, user):
+        '''
+        Returns the records of the files uploaded by a user id.
+
+        @rtype: list
+        '''
+        return self._lookup('user', user)
+
+    def __len__(self):
+        return len(self._files)
+
+    def __contains__(self, file_id):
+        return file_id in self._files
+
+    def __iter__(self):
+        with self._lock:
+            return iter(self._files.values())
+
+    def _lookup(self, field, value):
+        with self._lock:
+            ids = self._indexes[field].get(value, ())
+            return [self._files[file_id] for file_id in ids]
+
+    def _add(self, record):
+        '''
+        Adds a record to the indexes. The lock must be held.
+        '''
+        self._remove(record['id'])
+        self._files[record['id']] = record
+        for field, index in self._indexes.items():
+            value = record.get(field)
+            if value is not None:
+                index.setdefault(value, set()).add(record['id'])
+
+    def _remove(self, file_id):
+        '''
+        Removes a record from the indexes. The lock must be held.
+        '''
+        record = self._files.pop(file_id, None)
+        if record is None:
+            return None
+        for field, index in self._indexes.items():
+            ids = index.get(record.get(field))
+            if ids is not None:
+                ids.discard(file_id)
+                if not ids:
+                    del index[record.get(field)]
+        return record
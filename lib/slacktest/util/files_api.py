@@ -0,0 +1,280 @@
+'''
+Access to the files.* methods of the slack API over a RESTConnector.
+
+files.list answers one page at a time. L{FilesAPI.iter_files} walks all
+pages lazily: it only holds the page being consumed and fetches the next one
+in a background thread meanwhile, so listing a workspace with tens of
+thousands of files neither waits for every page in turn nor keeps them all
+in memory.
+
+Every file record slack sends back can be fed into a L{FileMirror}, which
+then answers lookups without another request.
+'''
+
+import os
+import threading
+from testingframework.log import Logging
+from testingframework.util.fileview import FileView
+from slacktest.util.multipart_formdata import encode_multipart_formdata_stream
+from slacktest.util.file_mirror import FileMirror
+
+
+class FilesAPI(Logging):
+    '''
+    The files.* methods of one workspace.
+
+    >>> files = FilesAPI(restconn, token)
+    >>> for record in files.iter_files(types='images'):
+    ...     if record['name'] == filename:
+    ...         break
+
+    @cvar API_URI: Default URI the API method names are appended to
+    @cvar PAGE_SIZE: Default number of files fetched per page
+    @ivar mirror: The L{FileMirror} fed with the file records of all
+                  responses, None if there is none
+    '''
+    API_URI = 'slack.com/api/'
+    PAGE_SIZE = 100
+
+    def __init__(self, connector, token, api_uri=None, mirror=None):
+        '''
+        Creates a new files API.
+
+        @param connector: The connector to send the requests with.
+        @type connector: L{RESTConnector}
+        @param token: The token of the workspace.
+        @type token: str
+        @param api_uri: URI the API method names are appended to.
+        @type api_uri: str
+        @param mirror: The mirror to feed with the file records.
+        @type mirror: L{FileMirror}
+        '''
+        Logging.__init__(self)
+        self._connector = connector
+        self._token = token
+        self._api_uri = api_uri or self.API_URI
+        self.mirror = mirror
+
+    def list_page(self, page=1, count=None, **filters):
+        '''
+        Fetches one page of files.list.
+
+        @param page: The page number, starting at 1.
+        @type page: int
+        @param count: Number of files per page.
+        @type count: int
+        @param filters: Other files.list arguments, e.g. types, user, ts_from.
+        @return: The decoded response, with "files" and "paging".
+        @rtype: dict
+        @raise SlackAPIError: If slack answers with an error.
+        '''
+        urlparam = dict(filters, token=self._token, page=page,
+                        count=count or self.PAGE_SIZE)
+        result = self._call('GET', 'files.list', urlparam)
+        if self.mirror is not None:
+            self.mirror.update(result.get('files') or [])
+        return result
+
+    def iter_files(self, count=None, prefetch=True, **filters):
+        '''
+        Yields the file records of all pages of files.list.
+
+        While the records of one page are consumed the next page is already
+        being fetched. Leaving the loop early (or closing the generator)
+        stops after the page in flight, no further pages are requested.
+
+        @param count: Number of files per page.
+        @type count: int
+        @param prefetch: Fetch the next page in the background.
+        @type prefetch: bool
+        @param filters: Other files.list arguments, e.g. types, user, ts_from.
+        @return: A generator of file records.
+        @raise SlackAPIError: If slack answers with an error.
+        '''
+        fetch = lambda page: self.list_page(page, count, **filters)
+        page = 1
+        current = fetch(page)
+        while True:
+            paging = current.get('paging', {})
+            files = current.get('files') or []
+            has_next = files and page < paging.get('pages', page)
+            upcoming = None
+            if has_next:
+                upcoming = _Fetch(fetch, page + 1)
+                if prefetch:
+                    upcoming.start()
+            current = None
+            for record in files:
+                yield record
+            if upcoming is None:
+                return
+            del files
+            page += 1
+            current = upcoming.get()
+
+    def sync(self, count=None):
+        '''
+        Replaces the records of the mirror with a complete files.list,
+        creating the mirror if there is none yet.
+
+        @param count: Number of files per page.
+        @type count: int
+        @return: The number of files in the workspace.
+        @rtype: int
+        @raise SlackAPIError: If slack answers with an error.
+        '''
+        # the pages are not fed to the mirror one by one, the complete
+        # list replaces its records at the end instead
+        mirror, self.mirror = self.mirror or FileMirror(), None
+        try:
+            records = list(self.iter_files(count))
+        finally:
+            self.mirror = mirror
+        mirror.replace(records)
+        return len(records)
+
+    def info(self, file_id):
+        '''
+        Fetches the record of a file with files.info.
+
+        @param file_id: The id of the file.
+        @type file_id: str
+        @rtype: dict
+        @raise SlackAPIError: If slack answers with an error.
+        '''
+        result = self._call('GET', 'files.info',
+                            {'token': self._token, 'file': file_id})
+        return self._mirror_file(result)
+
+    def upload(self, path=None, content=None, filename=None, **fields):
+        '''
+        Uploads a file with files.upload, either a file on disk (streamed
+        as multipart form data) or text content.
+
+        @param path: The file to upload, or a L{FileView} of it whose
+                     content is sent without reading the file again.
+        @type path: str
+        @param content: The text to upload instead of a file.
+        @type content: str
+        @param filename: The file name, defaults to the base name of path.
+        @type filename: str
+        @param fields: Other files.upload arguments, e.g. title, channels.
+        @return: The record of the uploaded file.
+        @rtype: dict
+        @raise SlackAPIError: If slack answers with an error.
+        '''
+        urlparam = dict(fields, token=self._token)
+        if filename is not None:
+            urlparam['filename'] = filename
+        body = None
+        content_type = 'application/x-www-form-urlencoded'
+        if path is not None:
+            name = path.path if isinstance(path, FileView) else path
+            content_type, body = encode_multipart_formdata_stream(
+                [], [('file', filename or os.path.basename(name), path)])
+        else:
+            urlparam['content'] = content
+        try:
+            result = self._call('POST', 'files.upload', urlparam, body,
+                                {'content-type': content_type})
+        finally:
+            if body is not None:
+                body.close()
+        return self._mirror_file(result)
+
+    def delete(self, file_id):
+        '''
+        Deletes a file with files.delete.
+
+        @param file_id: The id of the file.
+        @type file_id: str
+        @raise SlackAPIError: If slack answers with an error.
+        '''
+        try:
+            self._call('POST', 'files.delete',
+                       {'token': self._token, 'file': file_id})
+        except SlackAPIError as err:
+            # the file is gone either way
+            if err.error == 'file_not_found':
+                self._mirror_delete(file_id)
+            raise
+        self._mirror_delete(file_id)
+
+    def _mirror_file(self, result):
+        '''
+        Feeds the "file" of a response to the mirror.
+
+        @return: The file record.
+        @rtype: dict
+        '''
+        record = result.get('file')
+        if self.mirror is not None and record:
+            self.mirror.add(record)
+        return record
+
+    def _mirror_delete(self, file_id):
+        if self.mirror is not None:
+            self.mirror.remove(file_id)
+
+    def _call(self, method, api_method, urlparam, body=None, headers=None):
+        '''
+        Calls an API method and decodes its response.
+
+        @rtype: dict
+        @raise SlackAPIError: If slack answers with an error.
+        '''
+        response = self._connector.make_request(
+            method, self._api_uri + api_method, body=body, urlparam=urlparam,
+            headers=headers)
+        try:
+            result = response.json
+        except ValueError:
+            raise SlackAPIError(api_method, 'invalid_response',
+                                response.status)
+        if not result.get('ok'):
+            raise SlackAPIError(api_method, result.get('error'),
+                                response.status)
+        return result
+
+
+class _Fetch(threading.Thread):
+    '''
+    Fetches one page, either in the background once started or in the
+    calling thread when its result is asked for without starting it.
+    '''
+
+    def __init__(self, fetch, page):
+        super(_Fetch, self).__init__(name='files.list page %d' % page)
+        self.daemon = True
+        self._fetch = fetch
+        self._page = page
+        self._result = self._error = None
+
+    def run(self):
+        try:
+            self._result = self._fetch(self._page)
+        except Exception as err:
+            self._error = err
+
+    def get(self):
+        if self.ident is None:
+            self.run()
+        else:
+            self.join()
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+class SlackAPIError(RuntimeError):
+    '''
+    Raised when slack answers a request with "ok": false.
+    '''
+
+    def __init__(self, api_method, error, status):
+        self.api_method = api_method
+        self.error = error
+        self.status = status
+        super(SlackAPIError, self).__init__(
+            '{0} failed with {1} (status {2})'.format(api_method, error,
+                                                       status))
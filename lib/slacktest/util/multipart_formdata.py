@@ -1,13 +1,17 @@
 import mimetypes
-    
+import os
+from testingframework.util.fileview import FileView
+
+BOUNDARY = '----------bound@ry_$'
+CRLF = '\r\n'
+_READ_SIZE = 64 * 1024
+
 def encode_multipart_formdata(fields, files):
     """
     fields is a sequence of (name, value) elements for regular form fields.
     files is a sequence of (name, filename, value) elements for data to be uploaded as files
     Return (content_type, body) ready for httplib.HTTP instance
     """
-    BOUNDARY = '----------bound@ry_$'
-    CRLF = '\r\n'
     L = []
     for (key, value) in fields:
         L.append('--' + BOUNDARY)
@@ -26,5 +30,184 @@ def encode_multipart_formdata(fields, files):
     content_type = 'multipart/form-data; boundary=%s' % BOUNDARY
     return content_type, body
 
+def encode_multipart_formdata_stream(fields, files):
+    """
+    Streaming version of encode_multipart_formdata.
+    fields is a sequence of (name, value) elements for regular form fields.
+    files is a sequence of (name, filename, path) elements for files to be uploaded,
+    path can also be an open file object positioned at the start of the data,
+    a FileRange to upload only part of a file, or a FileView whose content
+    is sent as it is, without reading the file again.
+    Return (content_type, body), body is a MultipartBody that reads the files
+    from disk while it is being sent, its len() is the Content-Length.
+    """
+    segments = []
+    for (key, value) in fields:
+        segments.append(_to_bytes('--' + BOUNDARY + CRLF +
+                                  'Content-Disposition: form-data; name="%s"' % key + CRLF +
+                                  CRLF + value + CRLF))
+    for (key, filename, path) in files:
+        segments.append(_to_bytes('--' + BOUNDARY + CRLF +
+                                  'Content-Disposition: form-data; name="%s"; filename="%s"' % (key, filename) + CRLF +
+                                  'Content-Type: %s' % get_content_type(filename) + CRLF +
+                                  CRLF))
+        segments.append(_FileSegment(path))
+        segments.append(CRLF)
+    segments.append('--' + BOUNDARY + '--' + CRLF)
+    content_type = 'multipart/form-data; boundary=%s' % BOUNDARY
+    return content_type, MultipartBody(segments)
+
 def get_content_type(filename):
     return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+def _to_bytes(value):
+    # the file parts are raw bytes, so the text around them must be too
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+
+class MultipartBody(object):
+    """
+    A read-only file-like request body made of string segments and file
+    segments. File segments are opened on first read and read in blocks, so
+    the whole body is never held in memory. httplib sends any object with a
+    read() method block by block and takes the Content-Length from len().
+    """
+
+    def __init__(self, segments):
+        self._segments = segments
+        self._length = sum(len(segment) for segment in segments)
+        self._position = 0
+        self._index = 0
+        self._offset = 0
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        block = self.read(_READ_SIZE)
+        while block:
+            yield block
+            block = self.read(_READ_SIZE)
+
+    def __repr__(self):
+        return '<MultipartBody length=%d>' % self._length
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        """
+        Moves to a new position, so that a body can be sent again.
+        """
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += self._length
+        offset = min(max(offset, 0), self._length)
+        self._position = offset
+        self._index = 0
+        for segment in self._segments:
+            if offset < len(segment):
+                break
+            offset -= len(segment)
+            self._index += 1
+        self._offset = offset
+
+    def read(self, size=-1):
+        """
+        Reads up to size bytes, or the rest of the body if size is negative.
+        """
+        if size is None or size < 0:
+            size = self._length - self._position
+        blocks = []
+        while size > 0 and self._index < len(self._segments):
+            segment = self._segments[self._index]
+            block = _read_segment(segment, self._offset, size)
+            if not block and self._offset < len(segment):
+                raise IOError('File part shrank while it was being read')
+            self._offset += len(block)
+            self._position += len(block)
+            size -= len(block)
+            blocks.append(block)
+            if self._offset >= len(segment):
+                if isinstance(segment, _FileSegment):
+                    segment.close()
+                self._index += 1
+                self._offset = 0
+        return ''.join(blocks)
+
+    def close(self):
+        for segment in self._segments:
+            if isinstance(segment, _FileSegment):
+                segment.close()
+
+
+def _read_segment(segment, offset, size):
+    if isinstance(segment, _FileSegment):
+        return segment.read(offset, size)
+    return segment[offset:offset + size]
+
+
+class FileRange(object):
+    """
+    A byte range of a file on disk, used to upload a file in chunks.
+    """
+
+    def __init__(self, path, offset, length):
+        self.path = path
+        self.offset = offset
+        self.length = length
+
+
+class _FileSegment(object):
+    """
+    The data of one file part. The size is taken when the body is encoded.
+    """
+
+    def __init__(self, source):
+        self._path = None
+        self._file = None
+        self._view = None
+        self._next = None
+        if isinstance(source, FileView):
+            # the view stays open as long as the caller keeps it
+            self._view = source
+            self._start = 0
+            self._size = len(source)
+        elif isinstance(source, FileRange):
+            self._path = source.path
+            self._start = source.offset
+            self._size = source.length
+        elif isinstance(source, basestring):
+            self._path = source
+            self._start = 0
+            self._size = os.path.getsize(source)
+        else:
+            self._file = source
+            self._start = source.tell()
+            self._size = os.fstat(source.fileno()).st_size - self._start
+
+    def __len__(self):
+        return self._size
+
+    def read(self, offset, size):
+        if self._view is not None:
+            # a slice of a mapping only reads and copies the block
+            start = self._start + offset
+            return self._view.data[start:start + min(size, self._size - offset)]
+        if self._file is None:
+            self._file = open(self._path, 'rb')
+        if offset != self._next:
+            self._file.seek(self._start + offset)
+        block = self._file.read(min(size, self._size - offset))
+        self._next = offset + len(block)
+        return block
+
+    def close(self):
+        # Only close the files opened here, not the ones handed in.
+        if self._path is not None and self._file is not None:
+            self._file.close()
+            self._file = None
+        self._next = None
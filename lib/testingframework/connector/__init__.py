@@ -6,6 +6,9 @@ Module for handling generic connections with a slack deployment.
 @since: 2016-10-13
 '''
 
-__all__ = ['rest']
+__all__ = ['rest', 'asyncrest', 'batch', 'response', 'cassette']
 
 from .rest import RESTConnector
+from .asyncrest import AsyncRESTConnector
+from .batch import BatchResult
+from .response import RESTResponse
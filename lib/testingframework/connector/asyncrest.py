@@ -0,0 +1,150 @@
+'''
+Module for issuing many REST requests concurrently against a slack
+deployment.
+'''
+
+import threading
+from multiprocessing.pool import ThreadPool
+from .rest import RESTConnector
+
+
+class AsyncRESTConnector(RESTConnector):
+    """
+    A REST connector whose requests do not block the caller.
+
+    L{make_request} takes the same arguments as
+    L{RESTConnector.make_request} but returns a handle right away, the
+    request itself runs on a worker thread. The handle is a
+    C{multiprocessing.pool.AsyncResult}: C{get()} returns the usual
+    C{(response, content)} tuple or raises the error of the request.
+    Use L{gather} to wait for a group of handles at once.
+
+    >>> handles = [conn.make_request('DELETE', uri, urlparam={'file': f})
+    ...            for f in file_ids]
+    >>> for response, content in conn.gather(*handles):
+    ...     pass
+
+    The worker threads share the connection pool of the connector, so its
+    max connections per host is raised to the number of requests allowed
+    in flight.
+
+    @cvar MAX_IN_FLIGHT: Default max number of requests in flight at once
+    @ivar _workers: The worker threads, created on the first request
+    """
+    MAX_IN_FLIGHT = 100
+    MAX_CONNECTIONS = MAX_IN_FLIGHT
+    MAX_IDLE = 20
+
+    def __init__(self, slack, test_token=None):
+        """
+         Creates a new asynchronous REST connector.
+
+         @param slack: The slack deployment
+         @type slack: L{testingframework.slack.Slack}
+         @param test_token: The test_token to use. If None (default)
+                          L{Connector.DEFAULT_TEST_TOKEN} is used.
+         @type test_token: str
+
+        """
+        super(AsyncRESTConnector, self).__init__(slack, test_token)
+        self._max_in_flight = self.MAX_IN_FLIGHT
+        self._workers = None
+        self._workers_lock = threading.Lock()
+
+    def make_request(self, method, uri, body=None, urlparam=None,
+                     use_sessionkey=False, headers=None):
+        """
+        Queues a HTTP request to an endpoint and returns without waiting
+        for it. See L{RESTConnector.make_request} for the arguments.
+
+        @return: A handle whose C{get()} returns C{(response, content)}
+        @rtype: C{multiprocessing.pool.AsyncResult}
+
+        >>> handle = conn.make_request('GET', 'slack.com/api/files.list',
+        ...                            urlparam={'token': token})
+        >>> response, content = handle.get()
+
+        """
+        blocking_request = super(AsyncRESTConnector, self).make_request
+        return self._get_workers().apply_async(
+            blocking_request,
+            (method, uri, body, urlparam, use_sessionkey, headers))
+
+    def gather(self, *handles, **kwargs):
+        """
+        Waits for all the given handles and returns their results in the
+        order the handles were given.
+
+        @param handles: Handles returned by L{make_request}
+        @param return_exceptions: If True the error of a failed request is
+                                  put in the result list, otherwise the
+                                  first error (in order) is raised.
+        @type return_exceptions: bool
+        @param timeout: Seconds to wait for each handle, None waits forever
+        @type timeout: float
+        @return: A list of C{(response, content)} tuples
+        @rtype: list
+        """
+        return_exceptions = kwargs.pop('return_exceptions', False)
+        timeout = kwargs.pop('timeout', None)
+        if kwargs:
+            raise TypeError('Unexpected arguments: %s' % ', '.join(kwargs))
+
+        results = []
+        for handle in handles:
+            try:
+                # AsyncResult.get without a timeout can't be interrupted
+                # with Ctrl-C on python 2, so wait in bounded steps.
+                while timeout is None and not handle.ready():
+                    handle.wait(1)
+                results.append(handle.get(timeout))
+            except Exception as err:
+                if not return_exceptions:
+                    raise
+                results.append(err)
+        return results
+
+    def max_in_flight(self, value):
+        """
+        Overrides the max number of requests in flight at once.
+        Takes effect for worker threads created after this call.
+
+        @type value: int
+        @param value: max number of concurrent requests
+
+        """
+        self._max_in_flight = value
+        self.pool_limits(max_connections=value)
+        self.close()
+
+    def close(self):
+        """
+        Stops the worker threads once the queued requests are done.
+        A new set of workers is created by the next request.
+        """
+        with self._workers_lock:
+            workers, self._workers = self._workers, None
+        if workers is not None:
+            workers.close()
+
+    def _get_workers(self):
+        """
+        Returns the worker threads, creating them on first use.
+
+        @rtype: C{multiprocessing.pool.ThreadPool}
+        """
+        with self._workers_lock:
+            if self._workers is None:
+                self._workers = ThreadPool(self._max_in_flight)
+            return self._workers
+
+    def __del__(self):
+        """
+        Called when the object is being deallocated.
+
+        Stops the worker threads and unregisters itself with the slack
+        start listeners.
+
+        """
+        self.close()
+        super(AsyncRESTConnector, self).__del__()
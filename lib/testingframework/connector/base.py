@@ -24,7 +24,7 @@ class Connector(Logging):
     DEFAULT_TEST_TOKEN = ''
 
     # types of connectors
-    (REST, SDK) = range(0, 2)
+    (REST, SDK, ASYNC) = range(0, 3)
 
     def __init__(self, slack, test_token=None):
         '''
@@ -0,0 +1,136 @@
+'''
+Module for running a batch of REST requests over a pool of worker threads.
+'''
+
+from multiprocessing.pool import ThreadPool
+from .response import RESTResponse
+
+
+class BatchResult(object):
+    '''
+    The outcome of one request of a batch.
+
+    A failed request does not abort the batch, its error is kept here
+    instead. A successful result reads like the L{RESTResponse} returned by
+    L{RESTConnector.make_request}, decoding its content lazily, and unpacks
+    like it:
+
+    >>> if result.ok:
+    ...     files = result.json['files']
+    >>> response, content = result
+
+    Reading the result of a failed request raises its error.
+
+    @ivar spec: The request spec this result belongs to
+    @ivar result: The L{RESTResponse}, None if the request failed
+    @ivar error: The exception raised by the request, None on success
+    '''
+
+    def __init__(self, spec, result=None, error=None):
+        self.spec = spec
+        self.result = result
+        self.error = error
+
+    @property
+    def failed(self):
+        '''
+        True if the request raised an exception.
+
+        @rtype: bool
+        '''
+        return self.error is not None
+
+    @property
+    def response(self):
+        '''
+        The http response, None if the request failed.
+        '''
+        return None if self.failed else self.result.response
+
+    @property
+    def content(self):
+        '''
+        The raw response content, None if the request failed.
+
+        @rtype: str
+        '''
+        return None if self.failed else self.result.content
+
+    @property
+    def status(self):
+        '''
+        @rtype: int
+        '''
+        return self._succeeded().status
+
+    @property
+    def json(self):
+        '''
+        The decoded content, see L{RESTResponse.json}.
+
+        @rtype: dict
+        '''
+        return self._succeeded().json
+
+    @property
+    def ok(self):
+        '''
+        The "ok" flag of the response, see L{RESTResponse.ok}.
+
+        @rtype: bool
+        '''
+        return self._succeeded().ok
+
+    def _succeeded(self):
+        if self.failed:
+            raise self.error
+        return self.result
+
+    def __iter__(self):
+        return iter(self._succeeded())
+
+    def __repr__(self):
+        if self.failed:
+            return '<BatchResult error={e!r}>'.format(e=self.error)
+        return '<BatchResult status={s}>'.format(s=self.result.status)
+
+
+def run_batch(make_request, batch, workers):
+    '''
+    Runs a batch of requests and returns their results in submission order.
+
+    @param make_request: The blocking function sending one request,
+                         returning a L{RESTResponse} or a (response,
+                         content) tuple.
+    @type make_request: function
+    @param batch: The request specs, each either a dict of keyword
+                  arguments or a tuple of positional arguments for
+                  make_request.
+    @type batch: list
+    @param workers: Max number of requests sent at the same time.
+    @type workers: int
+    @return: One L{BatchResult} per spec.
+    @rtype: list
+    '''
+    batch = list(batch)
+    if not batch:
+        return []
+
+    def send(spec):
+        try:
+            if isinstance(spec, dict):
+                result = make_request(**spec)
+            else:
+                result = make_request(*spec)
+            if not isinstance(result, RESTResponse):
+                result = RESTResponse(*result)
+        except Exception as err:
+            return BatchResult(spec, error=err)
+        return BatchResult(spec, result)
+
+    pool = ThreadPool(min(workers, len(batch)))
+    try:
+        return pool.map(send, batch, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
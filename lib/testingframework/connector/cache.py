@@ -0,0 +1,280 @@
+'''
+Module for caching the responses of read-only API methods.
+
+Entries are kept for a time to live per API method and evicted least
+recently used first once the cache grows over its byte budget. An expired
+entry that came with an ETag is revalidated with If-None-Match instead of
+being fetched again. Any other request to an API method family (e.g.
+files.delete) drops the cached entries of that family (files.list,
+files.info, ...).
+'''
+
+import threading
+import time
+import urllib
+import urlparse
+from collections import OrderedDict
+
+# Seconds the responses of these API methods are cached, responses of
+# methods not listed here are never cached.
+DEFAULT_TTLS = {
+    'files.list': 5,
+    'files.info': 5,
+}
+
+MAX_BYTES = 64 * 1024 * 1024
+
+
+class CacheEntry(object):
+    '''
+    One cached response.
+
+    @ivar api_method: The API method the response belongs to
+    @ivar family: The family of the API method
+    @ivar response: The http response
+    @ivar content: The response content
+    @ivar expires: Time after which the entry has to be revalidated
+    @ivar etag: The ETag of the response, None if it had none
+    @ivar size: Approximate size of the entry in bytes
+    '''
+
+    def __init__(self, api_method, response, content, expires):
+        self.api_method = api_method
+        self.family = _family(api_method)
+        self.response = response
+        self.content = content
+        self.expires = expires
+        self.etag = response.get('etag')
+        self.size = len(content) + sum(len(k) + len(str(v))
+                                       for k, v in response.items())
+
+    @property
+    def fresh(self):
+        '''
+        True if the entry may be used without asking the server.
+
+        @rtype: bool
+        '''
+        return time.time() < self.expires
+
+
+class ResponseCache(object):
+    '''
+    A thread-safe LRU cache of responses with a byte budget.
+
+    >>> key = cache.key('GET', url, token)
+    >>> cached = cache.get(key)
+
+    @ivar _entries: Maps a key to its L{CacheEntry}, least recently used
+                    first.
+    @ivar _families: Maps an API method family to the keys cached for it.
+    @ivar _generations: Maps an API method family to the number of times it
+                        has been invalidated.
+    '''
+
+    def __init__(self, max_bytes=MAX_BYTES, ttls=None):
+        '''
+        Creates a new, empty cache.
+
+        @param max_bytes: Max total size of the cached responses.
+        @type max_bytes: int
+        @param ttls: Maps an API method to the seconds its responses are
+                     cached, defaults to L{DEFAULT_TTLS}.
+        @type ttls: dict
+        '''
+        self._max_bytes = max_bytes
+        self._ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self._entries = OrderedDict()
+        self._families = {}
+        self._generations = {}
+        self._bytes = 0
+        self._stats = dict.fromkeys(['hits', 'misses', 'revalidations',
+                                     'evictions', 'invalidations'], 0)
+        self._lock = threading.Lock()
+
+    def cacheable(self, method, api_method):
+        '''
+        Checks whether the response of a request may be cached.
+
+        @param method: The HTTP method.
+        @type method: str
+        @param api_method: The API method, e.g. "files.list".
+        @type api_method: str
+        @rtype: bool
+        '''
+        return method.upper() == 'GET' and api_method in self._ttls
+
+    def key(self, method, url, auth):
+        '''
+        Returns the cache key of a request. URL parameters are sorted, so
+        the order of a urlparam dict doesn't matter.
+
+        @param method: The HTTP method.
+        @type method: str
+        @param url: The full URL, including the parameters.
+        @type url: str
+        @param auth: What the request is authenticated with.
+        @type auth: str
+        @rtype: tuple
+        '''
+        scheme, netloc, path, query, _ = urlparse.urlsplit(url)
+        query = urllib.urlencode(sorted(urlparse.parse_qsl(
+            query, keep_blank_values=True)))
+        return (method.upper(), scheme.lower(), netloc.lower(), path, query,
+                auth)
+
+    def get(self, key):
+        '''
+        Returns a fresh cached response.
+
+        @param key: The key returned by L{key}.
+        @return: (response, content), None if nothing fresh is cached.
+        @rtype: tuple
+        '''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not entry.fresh:
+                self._stats['misses'] += 1
+                return None
+            self._stats['hits'] += 1
+            self._touch(key)
+            return entry.response, entry.content
+
+    def etag(self, key):
+        '''
+        Returns the ETag of an expired entry the request can revalidate.
+
+        @param key: The key returned by L{key}.
+        @rtype: str
+        '''
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry.etag if entry is not None else None
+
+    def revalidated(self, key):
+        '''
+        Renews an entry after the server answered 304 Not Modified.
+
+        @param key: The key returned by L{key}.
+        @return: The cached (response, content), None if the entry has been
+                 evicted in the meantime.
+        @rtype: tuple
+        '''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry.expires = time.time() + self._ttls.get(entry.api_method, 0)
+            self._stats['revalidations'] += 1
+            self._touch(key)
+            return entry.response, entry.content
+
+    def generation(self, api_method):
+        '''
+        Returns how often the family of an API method has been invalidated.
+        Taken before a request is sent and passed to L{store}, so that a
+        response racing with a delete is not cached.
+
+        @param api_method: The API method, e.g. "files.list".
+        @type api_method: str
+        @rtype: int
+        '''
+        with self._lock:
+            return self._generations.get(_family(api_method), 0)
+
+    def store(self, key, api_method, response, content, generation=None):
+        '''
+        Caches a response, evicting the least recently used entries if the
+        cache grows over its byte budget.
+
+        @param key: The key returned by L{key}.
+        @param api_method: The API method, e.g. "files.list".
+        @type api_method: str
+        @param response: The http response.
+        @param content: The response content.
+        @type content: str
+        @param generation: The L{generation} taken before the request was
+                           sent, the response is dropped if the family has
+                           been invalidated since.
+        @type generation: int
+        '''
+        entry = CacheEntry(api_method, response, content,
+                           time.time() + self._ttls.get(api_method, 0))
+        if entry.size > self._max_bytes:
+            return
+        with self._lock:
+            if (generation is not None and
+                    generation != self._generations.get(entry.family, 0)):
+                return
+            self._remove(key)
+            self._entries[key] = entry
+            self._families.setdefault(entry.family, set()).add(key)
+            self._bytes += entry.size
+            while self._bytes > self._max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+
+    def invalidate(self, api_method):
+        '''
+        Drops all entries of the family of an API method, e.g. everything
+        cached for files.* when a file is deleted.
+
+        @param api_method: The API method, e.g. "files.delete".
+        @type api_method: str
+        '''
+        family = _family(api_method)
+        with self._lock:
+            self._generations[family] = self._generations.get(family, 0) + 1
+            keys = self._families.pop(family, ())
+            for key in list(keys):
+                self._remove(key)
+            if keys:
+                self._stats['invalidations'] += 1
+
+    def clear(self):
+        '''
+        Drops all entries.
+        '''
+        with self._lock:
+            self._entries.clear()
+            self._families.clear()
+            self._bytes = 0
+
+    def stats(self):
+        '''
+        Returns the number of hits, misses, revalidations, evictions and
+        invalidations, plus the number of entries and their size in bytes.
+
+        @rtype: dict
+        '''
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+            return stats
+
+    def _touch(self, key):
+        '''
+        Marks an entry as most recently used. The lock must be held.
+        '''
+        self._entries[key] = self._entries.pop(key)
+
+    def _remove(self, key):
+        '''
+        Removes an entry if it is cached. The lock must be held.
+        '''
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+            keys = self._families.get(entry.family)
+            if keys is not None:
+                keys.discard(key)
+
+
+def _family(api_method):
+    '''
+    Returns the family of an API method, e.g. "files" for "files.list".
+
+    @rtype: str
+    '''
+    return api_method.split('.', 1)[0]
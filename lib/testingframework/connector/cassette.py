@@ -0,0 +1,287 @@
+'''
+Module for recording the requests a REST connector makes and replaying them
+without the network.
+
+A cassette is two files: an index with one JSON line per exchange and a
+data file with the response bodies, one after the other. Exchanges are
+keyed by a hash of the normalized request, so the same request can be
+matched again across runs: the method, the path, the sorted URL parameters
+without the token, the content type and a digest of the body. Host and
+port are left out, a local fake answers on a new port every run.
+
+Replay serves the exchanges of a key in the order they were recorded, the
+last one again once they are used up, so a poll sees the same answers it
+saw while recording. The data file is memory-mapped, a body is only read
+when its exchange is played. Replay is strict by default: a request that
+was not recorded raises L{CassetteMiss} and is listed by L{Cassette.report}.
+
+>>> with Cassette('files', Cassette.REPLAY).use(restconn):
+...     test_files_upload_list(restconn)
+'''
+
+import hashlib
+import json
+import mmap
+import os
+import threading
+import urllib
+import urlparse
+from collections import deque
+from contextlib import contextmanager
+import httplib2
+from testingframework.log import Logging
+from testingframework.util.wait import skipped_sleeps
+
+IGNORED_PARAMS = ('token',)
+INDEX_SUFFIX = '.idx'
+DATA_SUFFIX = '.dat'
+_READ_SIZE = 64 * 1024
+
+
+class Cassette(Logging):
+    '''
+    Recorded exchanges of a connector, on disk.
+
+    @cvar RECORD: Mode sending requests and recording the exchanges
+    @cvar REPLAY: Mode answering requests from the recorded exchanges
+    @ivar mode: L{RECORD} or L{REPLAY}
+    @ivar strict: Whether unmatched requests raise L{CassetteMiss} on
+                  replay, else they are sent over the network
+    @ivar unmatched: The normalized requests that had no recorded exchange
+    '''
+    RECORD = 'record'
+    REPLAY = 'replay'
+
+    def __init__(self, path, mode=REPLAY, strict=True):
+        '''
+        Opens a cassette. Recording truncates an existing one.
+
+        @param path: Path of the cassette, without the file suffixes.
+        @type path: str
+        @param mode: L{RECORD} or L{REPLAY}.
+        @type mode: str
+        @param strict: Raise on unmatched requests when replaying.
+        @type strict: bool
+        @raise ValueError: If the mode is unknown.
+        @raise IOError: If a cassette to replay does not exist.
+        '''
+        Logging.__init__(self)
+        if mode not in (self.RECORD, self.REPLAY):
+            raise ValueError('Unknown cassette mode {m}'.format(m=mode))
+        self.path = path
+        self.mode = mode
+        self.strict = strict
+        self.unmatched = []
+        self._lock = threading.Lock()
+        self._exchanges = {}
+        self._played = set()
+        self._data = None
+        self._index_file = self._data_file = None
+        if mode == self.RECORD:
+            self._index_file = open(path + INDEX_SUFFIX, 'wb')
+            self._data_file = open(path + DATA_SUFFIX, 'wb')
+            self._offset = 0
+            self._recorded = 0
+        else:
+            self._load()
+
+    @property
+    def replaying(self):
+        '''
+        @rtype: bool
+        '''
+        return self.mode == self.REPLAY
+
+    def play(self, method, url, body, headers):
+        '''
+        Returns the recorded answer to a request.
+
+        @param method: The HTTP method.
+        @type method: str
+        @param url: The full URL.
+        @type url: str
+        @param body: The request body, a string or a file-like object.
+        @param headers: The request headers.
+        @type headers: dict
+        @return: (response, content), None if the request was not recorded
+                 and the cassette is not strict.
+        @rtype: tuple
+        @raise CassetteMiss: If the request was not recorded and the
+                             cassette is strict.
+        '''
+        request, key = normalize(method, url, body, headers)
+        with self._lock:
+            queue = self._exchanges.get(key)
+            if not queue:
+                self.unmatched.append(request)
+                if self.strict:
+                    raise CassetteMiss(self.path, request)
+                self.logger.warn("Cassette miss => {r}".format(r=request))
+                return None
+            # the last exchange of a key answers every further request
+            entry = queue.popleft() if len(queue) > 1 else queue[0]
+            self._played.add(entry['sequence'])
+        content = self._data[entry['offset']:entry['offset'] +
+                             entry['length']] if entry['length'] else ''
+        return httplib2.Response(entry['response']), content
+
+    def record(self, method, url, body, headers, response, content, elapsed):
+        '''
+        Appends an exchange to the cassette.
+
+        @param method: The HTTP method.
+        @type method: str
+        @param url: The full URL.
+        @type url: str
+        @param body: The request body, a string or a file-like object.
+        @param headers: The request headers.
+        @type headers: dict
+        @param response: The http response.
+        @type response: C{httplib2.Response}
+        @param content: The response content.
+        @type content: str
+        @param elapsed: Seconds the exchange took.
+        @type elapsed: float
+        '''
+        request, key = normalize(method, url, body, headers)
+        with self._lock:
+            entry = {'key': key, 'request': request,
+                     'sequence': self._recorded,
+                     'response': dict(response), 'offset': self._offset,
+                     'length': len(content), 'elapsed': round(elapsed, 6)}
+            self._recorded += 1
+            self._data_file.write(content)
+            self._offset += len(content)
+            self._index_file.write(json.dumps(entry, sort_keys=True) + '\n')
+
+    def report(self):
+        '''
+        Describes what did not match while replaying: the requests that
+        were not recorded and the recorded exchanges never played.
+
+        @rtype: str
+        '''
+        with self._lock:
+            unplayed = sorted(
+                (entry['sequence'], entry['request'])
+                for queue in self._exchanges.values() for entry in queue
+                if entry['sequence'] not in self._played)
+            lines = ['{n} unmatched requests'.format(n=len(self.unmatched))]
+            lines.extend('  ' + request for request in self.unmatched)
+            lines.append('{n} recorded exchanges not played'.format(
+                n=len(unplayed)))
+            lines.extend('  ' + request for _, request in unplayed)
+        return '\n'.join(lines)
+
+    @contextmanager
+    def use(self, connector):
+        '''
+        Context manager that has a connector record to or replay from this
+        cassette, and closes it at the end. Waits don't sleep while
+        replaying.
+
+        @param connector: The connector.
+        @type connector: L{RESTConnector}
+        '''
+        connector.use_cassette(self)
+        try:
+            if self.replaying:
+                with skipped_sleeps():
+                    yield self
+            else:
+                yield self
+        finally:
+            connector.use_cassette(None)
+            self.close()
+
+    def close(self):
+        '''
+        Writes out a recording, or unmaps the data of a replay.
+        '''
+        with self._lock:
+            for fp in (self._index_file, self._data_file):
+                if fp is not None:
+                    fp.close()
+            self._index_file = self._data_file = None
+            if self._data is not None:
+                self._data.close()
+                self._data = None
+
+    def _load(self):
+        '''
+        Reads the index and maps the data file.
+        '''
+        with open(self.path + INDEX_SUFFIX, 'rb') as index:
+            for line in index:
+                entry = json.loads(line)
+                self._exchanges.setdefault(entry['key'], deque()).append(
+                    entry)
+        with open(self.path + DATA_SUFFIX, 'rb') as data:
+            if os.fstat(data.fileno()).st_size:
+                self._data = mmap.mmap(data.fileno(), 0,
+                                       access=mmap.ACCESS_READ)
+
+
+def normalize(method, url, body, headers):
+    '''
+    Returns the normalized form of a request and its hash.
+
+    @param method: The HTTP method.
+    @type method: str
+    @param url: The full URL.
+    @type url: str
+    @param body: The request body, a string or a file-like object.
+    @param headers: The request headers.
+    @type headers: dict
+    @return: (normalized request, key)
+    @rtype: tuple
+    '''
+    path, query = urlparse.urlsplit(url)[2:4]
+    params = sorted((name, value) for name, value in
+                    urlparse.parse_qsl(query, keep_blank_values=True)
+                    if name not in IGNORED_PARAMS)
+    request = '{m} {p}'.format(m=method.upper(), p=path)
+    if params:
+        request += '?' + urllib.urlencode(params)
+    content_type = dict((k.lower(), v) for k, v in headers.items()).get(
+        'content-type', '')
+    digest = hashlib.sha1(content_type)
+    if content_type.startswith('application/x-www-form-urlencoded') and \
+            isinstance(body, str):
+        body = urllib.urlencode(sorted(
+            (name, value) for name, value in
+            urlparse.parse_qsl(body, keep_blank_values=True)
+            if name not in IGNORED_PARAMS))
+    _digest_body(digest, body)
+    key = hashlib.sha1(request + '\n' + digest.hexdigest()).hexdigest()
+    return request, key
+
+
+def _digest_body(digest, body):
+    '''
+    Adds a body to a digest. A streamed body is read block by block from
+    its start, it has been sent already when recording, and rewound
+    afterwards.
+    '''
+    if not hasattr(body, 'read'):
+        digest.update(body or '')
+        return
+    body.seek(0)
+    block = body.read(_READ_SIZE)
+    while block:
+        digest.update(block)
+        block = body.read(_READ_SIZE)
+    body.seek(0)
+
+
+class CassetteMiss(RuntimeError):
+    '''
+    Raised when replaying a request that was not recorded.
+
+    @ivar request: The normalized request
+    '''
+
+    def __init__(self, path, request):
+        self.request = request
+        super(CassetteMiss, self).__init__(
+            '{r} was not recorded in cassette {p}'.format(r=request, p=path))
@@ -0,0 +1,159 @@
+'''
+Connection classes the REST connector hands to httplib2.
+
+httplib2 silently sends a request again when it finds a pooled keep-alive
+connection was closed by the server. A streamed body has been read to the
+end by then, so these connections rewind it before every send.
+
+They also time the phases of a request for L{metrics}: DNS lookup, TCP
+connect and TLS handshake when a connection is opened, then sending the
+request, waiting for the first byte of the response and reading its body.
+'''
+
+import httplib
+import socket
+import ssl
+import time
+import httplib2
+from . import metrics
+
+
+class TimedResponse(httplib.HTTPResponse):
+    '''
+    Response that counts the time spent reading its body and its size.
+    '''
+
+    def read(self, amt=None):
+        start = time.time()
+        data = httplib.HTTPResponse.read(self, amt)
+        metrics.add_phase('transfer', time.time() - start)
+        metrics.add_bytes(received=len(data))
+        return data
+
+
+class _TimedConnectionMixin:
+    '''
+    The parts shared by the HTTP and HTTPS connections. An old-style class,
+    like the httplib connections it is mixed into.
+    '''
+    response_class = TimedResponse
+
+    def request(self, method, url, body=None, headers={}):
+        _rewind(body)
+        start = time.time()
+        self._base.request(self, method, url, body, headers)
+        metrics.add_phase('send', time.time() - start)
+
+    def send(self, data):
+        self._base.send(self, data)
+        try:
+            metrics.add_bytes(sent=len(data))
+        except TypeError:
+            pass
+
+    def getresponse(self, *args, **kwargs):
+        start = time.time()
+        response = self._base.getresponse(self, *args, **kwargs)
+        metrics.add_phase('ttfb', time.time() - start)
+        return response
+
+    def _open_socket(self):
+        '''
+        Resolves the host and connects to the first address that accepts,
+        like httplib2 does, timing both.
+
+        @rtype: C{socket.socket}
+        '''
+        start = time.time()
+        addresses = socket.getaddrinfo(self.host, self.port, 0,
+                                       socket.SOCK_STREAM)
+        metrics.add_phase('dns', time.time() - start)
+        error = socket.error('getaddrinfo returns an empty list')
+        start = time.time()
+        try:
+            for family, socktype, proto, _, address in addresses:
+                sock = socket.socket(family, socktype, proto)
+                try:
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    if httplib2.has_timeout(self.timeout):
+                        sock.settimeout(self.timeout)
+                    sock.connect(address)
+                    return sock
+                except socket.timeout:
+                    sock.close()
+                    raise
+                except socket.error as err:
+                    sock.close()
+                    error = err
+            raise error
+        finally:
+            metrics.add_phase('connect', time.time() - start)
+
+    def _uses_proxy(self):
+        return self.proxy_info and self.proxy_info.isgood()
+
+
+class HTTPConnection(_TimedConnectionMixin,
+                     httplib2.HTTPConnectionWithTimeout):
+    '''
+    Plain HTTP connection that can resend streamed bodies.
+    '''
+    _base = httplib2.HTTPConnectionWithTimeout
+
+    def connect(self):
+        if self._uses_proxy():
+            start = time.time()
+            self._base.connect(self)
+            metrics.add_phase('connect', time.time() - start)
+            return
+        self.sock = self._open_socket()
+
+
+class HTTPSConnection(_TimedConnectionMixin,
+                      httplib2.HTTPSConnectionWithTimeout):
+    '''
+    HTTPS connection that can resend streamed bodies.
+    '''
+    _base = httplib2.HTTPSConnectionWithTimeout
+
+    def connect(self):
+        if self._uses_proxy():
+            start = time.time()
+            self._base.connect(self)
+            metrics.add_phase('connect', time.time() - start)
+            return
+        sock = self._open_socket()
+        start = time.time()
+        try:
+            self.sock = httplib2._ssl_wrap_socket(
+                sock, self.key_file, self.cert_file,
+                self.disable_ssl_certificate_validation, self.ca_certs)
+        except ssl.SSLError as err:
+            sock.close()
+            if err.errno == ssl.SSL_ERROR_SSL:
+                raise httplib2.SSLHandshakeError(err)
+            raise
+        finally:
+            metrics.add_phase('tls', time.time() - start)
+        if not self.disable_ssl_certificate_validation:
+            cert = self.sock.getpeercert()
+            hostname = self.host.split(':', 0)[0]
+            if not self._ValidateCertificateHostname(cert, hostname):
+                self.sock.close()
+                self.sock = None
+                raise httplib2.CertificateHostnameMismatch(
+                    'Server presented certificate that does not match '
+                    'host %s: %s' % (hostname, cert), hostname, cert)
+
+
+CONNECTION_TYPES = {'http': HTTPConnection, 'https': HTTPSConnection}
+
+
+def _rewind(body):
+    '''
+    Moves a file-like body back to its start.
+
+    @param body: The request body.
+    '''
+    if hasattr(body, 'read') and hasattr(body, 'seek'):
+        body.seek(0)
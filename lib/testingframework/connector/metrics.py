@@ -0,0 +1,271 @@
+'''
+Module for measuring where the time of REST requests goes.
+
+make_request measures every request within L{RequestMetrics.measure}. The
+connection classes add the phases they see to the measurement of their
+thread: DNS lookup, TCP connect and TLS handshake (new connections only),
+sending the request, waiting for the first byte of the response and
+reading its body. When the request finishes the phases, bytes sent and
+received, the status and the retries are added to the histograms and
+counters of its endpoint (the API method, e.g. files.upload).
+'''
+
+import threading
+import time
+from contextlib import contextmanager
+
+PHASES = ('dns', 'connect', 'tls', 'send', 'ttfb', 'transfer', 'total')
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+           30.0, 60.0, float('inf'))
+
+_local = threading.local()
+
+
+class Histogram(object):
+    '''
+    Counts observations in cumulative buckets, as OpenMetrics histograms do.
+
+    @ivar counts: Observations per bucket, not cumulative
+    @ivar count: Total number of observations
+    @ivar sum: Sum of all observations
+    '''
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        '''
+        Adds an observation.
+
+        @param value: The observed value.
+        @type value: float
+        '''
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        '''
+        Estimates a quantile as the upper bound of the bucket it falls in.
+
+        @param q: The quantile, 0 to 1.
+        @type q: float
+        @rtype: float
+        '''
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if count and seen >= rank:
+                return bound
+        return 0.0
+
+    def snapshot(self):
+        '''
+        @return: count, sum, mean, p50, p99 and the cumulative bucket counts
+                 as a list of (upper bound, count)
+        @rtype: dict
+        '''
+        cumulative, seen = [], 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            cumulative.append((bound, seen))
+        return {'count': self.count, 'sum': self.sum,
+                'mean': self.sum / self.count if self.count else 0.0,
+                'p50': self.quantile(0.5), 'p99': self.quantile(0.99),
+                'buckets': cumulative}
+
+
+class _Endpoint(object):
+    '''
+    The histograms and counters of one endpoint.
+    '''
+
+    def __init__(self):
+        self.phases = dict((phase, Histogram()) for phase in PHASES)
+        self.statuses = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.retries = 0
+
+
+class Measurement(object):
+    '''
+    The phases of one request, filled in by the connection classes.
+
+    @ivar phases: Maps a phase to the seconds spent in it
+    @ivar status: The http status of the final response, None on errors
+    @ivar retries: How often the request was sent again
+    '''
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.phases = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.status = None
+        self.retries = 0
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+
+class RequestMetrics(object):
+    '''
+    Per endpoint latency histograms and counters of the requests sent.
+
+    >>> with METRICS.measure('files.list') as measurement:
+    ...     response, content = service.request(url)
+    ...     measurement.status = response.status
+    >>> METRICS.snapshot()['files.list']['phases']['ttfb']['p99']
+    '''
+
+    def __init__(self):
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def measure(self, endpoint):
+        '''
+        Context manager measuring one request sent from this thread.
+
+        @param endpoint: The endpoint, e.g. "files.list".
+        @type endpoint: str
+        @return: The L{Measurement} to set the status and retries on.
+        '''
+        measurement = Measurement(endpoint)
+        outer = getattr(_local, 'measurement', None)
+        _local.measurement = measurement
+        start = time.time()
+        try:
+            yield measurement
+        finally:
+            _local.measurement = outer
+            measurement.add('total', time.time() - start)
+            self.record(measurement)
+
+    def record(self, measurement):
+        '''
+        Adds a finished measurement to the metrics of its endpoint.
+
+        @type measurement: L{Measurement}
+        '''
+        status = str(measurement.status or 'error')
+        with self._lock:
+            endpoint = self._endpoints.get(measurement.endpoint)
+            if endpoint is None:
+                endpoint = self._endpoints[measurement.endpoint] = _Endpoint()
+            for phase, seconds in measurement.phases.items():
+                endpoint.phases[phase].observe(seconds)
+            endpoint.statuses[status] = endpoint.statuses.get(status, 0) + 1
+            endpoint.bytes_sent += measurement.bytes_sent
+            endpoint.bytes_received += measurement.bytes_received
+            endpoint.retries += measurement.retries
+
+    def snapshot(self):
+        '''
+        Returns the metrics per endpoint: a L{Histogram.snapshot} per phase,
+        the number of responses per status, the bytes sent and received and
+        the number of retries.
+
+        @rtype: dict
+        '''
+        with self._lock:
+            return dict((name, {
+                'phases': dict((phase, histogram.snapshot())
+                               for phase, histogram in
+                               endpoint.phases.items() if histogram.count),
+                'statuses': dict(endpoint.statuses),
+                'bytes_sent': endpoint.bytes_sent,
+                'bytes_received': endpoint.bytes_received,
+                'retries': endpoint.retries,
+                }) for name, endpoint in self._endpoints.items())
+
+    def openmetrics(self, prefix='slack_request'):
+        '''
+        Returns the metrics in the OpenMetrics text format.
+
+        @param prefix: Prefix of the metric names.
+        @type prefix: str
+        @rtype: str
+        '''
+        snapshot = self.snapshot()
+        lines = ['# TYPE {p}_phase_seconds histogram'.format(p=prefix),
+                 '# UNIT {p}_phase_seconds seconds'.format(p=prefix)]
+        for name, endpoint in sorted(snapshot.items()):
+            for phase, histogram in sorted(endpoint['phases'].items()):
+                labels = 'endpoint="{e}",phase="{p}"'.format(e=name, p=phase)
+                for bound, count in histogram['buckets']:
+                    lines.append('{p}_phase_seconds_bucket{{{l},le="{b}"}} '
+                                 '{c}'.format(p=prefix, l=labels,
+                                              b=_format_bound(bound), c=count))
+                lines.append('{p}_phase_seconds_sum{{{l}}} {s!r}'.format(
+                    p=prefix, l=labels, s=histogram['sum']))
+                lines.append('{p}_phase_seconds_count{{{l}}} {c}'.format(
+                    p=prefix, l=labels, c=histogram['count']))
+        counters = [('responses', 'statuses'), ('sent_bytes', 'bytes_sent'),
+                    ('received_bytes', 'bytes_received'),
+                    ('retries', 'retries')]
+        for metric, key in counters:
+            lines.append('# TYPE {p}_{m} counter'.format(p=prefix, m=metric))
+            for name, endpoint in sorted(snapshot.items()):
+                if key == 'statuses':
+                    for status, count in sorted(endpoint[key].items()):
+                        lines.append('{p}_{m}_total{{endpoint="{e}",'
+                                     'status="{s}"}} {c}'.format(
+                                         p=prefix, m=metric, e=name,
+                                         s=status, c=count))
+                else:
+                    lines.append('{p}_{m}_total{{endpoint="{e}"}} {v}'.format(
+                        p=prefix, m=metric, e=name, v=endpoint[key]))
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        '''
+        Forgets all metrics.
+        '''
+        with self._lock:
+            self._endpoints.clear()
+
+
+def add_phase(phase, seconds):
+    '''
+    Adds time spent in a phase to the request measured in this thread, if
+    any.
+
+    @param phase: One of L{PHASES}.
+    @type phase: str
+    @param seconds: The time spent.
+    @type seconds: float
+    '''
+    measurement = getattr(_local, 'measurement', None)
+    if measurement is not None:
+        measurement.add(phase, seconds)
+
+
+def add_bytes(sent=0, received=0):
+    '''
+    Adds bytes sent or received to the request measured in this thread, if
+    any.
+
+    @type sent: int
+    @type received: int
+    '''
+    measurement = getattr(_local, 'measurement', None)
+    if measurement is not None:
+        measurement.bytes_sent += sent
+        measurement.bytes_received += received
+
+
+def _format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(bound)
+
+
+METRICS = RequestMetrics()
@@ -0,0 +1,266 @@
+'''
+Module for pooling persistent HTTP(S) connections to a slack deployment.
+
+httplib2 keeps exactly one live connection per scheme and host inside each
+C{httplib2.Http} object, and an C{Http} object must not be shared between
+threads. The pool below hands out whole C{Http} objects, so a checked out
+object owns its keep-alive socket (and the TLS session on it) until it is
+returned.
+'''
+
+import threading
+import time
+from contextlib import contextmanager
+
+
+class ConnectionPool(object):
+    '''
+    A bounded, thread-safe pool of persistent connections, grouped per host.
+
+    @ivar _factory: Callable that creates a new C{httplib2.Http} object.
+    @ivar _max_connections: Max number of connections per host, counting
+                            both checked out and idle connections.
+    @ivar _max_idle: Max number of idle connections kept per host.
+    @ivar _idle_timeout: Seconds an idle connection may stay in the pool
+                         before it is closed and evicted.
+    @ivar _idle: Maps a host to a list of (last_used, connection) tuples.
+    @ivar _in_use: Maps a host to the number of checked out connections.
+    '''
+
+    def __init__(self, factory, max_connections=10, max_idle=4,
+                 idle_timeout=60):
+        '''
+        Creates a new, empty connection pool.
+
+        @param factory: Callable returning a new C{httplib2.Http} object.
+        @type factory: function
+        @param max_connections: Max number of connections per host.
+        @type max_connections: int
+        @param max_idle: Max number of idle connections kept per host.
+        @type max_idle: int
+        @param idle_timeout: Seconds before an idle connection is evicted.
+        @type idle_timeout: int
+        '''
+        if max_connections < 1:
+            raise ValueError('max_connections must be at least 1')
+        self._factory = factory
+        self._max_connections = max_connections
+        self._max_idle = min(max_idle, max_connections)
+        self._idle_timeout = idle_timeout
+        self._idle = {}
+        self._in_use = {}
+        self._created = 0
+        self._reused = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+
+    @property
+    def max_connections(self):
+        '''
+        The max number of connections per host.
+
+        @rtype: int
+        '''
+        return self._max_connections
+
+    @property
+    def max_idle(self):
+        '''
+        The max number of idle connections kept per host.
+
+        @rtype: int
+        '''
+        return self._max_idle
+
+    @property
+    def idle_timeout(self):
+        '''
+        The seconds an idle connection may stay in the pool.
+
+        @rtype: int
+        '''
+        return self._idle_timeout
+
+    def checkout(self, host, timeout=None):
+        '''
+        Checks out a connection for the given host.
+
+        An idle connection is reused if there is one, otherwise a new one is
+        created as long as the host is below L{max_connections}. When the
+        host is at its limit this call blocks until a connection is returned.
+
+        @param host: The pool key, "scheme://host[:port]".
+        @type host: str
+        @param timeout: Seconds to wait for a free connection, None to wait
+                        forever.
+        @type timeout: float
+        @return: The checked out connection.
+        @rtype: C{httplib2.Http}
+        @raise PoolTimeout: If no connection became free within timeout.
+        '''
+        deadline = None if timeout is None else time.time() + timeout
+        with self._available:
+            while True:
+                self._evict_expired(host)
+                idle = self._idle.get(host)
+                if idle:
+                    _, connection = idle.pop()
+                    self._in_use[host] = self._in_use.get(host, 0) + 1
+                    self._reused += 1
+                    return connection
+                if self._in_use.get(host, 0) < self._max_connections:
+                    self._in_use[host] = self._in_use.get(host, 0) + 1
+                    self._created += 1
+                    generation = self._generation
+                    break
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise PoolTimeout(host, timeout)
+                self._available.wait(remaining)
+        # The factory may be slow, so it is called outside the lock.
+        try:
+            connection = self._factory()
+        except Exception:
+            with self._available:
+                self._in_use[host] -= 1
+                self._available.notify()
+            raise
+        connection._pool_generation = generation
+        return connection
+
+    def checkin(self, host, connection, discard=False):
+        '''
+        Returns a connection that was checked out with L{checkout}.
+
+        @param host: The pool key the connection was checked out with.
+        @type host: str
+        @param connection: The connection to return.
+        @type connection: C{httplib2.Http}
+        @param discard: If True the connection is closed instead of kept,
+                        use this when a request failed half way through.
+        @type discard: bool
+        '''
+        with self._available:
+            self._in_use[host] = max(self._in_use.get(host, 0) - 1, 0)
+            idle = self._idle.setdefault(host, [])
+            stale = getattr(connection, '_pool_generation',
+                            None) != self._generation
+            if discard or stale or len(idle) >= self._max_idle:
+                self._available.notify()
+            else:
+                idle.append((time.time(), connection))
+                self._available.notify()
+                connection = None
+        if connection is not None:
+            _close(connection)
+
+    @contextmanager
+    def connection(self, host, timeout=None):
+        '''
+        Context manager that checks out a connection and returns it when
+        the block exits. The connection is discarded if the block raises.
+
+        >>> with pool.connection('https://slack.com') as http:
+        ...     http.request('https://slack.com/api/api.test')
+
+        @param host: The pool key, "scheme://host[:port]".
+        @type host: str
+        @param timeout: Seconds to wait for a free connection.
+        @type timeout: float
+        '''
+        connection = self.checkout(host, timeout)
+        try:
+            yield connection
+        except BaseException:
+            self.checkin(host, connection, discard=True)
+            raise
+        self.checkin(host, connection)
+
+    def evict_idle(self):
+        '''
+        Closes and removes every idle connection that has been unused for
+        longer than the idle timeout.
+        '''
+        with self._available:
+            for host in list(self._idle.keys()):
+                self._evict_expired(host)
+
+    def clear(self):
+        '''
+        Closes and removes all idle connections. Connections that are
+        currently checked out are closed when they are returned.
+        '''
+        with self._available:
+            idle, self._idle = self._idle, {}
+            self._generation += 1
+        for connections in idle.values():
+            for _, connection in connections:
+                _close(connection)
+
+    def stats(self):
+        '''
+        Returns a snapshot of the pool usage.
+
+        @return: Number of connections created, reused, in use and idle.
+        @rtype: dict
+        '''
+        with self._available:
+            return {
+                'created': self._created,
+                'reused': self._reused,
+                'in_use': sum(self._in_use.values()),
+                'idle': sum(len(idle) for idle in self._idle.values()),
+            }
+
+    def _evict_expired(self, host):
+        '''
+        Drops the expired idle connections of a host, the lock must be held.
+
+        @param host: The pool key.
+        @type host: str
+        '''
+        idle = self._idle.get(host)
+        if not idle:
+            return
+        oldest_allowed = time.time() - self._idle_timeout
+        # Connections are appended on checkin, so the list is sorted by age.
+        expired = 0
+        while expired < len(idle) and idle[expired][0] < oldest_allowed:
+            _close(idle[expired][1])
+            expired += 1
+        if expired:
+            del idle[:expired]
+
+
+def _close(connection):
+    '''
+    Closes all the sockets held by an C{httplib2.Http} object.
+
+    @param connection: The connection to close.
+    @type connection: C{httplib2.Http}
+    '''
+    for conn in connection.connections.values():
+        try:
+            conn.close()
+        except Exception:
+            pass
+    connection.connections.clear()
+
+
+class PoolTimeout(RuntimeError):
+    '''
+    Raised when no pooled connection became available in time.
+    '''
+
+    def __init__(self, host, seconds_waited):
+        self.host = host
+        self.seconds_waited = seconds_waited
+        super(PoolTimeout, self).__init__(self._error_message)
+
+    @property
+    def _error_message(self):
+        message = 'No connection to {0} became available after {1} seconds'
+        return message.format(self.host, self.seconds_waited)
@@ -0,0 +1,229 @@
+'''
+Module for the result of a REST request.
+
+The content is kept as the raw bytes received and only decoded as JSON when
+asked for, at most once. Top-level keys such as "ok" and "error" can be
+read without decoding the rest of the document: the keys are scanned in
+order, stepping over the strings and numbers of other keys. Stepping over
+an object or a list in Python would cost more than decoding the whole
+document in C, so the scan stops at the first one it would have to skip
+and the document is decoded instead.
+'''
+
+import json
+import re
+from json.decoder import scanstring
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_STRING = re.compile(r'"(?:[^"\\]|\\.)*"', re.DOTALL)
+_SCALAR = re.compile(r'[^,}\]\s]*')
+_DECODER = json.JSONDecoder()
+
+DEFAULT_DECODER = json.loads
+
+
+class RESTResponse(object):
+    '''
+    The http response and content of a request.
+
+    Unpacks like the (response, content) tuple make_request used to return:
+
+    >>> response, content = conn.make_request('GET', uri)
+
+    and decodes the content lazily:
+
+    >>> result = conn.make_request('GET', uri)
+    >>> if not result.ok:
+    ...     raise AssertionError(result.error)
+    >>> files = result.json['files']
+
+    @ivar response: The http response
+    @ivar content: The raw response content
+    '''
+
+    def __init__(self, response, content, decoder=None):
+        '''
+        Creates a new response.
+
+        @param response: The http response.
+        @type response: C{httplib2.Response}
+        @param content: The raw response content.
+        @type content: str
+        @param decoder: Function decoding a JSON document, defaults to
+                        L{DEFAULT_DECODER}.
+        @type decoder: function
+        '''
+        self.response = response
+        self.content = content
+        self._decoder = decoder or DEFAULT_DECODER
+        self._json = None
+        self._decoded = False
+        # top-level keys extracted so far, and the ones found missing
+        self._extracted = {}
+        self._missing = set()
+
+    @property
+    def status(self):
+        '''
+        The http status code.
+
+        @rtype: int
+        '''
+        return self.response.status
+
+    @property
+    def json(self):
+        '''
+        The decoded content, decoded on first access only.
+
+        @rtype: dict
+        @raise ValueError: If the content is not JSON.
+        '''
+        if not self._decoded:
+            self._json = self._decoder(self.content)
+            self._decoded = True
+        return self._json
+
+    def get(self, key, default=None):
+        '''
+        Returns the value of a top-level key of a JSON object content,
+        without decoding the whole document unless that has already been
+        done.
+
+        @param key: The key.
+        @type key: str
+        @param default: Returned if the key is missing.
+        @rtype: object
+        @raise ValueError: If the content is not a JSON object.
+        '''
+        return self.extract(key).get(key, default)
+
+    def extract(self, *keys):
+        '''
+        Returns the values of top-level keys of a JSON object content. The
+        document is scanned until all keys have been found, or decoded if
+        the scan would have to skip a nested value, see L{extract_keys}.
+        Each key is looked for at most once.
+
+        @param keys: The keys.
+        @type keys: str
+        @return: Maps each key found to its value.
+        @rtype: dict
+        @raise ValueError: If the content is not a JSON object.
+        '''
+        if not self._decoded:
+            wanted = [key for key in keys
+                      if key not in self._extracted and
+                      key not in self._missing]
+            if wanted:
+                found = extract_keys(self.content, wanted,
+                                     decode=lambda content: self.json)
+                self._extracted.update(found)
+                self._missing.update(key for key in wanted
+                                     if key not in found)
+        if self._decoded:
+            return dict((key, self._json[key]) for key in keys
+                        if key in self._json)
+        return dict((key, self._extracted[key]) for key in keys
+                    if key in self._extracted)
+
+    @property
+    def ok(self):
+        '''
+        The "ok" flag slack sends with every response.
+
+        @rtype: bool
+        '''
+        return bool(self.get('ok'))
+
+    @property
+    def error(self):
+        '''
+        The "error" slack sends with failed requests, None if there is none.
+
+        @rtype: str
+        '''
+        return self.get('error')
+
+    def __iter__(self):
+        return iter((self.response, self.content))
+
+    def __getitem__(self, index):
+        return (self.response, self.content)[index]
+
+    def __len__(self):
+        return 2
+
+    def __repr__(self):
+        return '<RESTResponse status={s} length={l}>'.format(
+            s=self.response.status, l=len(self.content))
+
+
+def extract_keys(content, keys, decode=None):
+    '''
+    Returns the values of top-level keys of a JSON object, stopping as soon
+    as all of them have been found. The strings and numbers of other keys
+    are stepped over; at the first object or list of another key the whole
+    content is decoded instead, which is faster than skipping it.
+
+    @param content: A JSON object.
+    @type content: str
+    @param keys: The keys.
+    @type keys: iterable
+    @param decode: Function decoding the whole content, defaults to
+                   C{json.loads}.
+    @type decode: function
+    @return: Maps each key found to its value.
+    @rtype: dict
+    @raise ValueError: If the content is not a JSON object.
+    '''
+    wanted = set(keys)
+    found = {}
+    index = _WHITESPACE.match(content, 0).end()
+    if content[index:index + 1] != '{':
+        raise ValueError('Expected a JSON object')
+    index += 1
+    while wanted:
+        index = _WHITESPACE.match(content, index).end()
+        char = content[index:index + 1]
+        if char == '}':
+            break
+        if char != '"':
+            raise ValueError('Expected a key at {0}'.format(index))
+        key, index = scanstring(content, index + 1)
+        index = _WHITESPACE.match(content, index).end()
+        if content[index:index + 1] != ':':
+            raise ValueError('Expected ":" at {0}'.format(index))
+        index = _WHITESPACE.match(content, index + 1).end()
+        if key in wanted:
+            found[key], index = _DECODER.raw_decode(content, index)
+            wanted.discard(key)
+        elif content[index:index + 1] in ('{', '['):
+            document = (decode or json.loads)(content)
+            if not isinstance(document, dict):
+                raise ValueError('Expected a JSON object')
+            found.update((key, document[key]) for key in wanted
+                         if key in document)
+            break
+        else:
+            index = _skip_scalar(content, index)
+        index = _WHITESPACE.match(content, index).end()
+        if content[index:index + 1] == ',':
+            index += 1
+    return found
+
+
+def _skip_scalar(content, index):
+    '''
+    Returns the index right after the string, number, true, false or null
+    starting at index.
+
+    @rtype: int
+    @raise ValueError: If a string doesn't end.
+    '''
+    if content[index:index + 1] == '"':
+        match = _STRING.match(content, index)
+        if match is None:
+            raise ValueError('Unterminated string at {0}'.format(index))
+        return match.end()
+    return _SCALAR.match(content, index).end()
@@ -3,7 +3,18 @@
 '''
 
 from .base import Connector
+from .pool import ConnectionPool
+from .connection import CONNECTION_TYPES
+from .batch import run_batch
+from .throttle import RequestScheduler
+from .cache import ResponseCache
+from .response import RESTResponse
+from .trace import RequestTracer
+from .metrics import METRICS
+import threading
+import time
 import urllib
+import urlparse
 import httplib2
 import ssl
 import json
@@ -23,15 +34,48 @@ class RESTConnector(Connector):
 
     When slack is restarted or upgraded the connector {tries} to login again
 
-    @ivar _service: The underlying service, aka the http request object
-    @cvar HEADERS: The default headers to pass with http request. this will
-    get appended with the 'Authorization' key when sessionkey is used
+    Requests are sent over a L{ConnectionPool} of persistent connections,
+    so several threads can share one connector and every request reuses an
+    already established TLS connection to its host whenever one is idle.
+
+    Every request goes through a L{RequestScheduler}, which keeps each API
+    method within its rate limit and resends requests answered with 429
+    once the Retry-After time has passed.
+
+    GET requests to read-only API methods can be answered from a
+    L{ResponseCache}, see L{enable_cache}.
+
+    The phases, sizes, statuses and retries of all requests are recorded per
+    API method in L{METRICS<testingframework.connector.metrics.METRICS>}.
+
+    @ivar _pool: The pool of underlying services, aka the http request objects
+    @ivar _scheduler: The scheduler every request waits on before it is sent
+    @ivar _cache: The response cache, None unless enabled
+    @ivar _json_decoder: Function decoding JSON content, None for the
+    default one
+    @ivar _tracer: Writes the traces of the requests to the log
+    @ivar _headers: The headers of this connector, replaced as a whole (never
+    changed in place) by L{update_headers}, so a request can use the dict it
+    read without locking
+    @cvar HEADERS: The default headers to pass with http request, copied into
+    each connector. The 'Authorization' key gets added to a request when the
+    sessionkey is used
+    @cvar MAX_CONNECTIONS: Default max number of connections per host
+    @cvar MAX_IDLE: Default max number of idle connections kept per host
+    @cvar IDLE_TIMEOUT: Default seconds an idle connection is kept open
+    @cvar BATCH_WORKERS: Default number of threads used by L{make_requests}
+    @cvar THROTTLE_RETRIES: Max number of times a request answered with 429
+    is sent again
 
     """
     HEADERS = {'content-type': 'text/xml; charset=utf-8'}
     METHODS = ['GET', 'POST', 'PUT', 'DELETE']
     SUCCESS = {'GET': '200', 'POST': '201', 'DELETE': '200', 'PUT': '200'}
-
+    MAX_CONNECTIONS = 10
+    MAX_IDLE = 4
+    IDLE_TIMEOUT = 60
+    BATCH_WORKERS = MAX_CONNECTIONS
+    THROTTLE_RETRIES = 5
 
     def __init__(self, slack, test_token=None):
         """
@@ -55,15 +99,139 @@ class RESTConnector(Connector):
         self._disable_ssl_certificate = True
         self._follow_redirects = False
         httplib2.debuglevel = self._debug_level
-        self._service = httplib2.Http(timeout=self._timeout,
-                                      disable_ssl_certificate_validation=
-                                      self._disable_ssl_certificate)
-        self._service.follow_redirects = self._follow_redirects
-        #self._service.add_credentials(self._test_token)
+        self._pool = ConnectionPool(self._create_service,
+                                    max_connections=self.MAX_CONNECTIONS,
+                                    max_idle=self.MAX_IDLE,
+                                    idle_timeout=self.IDLE_TIMEOUT)
+        self._scheduler = RequestScheduler()
+        self._cache = None
+        self._json_decoder = None
+        self._tracer = RequestTracer(self.logger)
+        self._headers = _lower_keys(self.HEADERS)
+        self._headers_lock = threading.Lock()
+        self._cassette = None
         slack.register_start_listener(self)
 
+    def _create_service(self):
+        """
+        Creates a new http request object with the current settings.
+        Used by the connection pool whenever it needs a new connection.
+
+        @rtype: C{httplib2.Http}
+        """
+        service = httplib2.Http(timeout=self._timeout,
+                                disable_ssl_certificate_validation=
+                                self._disable_ssl_certificate)
+        service.follow_redirects = self._follow_redirects
+        #service.add_credentials(self._test_token)
+        return service
+
+    def _recreate_service(self):
+        """
+        Drops all pooled connections so that new ones are created with the
+        current settings on the next request.
+        """
+        self._pool.clear()
+
+    def pool_limits(self, max_connections=None, max_idle=None,
+                    idle_timeout=None):
+        """
+        Overrides the limits of the connection pool.
+        Connections that are already open are closed.
+
+        @type max_connections: int
+        @param max_connections: max number of connections per host
+        @type max_idle: int
+        @param max_idle: max number of idle connections kept per host
+        @type idle_timeout: int
+        @param idle_timeout: seconds an idle connection is kept open
+
+        """
+        old_pool = self._pool
+        self._pool = ConnectionPool(
+            self._create_service,
+            max_connections=max_connections or old_pool.max_connections,
+            max_idle=max_idle if max_idle is not None else old_pool.max_idle,
+            idle_timeout=idle_timeout or old_pool.idle_timeout)
+        old_pool.clear()
+
+    @property
+    def pool(self):
+        """
+        The connection pool this connector sends its requests through.
+
+        @rtype: L{ConnectionPool}
+        """
+        return self._pool
+
+    def rate_limits(self, rate_limits=None, max_concurrency=None):
+        """
+        Overrides the rate limits requests are scheduled with.
+
+        @type rate_limits: dict
+        @param rate_limits: requests per minute per API method, defaults to
+                            L{SLACK_RATE_LIMITS<testingframework.connector.throttle.SLACK_RATE_LIMITS>}
+        @type max_concurrency: int
+        @param max_concurrency: max number of requests in flight
+
+        """
+        kwargs = {'rate_limits': rate_limits}
+        if max_concurrency is not None:
+            kwargs['max_concurrency'] = max_concurrency
+        self._scheduler = RequestScheduler(**kwargs)
+
+    @property
+    def scheduler(self):
+        """
+        The scheduler requests wait on, assign the scheduler of another
+        connector to share its rate limits.
+
+        @rtype: L{RequestScheduler}
+        """
+        return self._scheduler
+
+    @scheduler.setter
+    def scheduler(self, scheduler):
+        self._scheduler = scheduler
+
+    def enable_cache(self, max_bytes=None, ttls=None):
+        """
+        Caches the responses of GET requests to read-only API methods.
+        Any other request to the same API method family, e.g. a
+        files.delete, drops the cached files.* responses.
+
+        @type max_bytes: int
+        @param max_bytes: max total size of the cached responses
+        @type ttls: dict
+        @param ttls: seconds the responses are cached per API method,
+                     defaults to
+                     L{DEFAULT_TTLS<testingframework.connector.cache.DEFAULT_TTLS>}
+
+        >>> conn.enable_cache(ttls={'files.list': 30})
+
+        """
+        kwargs = {'ttls': ttls}
+        if max_bytes is not None:
+            kwargs['max_bytes'] = max_bytes
+        self._cache = ResponseCache(**kwargs)
+
+    def disable_cache(self):
+        """
+        Stops caching responses and drops the cached ones.
+        """
+        self._cache = None
+
+    @property
+    def cache(self):
+        """
+        The response cache, None unless L{enable_cache} has been called.
+
+        @rtype: L{ResponseCache}
+        """
+        return self._cache
+
     def make_request(self, method, uri, body=None, urlparam=None,
-                     use_sessionkey=False):
+                     use_sessionkey=False, headers=None):
         """
         Make a HTTP request to an endpoint
 
@@ -72,19 +240,31 @@ class RESTConnector(Connector):
         @type  uri: string
         @param uri: URI of the REST endpoint
         @type  body: string or dictionary or a sequence of two-element tuples
+                     or a file-like object with read(), seek() and len()
         @param body: the request body
         @type  urlparam: string/ dictionary or a sequence of two-element tuples
         @param urlparam: the URL parameters
         @type  use_sessionkey: bool
         @param use_sessionkey: toggle for using sessionkey or not
+        @type  headers: dict
+        @param headers: headers for this request only, added to or
+                        overriding the headers of the connector
+        @rtype: L{RESTResponse}
+        @return: the response, which unpacks to (response, content) and
+                 decodes JSON content on demand
 
         >>> conn.make_request('POST', '/services/receivers/simple',
         urlparam={'host': 'foo'}, body="my event")
+        >>> conn.make_request('POST', 'slack.com/api/files.upload',
+        body=body, headers={'content-type': content_type})
 
         """
         if body is None:
             body = ''
-        if type(body) != str:
+        # streamed bodies (see encode_multipart_formdata_stream) are passed
+        # on as is, httplib sends them block by block and the connection
+        # rewinds them before every send
+        if type(body) != str and not hasattr(body, 'read'):
             body = urllib.urlencode(body)
         if urlparam is None:
             urlparam = ''
@@ -95,53 +275,204 @@ class RESTConnector(Connector):
         else:
             url = "%s%s" % (self.uri_base, uri)
 
+        # the headers of this request, built from the connector's headers
+        # without changing them
+        request_headers = dict(self._headers)
+        if headers:
+            request_headers.update(_lower_keys(headers))
         if use_sessionkey:
-            self._service.clear_credentials()
-            self.update_headers('Authorization',
-                                'Slack %s' % self.sessionkey)
+            request_headers['authorization'] = 'Slack %s' % self.sessionkey
         else:
-            if not self._service.credentials:
-                self._service.add_credentials(self._username, self._password)
-            if 'Authorization' in self.HEADERS:
-                self.HEADERS.pop('Authorization')
-        response, content = self._service.request(
-            url, method, body=body, headers=self.HEADERS)
-
-        self.logger.info("Request  => {r}".format(r={
-            'method': method,
-            'url': url,
-            'body': body,
-            #'auth': '{u}:{p}'.format(u=self._username, p=self._password),
-            'header': self.HEADERS
-            }))
-        self.logger.info("Response => {r}".format(r=response))
-        self.logger.debug("Content  => {c}".format(c=content))
-
-        return response, content
+            request_headers.pop('authorization', None)
+
+        cassette = self._cassette
+        if cassette is not None and cassette.replaying:
+            played = cassette.play(method, url, body, request_headers)
+            if played is not None:
+                return RESTResponse(*played, decoder=self._json_decoder)
+            cassette = None
+        scheme, netloc, path = urlparse.urlsplit(url)[:3]
+        host = '%s://%s' % (scheme, netloc)
+        api_method = path.rstrip('/').rsplit('/', 1)[-1]
+        cache = self._cache
+        cache_key = etag = None
+        if cache is not None and cache.cacheable(method, api_method):
+            cache_key = cache.key(method, url, 'Slack %s' % self.sessionkey
+                                  if use_sessionkey else self._test_token)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                self.logger.info("Cache hit => {u}".format(u=url))
+                if cassette is not None:
+                    cassette.record(method, url, body, request_headers,
+                                    cached[0], cached[1], 0.0)
+                return RESTResponse(*cached, decoder=self._json_decoder)
+            etag = cache.etag(cache_key)
+            generation = cache.generation(api_method)
+        trace = self._tracer.sample()
+        start = time.time()
+        with METRICS.measure(api_method) as measurement:
+            for attempt in range(self.THROTTLE_RETRIES + 1):
+                with self._scheduler.slot(api_method):
+                    with self._pool.connection(host) as service:
+                        if use_sessionkey:
+                            service.clear_credentials()
+                        elif not service.credentials:
+                            service.add_credentials(self._username,
+                                                    self._password)
+                        if etag is not None:
+                            request_headers['if-none-match'] = etag
+                        response, content = service.request(
+                            url, method, body=body, headers=request_headers,
+                            connection_type=CONNECTION_TYPES[scheme])
+                measurement.status = response.status
+                measurement.retries = attempt
+                if response.status != 429 or attempt == self.THROTTLE_RETRIES:
+                    break
+                seconds = self._scheduler.throttled(
+                    api_method, response.get('retry-after'))
+                self.logger.warn("{m} rate limited, retrying in {s}s".format(
+                    m=api_method, s=seconds))
+
+        if cache_key is not None:
+            if response.status == 304:
+                response, content = cache.revalidated(cache_key) or (
+                    response, content)
+            elif response.status == 200:
+                cache.store(cache_key, api_method, response, content,
+                            generation)
+        elif cache is not None:
+            cache.invalidate(api_method)
+
+        if cassette is not None:
+            cassette.record(method, url, body, request_headers, response,
+                            content, time.time() - start)
+        if trace:
+            self._tracer.request(method, url, request_headers, body)
+            self._tracer.response(response, content, time.time() - start)
+
+        return RESTResponse(response, content, decoder=self._json_decoder)
+
+    def make_requests(self, batch, workers=None):
+        """
+        Makes a batch of HTTP requests concurrently.
+
+        The requests run on a pool of worker threads which share the
+        connection pool of this connector. A request that raises does not
+        abort the others, its error is captured in its result instead.
+
+        @type  batch: list
+        @param batch: request specs, each a dict of keyword arguments or a
+                      tuple of positional arguments for L{make_request}
+        @type  workers: int
+        @param workers: max number of requests in flight, defaults to
+                        L{BATCH_WORKERS}
+        @rtype: list
+        @return: one L{BatchResult<testingframework.connector.batch.BatchResult>}
+                 per spec, in the order the specs were given
+
+        >>> results = conn.make_requests(
+        ...     [('DELETE', 'slack.com/api/files.delete', None,
+        ...       {'token': token, 'file': file_id}) for file_id in ids])
+        >>> failed = [r for r in results if r.failed]
+
+        """
+        # Always the blocking request, also for subclasses whose own
+        # make_request doesn't wait for the response.
+        def make_request(*args, **kwargs):
+            return RESTConnector.make_request(self, *args, **kwargs)
+        return run_batch(make_request, batch, workers or self.BATCH_WORKERS)
 
     def parse_content_json(self, content):
         """
         Parses the content object (in json format) to python dict
 
-        @type content: json
-        @param content: content object from http request in json format
+        @type content: json or L{RESTResponse}
+        @param content: content object from http request in json format,
+                        or the response returned by L{make_request}, whose
+                        content is decoded only once
         """
-
-        return json.loads(str(content))
+        if isinstance(content, RESTResponse):
+            return content.json
+        return (self._json_decoder or json.loads)(content)
 
     def update_headers(self, key=None, value=None):
         """
-        Appends a key,value pair to the HEADERS
+        Sets a header sent with every request of this connector. Other
+        connectors are not affected. For a header of a single request pass
+        headers to L{make_request} instead.
 
         @type key: str
-        @param key: key to append to  HEADERS
+        @param key: the header name
         @type value: str
-        @param value: value for that key to append to  HEADERS
+        @param value: the header value, None removes the header
+
+        """
+        with self._headers_lock:
+            headers = dict(self._headers)
+            headers.pop(key.lower(), None)
+            if value is not None:
+                headers[key.lower()] = value
+            self._headers = headers
+
+    @property
+    def headers(self):
+        """
+        A copy of the headers sent with every request of this connector.
+
+        @rtype: dict
+        """
+        return dict(self._headers)
+
+    def tracing(self, level=None, sample=None, max_body=None, digest=None):
+        """
+        Overrides how requests are traced to the log. Nothing is formatted
+        for requests that are not traced.
+
+        @type level: int
+        @param level: logging level of the traces, DEBUG by default
+        @type sample: int
+        @param sample: trace 1 in this many requests
+        @type max_body: int
+        @param max_body: max number of body bytes written
+        @type digest: bool
+        @param digest: write the SHA-1 of bodies instead of their start
+
+        >>> conn.tracing(level=logging.INFO, sample=100, digest=True)
+
+        """
+        if level is not None:
+            self._tracer.level = level
+        if sample is not None:
+            self._tracer.every = max(1, sample)
+        if max_body is not None:
+            self._tracer.max_body = max_body
+        if digest is not None:
+            self._tracer.digest = digest
+
+    def json_decoder(self, value):
+        """
+        Overrides the function responses decode JSON content with, e.g. the
+        loads of a faster JSON library
+
+        @type value: function
+        @param value: function taking a JSON document and returning the
+                      decoded object, None for C{json.loads}
+
+        """
+
+        self._json_decoder = value
+
+    def use_cassette(self, cassette):
+        """
+        Records the exchanges of this connector to a cassette, or answers
+        requests from it, see L{Cassette.use}
+
+        @type cassette: L{Cassette}
+        @param cassette: the cassette, None to go back to the network
 
         """
-        if key in self.HEADERS:
-            self.HEADERS.pop(key)
-        self.HEADERS.update({key: value})
+
+        self._cassette = cassette
 
     def debug_level(self, value):
         """
@@ -216,3 +547,12 @@ class RESTConnector(Connector):
         dom = parseString(content)
         xmlTag = dom.getElementsByTagName(tag)[0].toxml()
         return xmlTag
+
+
+def _lower_keys(headers):
+    '''
+    Returns a copy of headers with lower case names, as httplib2 sends them.
+
+    @rtype: dict
+    '''
+    return dict((key.lower(), value) for key, value in headers.items())
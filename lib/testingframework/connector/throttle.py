@@ -0,0 +1,252 @@
+'''
+Module for keeping requests to a slack deployment within its rate limits.
+
+Every API method (files.list, files.upload, ...) gets its own token bucket.
+A request takes a token before it is sent and waits for one if the bucket is
+empty, so bursts are queued instead of being answered with 429. When the
+server answers 429 anyway, the bucket of that method is paused for the time
+given in the Retry-After header.
+
+The workers of a parallel run each have their own schedulers, so by
+default each one only uses its share of L{SLACK_RATE_LIMITS}.
+'''
+
+import calendar
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_tz
+from testingframework.parallel import worker_count
+
+# Requests per minute allowed by slack for the methods used in the tests,
+# methods not listed here are only throttled when the server answers 429.
+SLACK_RATE_LIMITS = {
+    'files.upload': 20,
+    'files.list': 50,
+    'files.delete': 50,
+    'files.info': 100,
+}
+
+MAX_CONCURRENCY = 50
+BURST_SECONDS = 10
+DEFAULT_RETRY_AFTER = 1
+
+
+class TokenBucket(object):
+    '''
+    A thread-safe token bucket. Tokens are handed out in the order they are
+    asked for, a caller that finds the bucket empty is told how long to wait
+    for its token.
+
+    @ivar rate: Tokens added per second, None for no limit.
+    @ivar capacity: Max number of tokens the bucket holds.
+    '''
+
+    def __init__(self, rate, capacity, clock=time.time):
+        '''
+        Creates a new, full, token bucket.
+
+        @param rate: Tokens added per second, None for no limit.
+        @type rate: float
+        @param capacity: Max number of tokens the bucket holds.
+        @type capacity: float
+        @param clock: Function returning the current time in seconds.
+        @type clock: function
+        '''
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = float(capacity)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        '''
+        Takes a token and returns how long the caller has to wait before it
+        may use it.
+
+        @return: Seconds to wait, 0 if the request can be sent right away.
+        @rtype: float
+        '''
+        with self._lock:
+            now = self._clock()
+            if now > self._updated:
+                if self.rate is not None:
+                    self._tokens = min(self.capacity, self._tokens +
+                                       (now - self._updated) * self.rate)
+                self._updated = now
+            delay = self._updated - now
+            if self.rate is not None:
+                self._tokens -= 1
+                if self._tokens < 0:
+                    delay += -self._tokens / self.rate
+            return delay
+
+    def pause(self, seconds):
+        '''
+        Hands out no tokens for the given number of seconds, used when the
+        server asks to back off. Tokens are only added again after that.
+
+        @param seconds: Seconds to pause.
+        @type seconds: float
+        '''
+        with self._lock:
+            self._updated = max(self._updated, self._clock() + seconds)
+            self._tokens = min(self._tokens, 0)
+
+
+class RequestScheduler(object):
+    '''
+    Schedules the requests of one or more connectors: one token bucket per
+    API method plus a ceiling on the number of requests in flight.
+
+    >>> with scheduler.slot('files.list'):
+    ...     response, content = http.request(url)
+
+    @ivar _buckets: Maps an API method to its L{TokenBucket}.
+    @ivar _stats: Maps an API method to its counters.
+    '''
+
+    def __init__(self, rate_limits=None, max_concurrency=MAX_CONCURRENCY,
+                 burst_seconds=BURST_SECONDS, sleep=time.sleep):
+        '''
+        Creates a new scheduler.
+
+        @param rate_limits: Maps an API method to the requests per minute it
+                            allows, defaults to the share of this worker of
+                            L{SLACK_RATE_LIMITS}, see L{worker_share}.
+        @type rate_limits: dict
+        @param max_concurrency: Max number of requests in flight.
+        @type max_concurrency: int
+        @param burst_seconds: A bucket holds this many seconds worth of
+                              tokens, which is the burst it allows.
+        @type burst_seconds: float
+        @param sleep: Function used to wait.
+        @type sleep: function
+        '''
+        if rate_limits is None:
+            rate_limits = worker_share(SLACK_RATE_LIMITS)
+        self._rate_limits = dict(rate_limits)
+        self._max_concurrency = max_concurrency
+        self._burst_seconds = burst_seconds
+        self._sleep = sleep
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._buckets = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def slot(self, api_method):
+        '''
+        Context manager that waits for a token of the API method and a free
+        request slot, and gives the slot back when the block exits.
+
+        @param api_method: The API method, e.g. "files.list".
+        @type api_method: str
+        '''
+        delay = self._bucket(api_method).reserve()
+        if delay > 0:
+            self._count(api_method, 'throttled_seconds', delay)
+            self._sleep(delay)
+        start = time.time()
+        self._slots.acquire()
+        self._count(api_method, 'queued_seconds', time.time() - start)
+        self._count(api_method, 'requests', 1)
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+    def throttled(self, api_method, retry_after=None):
+        '''
+        Pauses an API method after the server answered 429.
+
+        @param api_method: The API method, e.g. "files.list".
+        @type api_method: str
+        @param retry_after: The value of the Retry-After header, either
+                            seconds or a HTTP date.
+        @type retry_after: str
+        @return: The number of seconds the method is paused.
+        @rtype: float
+        '''
+        seconds = parse_retry_after(retry_after)
+        self._bucket(api_method).pause(seconds)
+        self._count(api_method, 'rate_limited', 1)
+        self._count(api_method, 'retry_after_seconds', seconds)
+        return seconds
+
+    def stats(self):
+        '''
+        Returns the counters per API method: number of requests, number of
+        429 answers, seconds waited for a token, seconds paused by
+        Retry-After and seconds waited for a free request slot.
+
+        @rtype: dict
+        '''
+        with self._lock:
+            return dict((method, dict(counters))
+                        for method, counters in self._stats.items())
+
+    def _bucket(self, api_method):
+        '''
+        Returns the token bucket of an API method, creating it on first use.
+
+        @rtype: L{TokenBucket}
+        '''
+        with self._lock:
+            bucket = self._buckets.get(api_method)
+            if bucket is None:
+                per_minute = self._rate_limits.get(api_method)
+                rate = per_minute / 60.0 if per_minute else None
+                capacity = max(1, (rate or 1) * self._burst_seconds)
+                bucket = self._buckets[api_method] = TokenBucket(rate,
+                                                                 capacity)
+            return bucket
+
+    def _count(self, api_method, counter, value):
+        with self._lock:
+            counters = self._stats.setdefault(api_method, {
+                'requests': 0, 'rate_limited': 0, 'throttled_seconds': 0.0,
+                'retry_after_seconds': 0.0, 'queued_seconds': 0.0})
+            counters[counter] += value
+
+
+def worker_share(rate_limits, workers=None):
+    '''
+    Divides rate limits between the workers of a parallel run, so that
+    together they stay within them.
+
+    @param rate_limits: Maps an API method to the requests per minute it
+                        allows.
+    @type rate_limits: dict
+    @param workers: Number of workers, defaults to the
+                    L{worker_count<testingframework.parallel.worker_count>}
+                    of the run.
+    @type workers: int
+    @return: The requests per minute per API method of one worker.
+    @rtype: dict
+    '''
+    workers = workers or worker_count()
+    return dict((method, float(per_minute) / workers)
+                for method, per_minute in rate_limits.items())
+
+
+def parse_retry_after(value):
+    '''
+    Parses a Retry-After header.
+
+    @param value: Seconds or a HTTP date, None if the header is missing.
+    @type value: str
+    @return: Seconds to wait.
+    @rtype: float
+    '''
+    if value is None:
+        return DEFAULT_RETRY_AFTER
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        date = parsedate_tz(value)
+        if date is None:
+            return DEFAULT_RETRY_AFTER
+        seconds = calendar.timegm(date[:9]) - (date[9] or 0) - time.time()
+        return max(0.0, seconds)
@@ -0,0 +1,160 @@
+'''
+Module for tracing the requests a connector sends.
+
+Nothing is formatted unless the trace level is enabled on the logger and
+the request is picked by the 1 in N sampling. Bodies are cut to a max size
+or replaced by a digest, streamed bodies are never read, and tokens and
+credentials are redacted.
+'''
+
+import hashlib
+import itertools
+import logging
+import re
+import threading
+
+MAX_BODY = 1024
+REDACTED = '<redacted>'
+REDACTED_PARAMS = ('token', 'password')
+REDACTED_HEADERS = ('authorization', 'cookie', 'set-cookie')
+
+
+class RequestTracer(object):
+    '''
+    Writes request and response traces to a logger.
+
+    >>> tracer = RequestTracer(conn.logger, level=logging.DEBUG, sample=10)
+    >>> if tracer.sample():
+    ...     tracer.request(method, url, headers, body)
+
+    @ivar level: The level traces are logged at
+    @ivar every: Every how many requests one is traced
+    @ivar max_body: Max number of body bytes written, 0 for none
+    @ivar digest: Write a digest of bodies instead of their start
+    '''
+
+    def __init__(self, logger, level=logging.DEBUG, sample=1,
+                 max_body=MAX_BODY, digest=False):
+        '''
+        Creates a new tracer.
+
+        @param logger: The logger to write the traces to.
+        @type logger: C{logging.Logger}
+        @param level: The level the traces are logged at, DEBUG by default
+                      so that a connector logging at INFO traces nothing.
+        @type level: int
+        @param sample: Trace 1 in this many requests.
+        @type sample: int
+        @param max_body: Max number of body bytes written.
+        @type max_body: int
+        @param digest: Write the SHA-1 of bodies instead of their start.
+        @type digest: bool
+        '''
+        self._logger = logger
+        self.level = level
+        self.every = max(1, sample)
+        self.max_body = max_body
+        self.digest = digest
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._param_pattern = re.compile(
+            r'(?<![^?&])((?:%s)=)[^&]*' % '|'.join(
+                re.escape(p) for p in REDACTED_PARAMS))
+
+    def sample(self):
+        '''
+        Checks whether the next request is to be traced. Cheap when the
+        level is off, the sampling counter only moves when it is on.
+
+        @rtype: bool
+        '''
+        if not self._logger.isEnabledFor(self.level):
+            return False
+        if self.every == 1:
+            return True
+        with self._lock:
+            return next(self._counter) % self.every == 0
+
+    def request(self, method, url, headers, body):
+        '''
+        Traces a request.
+
+        @param method: The HTTP method.
+        @type method: str
+        @param url: The full URL.
+        @type url: str
+        @param headers: The request headers.
+        @type headers: dict
+        @param body: The request body, a string or a file-like object.
+        '''
+        self._logger.log(self.level, "Request  => {r}".format(r={
+            'method': method,
+            'url': self.redact_params(url),
+            'body': self.summarize(body),
+            'header': self.redact_headers(headers),
+            }))
+
+    def response(self, response, content, elapsed):
+        '''
+        Traces a response.
+
+        @param response: The http response.
+        @type response: C{httplib2.Response}
+        @param content: The response content.
+        @type content: str
+        @param elapsed: Seconds the request took.
+        @type elapsed: float
+        '''
+        self._logger.log(self.level, "Response => {r} in {e:.3f}s".format(
+            r=self.redact_headers(response), e=elapsed))
+        # the content is only written at debug level, or below
+        content_level = min(self.level, logging.DEBUG)
+        if self._logger.isEnabledFor(content_level):
+            self._logger.log(content_level, "Content  => {c}".format(
+                c=self.summarize(content)))
+
+    def summarize(self, body):
+        '''
+        Returns what is written for a body: its start, cut at max_body
+        bytes, or its digest. Streamed bodies are described by their size
+        only, reading them would consume them.
+
+        @param body: A string or a file-like object.
+        @rtype: str
+        '''
+        if hasattr(body, 'read'):
+            try:
+                return '<streamed body of {n} bytes>'.format(n=len(body))
+            except TypeError:
+                return '<streamed body>'
+        if not body:
+            return ''
+        if self.digest:
+            return '<sha1 {d} of {n} bytes>'.format(
+                d=hashlib.sha1(body).hexdigest(), n=len(body))
+        text = self.redact_params(body[:self.max_body])
+        if len(body) > self.max_body:
+            text += '... <{n} bytes>'.format(n=len(body))
+        return text
+
+    def redact_params(self, text):
+        '''
+        Replaces the values of the URL parameters holding tokens and
+        passwords.
+
+        @param text: A URL or an urlencoded body.
+        @type text: str
+        @rtype: str
+        '''
+        return self._param_pattern.sub(r'\1' + REDACTED, text)
+
+    def redact_headers(self, headers):
+        '''
+        Returns a copy of headers with credentials replaced.
+
+        @param headers: The headers.
+        @type headers: dict
+        @rtype: dict
+        '''
+        return dict((key, REDACTED if key.lower() in REDACTED_HEADERS
+                     else value) for key, value in headers.items())
@@ -1,12 +1,21 @@
 class WaitTimedOut(RuntimeError):
     '''
     This exception is raised when a designated wait period times out.
+
+    @ivar seconds_waited: How long was actually waited.
+    @ivar description: What was waited for.
+    @ivar last_error: The error raised by the last check, if any.
     '''
-    def __init__(self, seconds_waited):
+    def __init__(self, seconds_waited, description='Search', last_error=None):
         self.seconds_waited = seconds_waited
+        self.description = description
+        self.last_error = last_error
         super(WaitTimedOut, self).__init__(self._error_message)
 
     @property
     def _error_message(self):
-        message = 'Search was not done after {0} seconds'
-        return message.format(self.seconds_waited)
+        message = '{1} was not done after {0} seconds'
+        if self.last_error is not None:
+            message += ' (last error: {2!r})'
+        return message.format(self.seconds_waited, self.description,
+                              self.last_error)
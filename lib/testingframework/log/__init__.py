@@ -4,26 +4,150 @@ Created on October, 2016
 @author: weimin
 '''
 
-import datetime
+import atexit
 import logging
+import os
+import threading
+import time
+import Queue
 from abc import ABCMeta
 
-from logging import FileHandler, Formatter
+from logging import FileHandler, Formatter, Handler
+from testingframework.parallel import worker_id
 
 _LOG_FORMAT = '[%(asctime)s] %(levelname)s - %(name)s: %(message)s'
-_DATE_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+# Milliseconds are appended to this, see TestingFrameworkFormatter
+_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
 _FILE_NAME = "testingframework.log"
+_STOP_TIMEOUT = 5
 
 class TestingFrameworkFormatter(Formatter):
 
+    def __init__(self, fmt=None, datefmt=None):
+        Formatter.__init__(self, fmt, datefmt)
+        # (second, formatted second) of the last record
+        self._last_second = (None, None)
+
     # Disabling error b/c function overrides old style Python function
     # pylint: disable=C0103
     def formatTime(self, record, datefmt=None):
-        t = datetime.datetime.now()
-        # The [:-3] is put there to trim the last three digits of the
-        # microseconds, remove it if you intend to remove microseconds
-        # from the _DATE_FORMAT
-        return t.strftime(_DATE_FORMAT)[:-3]
+        '''
+        Formats the time the record was created, with milliseconds. The
+        part up to the second is formatted once per second only.
+        '''
+        second = int(record.created)
+        last_second, text = self._last_second
+        if second != last_second:
+            text = time.strftime(_DATE_FORMAT, time.localtime(second))
+            self._last_second = (second, text)
+        return '%s.%03d' % (text, record.msecs)
+
+
+class _QueueHandler(Handler):
+    '''
+    Hands records to the listener thread instead of writing them, so logging
+    never waits for the disk.
+    '''
+
+    def __init__(self, queue):
+        Handler.__init__(self)
+        self.queue = queue
+
+    def prepare(self, record):
+        '''
+        Merges the arguments into the message and renders the traceback now,
+        the arguments may change and the traceback is gone by the time the
+        listener gets to the record.
+        '''
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _EXC_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        try:
+            self.queue.put_nowait(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+
+class _QueueListener(object):
+    '''
+    Thread that takes records off the queue, formats and writes them.
+    '''
+    _STOP = object()
+
+    def __init__(self, queue, *handlers):
+        self.queue = queue
+        self.handlers = handlers
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run,
+                                        name='testingframework.log')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        '''
+        Writes the records still queued and stops the thread.
+        '''
+        if self._thread is None:
+            return
+        self.queue.put(self._STOP)
+        self._thread.join(_STOP_TIMEOUT)
+        self._thread = None
+        for handler in self.handlers:
+            handler.flush()
+
+    def _run(self):
+        while True:
+            record = self.queue.get()
+            if record is self._STOP:
+                break
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+
+
+_EXC_FORMATTER = Formatter()
+_LOCK = threading.Lock()
+_QUEUE_HANDLER = None
+
+
+def _queue_handler():
+    '''
+    Returns the handler shared by all loggers. The log file is opened, and
+    the listener thread started, on first use only.
+
+    @rtype: L{_QueueHandler}
+    '''
+    global _QUEUE_HANDLER
+    with _LOCK:
+        if _QUEUE_HANDLER is None:
+            queue = Queue.Queue()
+            handler = FileHandler(filename=_file_name(), mode="w")
+            handler.setFormatter(TestingFrameworkFormatter(_LOG_FORMAT))
+            listener = _QueueListener(queue, handler)
+            listener.start()
+            atexit.register(listener.stop)
+            _QUEUE_HANDLER = _QueueHandler(queue)
+        return _QUEUE_HANDLER
+
+def _file_name():
+    '''
+    Returns the name of the log file. The workers of a parallel run share
+    the working directory, each of them writes a log file of its own.
+
+    @rtype: str
+    '''
+    worker = worker_id()
+    if worker is None:
+        return _FILE_NAME
+    root, ext = os.path.splitext(_FILE_NAME)
+    return '{r}-{w}{e}'.format(r=root, w=worker, e=ext)
 
 class Logging(object):
 
@@ -37,16 +161,20 @@ class Logging(object):
         """
         Setups up the logging library
 
+        All loggers share one handler, which queues the records for a
+        single thread writing them to the log file. The handler is added to
+        a logger once, however many instances use that logger.
+
         @param debug: If debug log messages are to be outputted
         @type debug: bool
         """
         logger = self.logger
-        handler = FileHandler(filename=_FILE_NAME, mode="w")
-        handler.setFormatter(TestingFrameworkFormatter(_LOG_FORMAT))
+        handler = _queue_handler()
         level = logging.INFO
         if debug:
             level = logging.DEBUG
-        logger.addHandler(handler)
+        if handler not in logger.handlers:
+            logger.addHandler(handler)
         logger.setLevel(level)
         logger.debug('Logger: debug logging is enabled')
 
@@ -0,0 +1,78 @@
+'''
+Runs a test suite in several processes at once.
+
+L{runner} starts N worker processes over the same pytest arguments. Every
+worker collects the whole suite, then takes one test at a time from a queue
+shared through a multiprocessing manager, so a worker that is done with a
+short test steals the next one instead of waiting on a fixed share of the
+suite. Session fixtures are per process: each worker builds its own slack
+deployment and connectors from the same options.
+
+Workers share one slack workspace, so the names of the files tests create
+go through L{namespaced} to keep runs out of each other's way, and they
+share its rate limits, so each worker schedules its requests within its
+L{worker_count} share of them.
+
+    python -m testingframework.parallel.runner -n 8 --junitxml=results.xml \\
+        -- -v --test_token=... test_files.py
+'''
+
+import os
+
+__all__ = ['runner', 'worker']
+
+WORKER_ENV = 'TESTINGFRAMEWORK_WORKER'
+QUEUE_ENV = 'TESTINGFRAMEWORK_QUEUE'
+RUN_ENV = 'TESTINGFRAMEWORK_RUN'
+WORKERS_ENV = 'TESTINGFRAMEWORK_WORKERS'
+
+
+def worker_id():
+    '''
+    Returns the id of the worker process this is, e.g. "w3".
+
+    @return: The worker id, None when not running in a worker.
+    @rtype: str
+    '''
+    return os.environ.get(WORKER_ENV) or None
+
+
+def run_id():
+    '''
+    Returns the id of the parallel run this worker is part of, the same in
+    all its workers.
+
+    @return: The run id, None when not running in a worker.
+    @rtype: str
+    '''
+    return os.environ.get(RUN_ENV) or None
+
+
+def worker_count():
+    '''
+    Returns the number of workers of the parallel run.
+
+    @return: The number of workers, 1 when not running in a worker.
+    @rtype: int
+    '''
+    try:
+        return max(1, int(os.environ.get(WORKERS_ENV) or 1))
+    except ValueError:
+        return 1
+
+
+def namespaced(name):
+    '''
+    Prefixes a file name with the run id, so that parallel runs never
+    upload, list or delete each other's files. All the workers of a run
+    use the same prefix: a test may delete a file another worker uploaded.
+
+    @param name: The file name.
+    @type name: str
+    @return: The name, unchanged when not running in a worker.
+    @rtype: str
+    '''
+    run = run_id()
+    if run is None:
+        return name
+    return '{r}-{n}'.format(r=run, n=name)
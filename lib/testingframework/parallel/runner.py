@@ -0,0 +1,158 @@
+'''
+The parallel runner: starts the workers, waits for them and merges their
+results into one report.
+
+    python -m testingframework.parallel.runner -n 8 --junitxml=results.xml \\
+        -- -v test_files.py
+
+Everything after "--" is passed to every worker as pytest arguments. The
+output of each worker is written to worker-<id>.log in the report
+directory and shown when the worker fails.
+'''
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ElementTree
+from testingframework.log import Logging
+from testingframework.parallel import WORKER_ENV, QUEUE_ENV, RUN_ENV, \
+    WORKERS_ENV
+from testingframework.parallel.workqueue import serve
+
+LOGGER = Logging('ParallelRunner').logger
+
+# junit testsuite attributes summed over the workers
+_COUNTS = ('tests', 'errors', 'failures', 'skips')
+
+
+def run(args, workers, junitxml=None, report_dir=None):
+    '''
+    Runs the tests of a pytest command line in parallel worker processes.
+
+    @param args: The pytest arguments.
+    @type args: list
+    @param workers: Number of worker processes.
+    @type workers: int
+    @param junitxml: File to write the merged junit xml report to.
+    @type junitxml: str
+    @param report_dir: Directory for the reports and output of the workers,
+                       a temporary one that is removed if None.
+    @type report_dir: str
+    @return: The exit code, 0 when all workers passed.
+    @rtype: int
+    '''
+    authkey = os.urandom(16)
+    run = 'r' + os.urandom(4).encode('hex')
+    manager = serve(authkey)
+    work_dir = report_dir or tempfile.mkdtemp(prefix='parallel-')
+    start = time.time()
+    try:
+        processes = []
+        for index in range(workers):
+            worker = 'w{i}'.format(i=index)
+            xml = os.path.join(work_dir, 'worker-{w}.xml'.format(w=worker))
+            log = open(os.path.join(work_dir, 'worker-{w}.log'.format(
+                w=worker)), 'w')
+            env = dict(os.environ)
+            env[WORKER_ENV] = worker
+            env[RUN_ENV] = run
+            env[WORKERS_ENV] = str(workers)
+            env[QUEUE_ENV] = '{h}:{p}:{k}'.format(
+                h=manager.address[0], p=manager.address[1],
+                k=authkey.encode('hex'))
+            command = [sys.executable, '-m',
+                       'testingframework.parallel.worker'] + list(args) + [
+                       '--junitxml={x}'.format(x=xml)]
+            processes.append((worker, xml, log, subprocess.Popen(
+                command, env=env, stdout=log, stderr=subprocess.STDOUT)))
+        codes = []
+        for worker, xml, log, process in processes:
+            codes.append(process.wait())
+            log.close()
+            if codes[-1] != 0:
+                with open(log.name) as output:
+                    sys.stdout.write('==== worker {w} exited with {c} '
+                                     '====\n'.format(w=worker, c=codes[-1]))
+                    sys.stdout.write(output.read())
+        stats = manager.work_queue().stats()
+        suite = merge_junitxml([xml for _, xml, _, _ in processes
+                                if os.path.exists(xml)])
+        suite.set('time', '%.3f' % (time.time() - start))
+        if junitxml:
+            ElementTree.ElementTree(suite).write(junitxml, encoding='utf-8')
+        summary = ('{tests} tests, {failures} failed, {errors} errors, '
+                   '{skips} skipped in {t:.2f}s on {n} workers'.format(
+                       t=time.time() - start, n=workers,
+                       **dict((c, suite.get(c)) for c in _COUNTS)))
+        sys.stdout.write(summary + '\n')
+        LOGGER.info(summary)
+        if stats['left']:
+            LOGGER.warn("{n} tests were not run".format(n=stats['left']))
+            return max(codes + [1])
+        return max(codes) if codes else 0
+    finally:
+        manager.shutdown()
+        if report_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def merge_junitxml(paths):
+    '''
+    Merges junit xml reports into one testsuite.
+
+    @param paths: The reports.
+    @type paths: list
+    @return: The merged testsuite element.
+    @rtype: C{Element}
+    '''
+    merged = ElementTree.Element('testsuite', name='pytest')
+    counts = dict((count, 0) for count in _COUNTS)
+    for path in paths:
+        suite = ElementTree.parse(path).getroot()
+        for count in _COUNTS:
+            counts[count] += int(suite.get(count, 0))
+        merged.extend(list(suite))
+    for count, value in counts.items():
+        merged.set(count, str(value))
+    return merged
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if '--' in argv:
+        index = argv.index('--')
+        argv, args = argv[:index], argv[index + 1:]
+    else:
+        args = []
+    parser = argparse.ArgumentParser(
+        description='Runs pytest in parallel worker processes.')
+    parser.add_argument('-n', '--workers', type=int,
+                        default=_cpu_count(),
+                        help='number of worker processes (default: the '
+                             'number of CPUs)')
+    parser.add_argument('--junitxml',
+                        help='file to write the merged junit xml report to')
+    parser.add_argument('--report-dir',
+                        help='keep the reports and output of the workers '
+                             'in this directory')
+    options = parser.parse_args(argv)
+    if options.report_dir and not os.path.isdir(options.report_dir):
+        os.makedirs(options.report_dir)
+    return run(args, max(1, options.workers), options.junitxml,
+               options.report_dir)
+
+
+def _cpu_count():
+    try:
+        import multiprocessing
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,70 @@
+'''
+A worker process of the parallel runner: a pytest run whose tests are
+taken from the shared queue instead of run in collection order.
+
+Started by L{runner}, which passes the queue address in the environment.
+'''
+
+import os
+import sys
+import pytest
+from testingframework.log import Logging
+from testingframework.parallel import QUEUE_ENV, worker_id
+from testingframework.parallel.workqueue import connect
+
+
+class WorkerPlugin(Logging):
+    '''
+    Pytest plugin replacing the test loop of a worker.
+    '''
+
+    def __init__(self, work_queue):
+        '''
+        @param work_queue: Proxy of the shared L{WorkQueue}.
+        '''
+        Logging.__init__(self)
+        self._queue = work_queue
+        self.ran = 0
+
+    def pytest_runtestloop(self, session):
+        if session.config.option.collectonly:
+            return True
+        items = dict((item.nodeid, item) for item in session.items)
+        if self._queue.fill([item.nodeid for item in session.items]):
+            self.logger.info("Worker {w} queued {n} tests".format(
+                w=worker_id(), n=len(items)))
+        # the next test is taken before the current one runs: pytest needs
+        # it to know which fixtures to tear down after the current one
+        item = self._take(items)
+        while item is not None:
+            nextitem = self._take(items)
+            item.config.hook.pytest_runtest_protocol(item=item,
+                                                     nextitem=nextitem)
+            self.ran += 1
+            if session.shouldstop:
+                raise session.Interrupted(session.shouldstop)
+            item = nextitem
+        self.logger.info("Worker {w} ran {n} tests".format(w=worker_id(),
+                                                           n=self.ran))
+        return True
+    pytest_runtestloop.tryfirst = True
+
+    def _take(self, items):
+        nodeid = self._queue.take()
+        if nodeid is None:
+            return None
+        if nodeid not in items:
+            raise RuntimeError("Worker {w} did not collect {t}, all workers "
+                               "must collect the same tests".format(
+                                   w=worker_id(), t=nodeid))
+        return items[nodeid]
+
+
+def main(args):
+    host, port, authkey = os.environ[QUEUE_ENV].split(':')
+    work_queue = connect((host, int(port)), authkey.decode('hex'))
+    return pytest.main(args, plugins=[WorkerPlugin(work_queue)])
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,95 @@
+'''
+The queue of test ids the workers take their tests from.
+'''
+
+import threading
+from collections import deque
+from multiprocessing.managers import BaseManager
+
+
+class WorkQueue(object):
+    '''
+    Test ids in collection order. Filled once, by the first worker done
+    collecting, every worker collects the same tests.
+    '''
+
+    def __init__(self):
+        self._ids = deque()
+        self._filled = False
+        self._taken = 0
+        self._lock = threading.Lock()
+
+    def fill(self, ids):
+        '''
+        Fills the queue, unless another worker did already.
+
+        @param ids: The test ids.
+        @type ids: list
+        @return: Whether this call filled the queue.
+        @rtype: bool
+        '''
+        with self._lock:
+            if self._filled:
+                return False
+            self._ids.extend(ids)
+            self._filled = True
+            return True
+
+    def take(self):
+        '''
+        Takes the next test id.
+
+        @return: The test id, None when the queue is empty.
+        @rtype: str
+        '''
+        with self._lock:
+            if not self._ids:
+                return None
+            self._taken += 1
+            return self._ids.popleft()
+
+    def stats(self):
+        '''
+        @return: Number of tests taken and left.
+        @rtype: dict
+        '''
+        with self._lock:
+            return {'taken': self._taken, 'left': len(self._ids)}
+
+
+class WorkQueueManager(BaseManager):
+    '''
+    Serves one L{WorkQueue} to the workers, over a local socket.
+    '''
+
+
+def serve(authkey):
+    '''
+    Starts a manager process serving a new queue.
+
+    @param authkey: Key the workers authenticate with.
+    @type authkey: str
+    @return: The started manager, call C{work_queue()} for the queue.
+    @rtype: L{WorkQueueManager}
+    '''
+    work_queue = WorkQueue()
+    WorkQueueManager.register('work_queue', callable=lambda: work_queue)
+    manager = WorkQueueManager(address=('127.0.0.1', 0), authkey=authkey)
+    manager.start()
+    return manager
+
+
+def connect(address, authkey):
+    '''
+    Connects to the queue served by L{serve}.
+
+    @param address: (host, port) of the manager.
+    @type address: tuple
+    @param authkey: The key given to L{serve}.
+    @type authkey: str
+    @return: Proxy of the L{WorkQueue}.
+    '''
+    WorkQueueManager.register('work_queue')
+    manager = WorkQueueManager(address=address, authkey=authkey)
+    manager.connect()
+    return manager.work_queue()
@@ -10,6 +10,7 @@ from testingframework.exceptions import UnsupportedConnectorError
 from testingframework.log import Logging
 from testingframework.connector.base import Connector
 from testingframework.connector.rest import RESTConnector
+from testingframework.connector.asyncrest import AsyncRESTConnector
 
 class Slack(Logging):
     '''
@@ -32,7 +33,8 @@ class Slack(Logging):
 
     __metaclass__ = ABCMeta
 
-    _CONNECTOR_TYPE_TO_CLASS_MAPPINGS = {Connector.REST: RESTConnector}
+    _CONNECTOR_TYPE_TO_CLASS_MAPPINGS = {Connector.REST: RESTConnector,
+                                         Connector.ASYNC: AsyncRESTConnector}
 
     def __init__(self, name):
         '''
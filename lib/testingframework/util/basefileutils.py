@@ -14,6 +14,9 @@ class BaseFileUtils(Logging):
     def get_file_contents(self, path):
         raise NotImplementedError("Function not implemented")
 
+    def read_file(self, path, threshold=None):
+        raise NotImplementedError("Function not implemented")
+
     def copy_file(self, source, target):
         raise NotImplementedError("Function not implemented")
 
@@ -23,16 +26,25 @@ class BaseFileUtils(Logging):
     def copy_directory(self, source, target, ignore=None):
         raise NotImplementedError("Function not implemented")
 
+    def sync_directory(self, source, target, ignore=None):
+        raise NotImplementedError("Function not implemented")
+
+    def compare_directories(self, first, second, digest='sha256'):
+        raise NotImplementedError("Function not implemented")
+
     def compare_files(self, file1, file2):
         raise NotImplementedError("Function not implemented")
 
+    def compare_many(self, files):
+        raise NotImplementedError("Function not implemented")
+
     def move_directory(self, source, target, ignore = None):
         raise NotImplementedError("Function not implemented")
 
     def force_remove_file(self, path):
         raise NotImplementedError("Function not implemented")
 
-    def force_remove_directory(self, path):
+    def force_remove_directory(self, path, background=False):
         raise NotImplementedError("Function not implemented")
 
     def force_copy_file(self, source, target):
@@ -0,0 +1,111 @@
+"""
+Compares files by content, reading as little as possible.
+
+Files of different sizes are never read. Two files of the same size are
+read side by side, block by block into two reused buffers, up to the first
+block that differs. To find the identical files among many, only files of
+the same size are hashed, with the digests kept in a L{HashCache}.
+
+>>> files_equal('upload.png', 'download.png')
+True
+>>> identical_groups(['a.png', 'b.png', 'c.pdf'])
+[['a.png', 'b.png']]
+"""
+import os
+from testingframework.util.hashing import default_cache
+
+BLOCK_SIZE = 1024 * 1024
+DIGEST = 'sha256'
+
+
+def files_equal(first, second, block_size=BLOCK_SIZE):
+    '''
+    Checks whether two files have the same content.
+
+    @param first: The path to the first file.
+    @type first: str
+    @param second: The path to the second file.
+    @type second: str
+    @param block_size: Number of bytes compared at a time.
+    @type block_size: int
+    @rtype: bool
+    '''
+    first_stat, second_stat = os.stat(first), os.stat(second)
+    if first_stat.st_size != second_stat.st_size:
+        return False
+    if (first_stat.st_dev, first_stat.st_ino) == \
+            (second_stat.st_dev, second_stat.st_ino):
+        return True
+    first_buffer, second_buffer = bytearray(block_size), bytearray(block_size)
+    with open(first, 'rb', 0) as first_fp, open(second, 'rb', 0) as second_fp:
+        while True:
+            size = _fill(first_fp, first_buffer)
+            if size != _fill(second_fp, second_buffer):
+                # the file changed size while it was read
+                return False
+            if size < block_size:
+                return first_buffer[:size] == second_buffer[:size]
+            if first_buffer != second_buffer:
+                return False
+
+
+def identical_groups(paths, cache=None):
+    '''
+    Groups files with the same content. Files are grouped by size first,
+    only files that share their size with another are hashed.
+
+    @param paths: The paths of the files.
+    @type paths: iterable
+    @param cache: The cache digests are taken from and kept in, defaults
+                  to L{default_cache}.
+    @type cache: L{HashCache}
+    @return: Lists of paths of identical files, in the order of paths, for
+             every content that more than one file has.
+    @rtype: list
+    '''
+    if cache is None:
+        cache = default_cache()
+    by_size = {}
+    order = []
+    for path in paths:
+        size = os.stat(path).st_size
+        if size not in by_size:
+            by_size[size] = []
+            order.append(size)
+        by_size[size].append(path)
+    groups = []
+    for size in order:
+        candidates = by_size[size]
+        if len(candidates) < 2:
+            continue
+        if size == 0:
+            groups.append(candidates)
+            continue
+        by_digest = {}
+        digests = []
+        for path in candidates:
+            digest = cache.digests(path, (DIGEST,))[DIGEST]
+            if digest not in by_digest:
+                by_digest[digest] = []
+                digests.append(digest)
+            by_digest[digest].append(path)
+        groups.extend(by_digest[digest] for digest in digests
+                      if len(by_digest[digest]) > 1)
+    return groups
+
+
+def _fill(fp, buffer_):
+    '''
+    Reads into buffer_ until it is full or the file ends.
+
+    @return: The number of bytes read.
+    @rtype: int
+    '''
+    view = memoryview(buffer_)
+    size = 0
+    while size < len(buffer_):
+        read = fp.readinto(view[size:])
+        if not read:
+            break
+        size += read
+    return size
@@ -8,13 +8,15 @@ Contains various file utility methods.
 import platform
 import os
 import stat
-import binascii
-import re
 import shutil
 from testingframework.log import Logging
 from testingframework.util.basefileutils import BaseFileUtils
-
-_BLOCK_SIZE = 8192
+from testingframework.util.hashing import ALGORITHMS, default_cache
+from testingframework.util.compare import files_equal, identical_groups
+from testingframework.util import manifest
+from testingframework.util.fileview import FileView, MMAP_THRESHOLD
+from testingframework.util.treecopy import TreeCopy
+from testingframework.util.treeremove import TreeRemove, remove_file
 
 
 class FileUtils(BaseFileUtils):
@@ -61,10 +63,35 @@ class FileUtils(BaseFileUtils):
     
     def get_file_contents(self, path):
         '''
-        Get the contents of the file.
+        Get the contents of the file, as bytes.
+
+        The whole file is read, see L{read_file} for large files.
+        '''
+        if self.isfile(path):
+            with open(path, 'rb') as fp:
+                return fp.read()
+        else:
+            raise Exception('File {file} Not Found'.format(file=path))
+
+    def read_file(self, path, threshold=MMAP_THRESHOLD):
+        '''
+        Get a view of the contents of the file, to use in a with block.
+
+        Files of at least threshold bytes are mapped read-only rather than
+        read, smaller ones are read. The view can be uploaded as it is.
+
+        >>> with FileUtils().read_file(path) as view:
+        ...     header = view.data[:8]
+
+        @param path: The path to the file
+        @type path: str
+        @param threshold: Size from which the file is mapped
+        @type threshold: int
+        @return: The view, its data is a str or a read-only mmap
+        @rtype: L{FileView}
         '''
         if self.isfile(path):
-            return open(path, 'r').read()
+            return FileView(path, threshold)
         else:
             raise Exception('File {file} Not Found'.format(file=path))
 
@@ -95,12 +122,11 @@ class FileUtils(BaseFileUtils):
 
     def copy_directory(self, source, target, ignore=None):
         """
-        Copies the directory at source to target by calling copy_file
+        Copies the directory at source to target with L{TreeCopy}.
 
-        This method uses iteration rather than recursion.
-
-        This metod exists to be able to use copy_file which doesn't copy
-        metadata except the executable bit.
+        The tree is walked breadth first while a pool of threads copies
+        the files, by the kernel where it can. Like copy_file no metadata
+        is copied except the permission bits.
 
         If the target directory already exists the source will be merged with the
         target
@@ -110,34 +136,60 @@ class FileUtils(BaseFileUtils):
 
         @type target: str
         @param target: The target folder
+
+        @type ignore: list
+        @param ignore: regular expressions, entries whose path matches one
+                       are not copied
+
+        @rtype: L{CopyStats}
+        @return: What was copied and how fast
         """
-        dirs = [(source, target)]
+        return TreeCopy(ignore=ignore).run(source, target)
 
-        ignores = [re.compile(name) for name in ignore or []]
+    def sync_directory(self, source, target, ignore=None):
+        """
+        Makes the directory at target equal to the one at source.
 
-        while len(dirs) > 0:
-            (source, target) = dirs.pop(0)
+        Only new and changed files are copied, a file being changed when
+        its size or mtime differs, and entries the source doesn't have are
+        removed from the target. Copies keep times and permissions.
 
-            if not os.path.exists(target):
-                os.makedirs(target)
-            for entry in os.listdir(source):
-                source_entry = os.path.join(source, entry)
-                target_entry = os.path.join(target, entry)
+        @type source: str
+        @param source: The source folder
+
+        @type target: str
+        @param target: The target folder, created if missing
 
-                skip = False
-                for ignore in ignores:
-                    if ignore.search(source_entry):
-                        skip = True
-                        break
+        @type ignore: list
+        @param ignore: regular expressions, entries whose source path
+                       matches one are neither copied nor removed
+
+        @rtype: L{ManifestDiff}
+        @return: What differed from the target to the source
+        """
+        return manifest.sync(source, target, ignore=ignore)
+
+    def compare_directories(self, first, second, digest=manifest.DIGEST):
+        """
+        Compares two directories by their manifests.
 
-                if skip:
-                    continue
+        Only files of the same size in both are compared by contents,
+        through their digests, which are kept in the hash cache.
 
-                if self.isdir(source_entry):
-                    dirs.append((source_entry, target_entry))
-                else:
-                    self.copy_file(source_entry, target_entry)
+        @type first: str
+        @param first: The first folder, or its L{Manifest}
 
+        @type second: str
+        @param second: The second folder, or its L{Manifest}
+
+        @type digest: str
+        @param digest: the digest to compare contents by, None to compare
+                       sizes and mtimes only
+
+        @rtype: L{ManifestDiff}
+        @return: What differs from the first folder to the second
+        """
+        return manifest.compare(first, second, digest=digest)
     
     def move_directory(self, source, target, ignore=None):
         self.copy_directory(source, target, ignore=ignore)
@@ -145,7 +197,10 @@ class FileUtils(BaseFileUtils):
 
     def compare_files(self, file1, file2):
         """
-        Compare file1 and file2 by comparing their hashes.
+        Compare file1 and file2 by comparing their contents.
+
+        Files of different sizes are not read, others are compared block
+        by block up to the first difference.
 
         @type file1: str
         @param file1: The path to the first file
@@ -156,27 +211,57 @@ class FileUtils(BaseFileUtils):
         @rtype: boolean
         @return: True if they have the same contents, False otherwise.
         """
-        hash1 = self.get_crc32(file1)
-        hash2 = self.get_crc32(file2)
-        return hash1 == hash2
+        return files_equal(file1, file2)
+
+    def compare_many(self, files):
+        """
+        Finds the files with the same contents among many.
+
+        Only files of the same size are hashed, and their digests are
+        kept in the hash cache.
+
+        @type files: list
+        @param files: The paths to the files
+
+        @rtype: list
+        @return: A list of paths of identical files for every content that
+                 more than one of the files has.
+        """
+        return identical_groups(files)
 
 
     def get_crc32(self, path):
         """
         Calculate the crc32 for the specified file.
 
+        The file is only read if it changed since its crc32 was last
+        calculated, see L{get_digests}.
+
         @type path: str
         @param path: The path to the file the check
         @rtype: int
         @return: The crc32 sum for the file
         """
-        crc = 0
-        with open(path, "rb") as fp:
-            block = fp.read(_BLOCK_SIZE)
-            while block != '':
-                crc = binascii.crc32(block, crc) & 0xffffffff
-                block = fp.read(_BLOCK_SIZE)
-        return crc
+        return self.get_digests(path, ('crc32',))['crc32']
+
+    def get_digests(self, path, algorithms=ALGORITHMS):
+        """
+        Calculate several digests of the specified file in one pass.
+
+        The digests are kept in the hash cache, keyed by the size, mtime
+        and inode of the file, and are not calculated again as long as
+        those stay the same.
+
+        @type path: str
+        @param path: The path to the file the check
+        @type algorithms: sequence
+        @param algorithms: names of the digests, crc32, md5, sha256 or
+                           any other hashlib algorithm
+        @rtype: dict
+        @return: Maps each algorithm to its digest, an int for crc32 and
+                 the hex digest for the others
+        """
+        return default_cache().digests(path, algorithms)
 
 
     def force_move_directory(self, source, target):
@@ -207,22 +292,16 @@ class FileUtils(BaseFileUtils):
         If the target does exist the source and target directories will be merged.
 
         Any existing files will be overwritten even if they are read only.
+        Times and permissions are copied too, as C{shutil.copy2} does.
 
         @param source: The source directory (must be an existing directory)
         @type source: str
         @param target: The target directory (does not have to exist)
         @type target: src
+        @return: What was copied and how fast
+        @rtype: L{CopyStats}
         '''
-        if not os.path.exists(target):
-            os.makedirs(target)
-        else:
-            self._make_files_writable_if_exists(target)
-        for source_entry, target_entry in self._directory_entries(source, target):
-            if os.path.isdir(source_entry):
-                self.force_copy_directory(source_entry, target_entry)
-            else:
-                self.force_copy_file(source_entry, target_entry)
-        self._copy_file_permissions(source, target)
+        return TreeCopy(force=True, preserve=True).run(source, target)
 
 
     def _clone_directory(self, source, target):
@@ -257,25 +336,6 @@ class FileUtils(BaseFileUtils):
         shutil.copystat(source, target)
 
 
-    def _directory_entries(self, source, target):
-        '''
-        Returns a generator that will over all the entries in a directory
-        (not . or ..).
-
-        Each iteration yields a tuple containing (source_entry, target_entry).
-        The source/target will be appended to the entry.
-
-        @param source: The source directory (must exist).
-        @type source: str
-        @param target: The target directory
-        @type target: str
-        @return: A generator that iterates over the entries.
-        @rtype: generator
-        '''
-        for entry in os.listdir(source):
-            yield (os.path.join(source, entry), os.path.join(target, entry))
-
-
     def force_copy_file(self, source, target):
         '''
         Moves the source file to the target file overwriting any existing file.
@@ -320,50 +380,39 @@ class FileUtils(BaseFileUtils):
             if os.path.exists(file_):
                 os.chmod(file_, 0777)
 
-    def force_remove_directory(self, path):
+    def force_remove_directory(self, path, background=False):
         '''
-        Forcefully remove the directory.
+        Forcefully remove the directory with L{TreeRemove}.
 
         If the directory doesn't exist nothing is done.
 
-        This is equivalent to C{rm -rf}
+        This is equivalent to C{rm -rf}. The files are removed by a pool of
+        threads and only made writable when removing them is denied. Links
+        are removed, not followed.
 
         @param directory: The directory to remove
         @type directory: str
+        @param background: Rename the directory aside and remove it in a
+                           thread, the path is free again at once
+        @type background: bool
+        @return: What was removed and how fast, or the thread removing
+                 the directory in the background, None if it doesn't exist
+        @rtype: L{RemoveStats}
         '''
-        if os.path.exists(path):
-            self._recursivly_remove_directory(path)
-
-
-    def _recursivly_remove_directory(self, directory):
-        '''
-        Recursively remove a directory.
-
-        @param directory: The directory to remove.
-        @type directory: str
-        '''
-        for entry in os.listdir(directory):
-            entry = os.path.join(directory, entry)
-            if os.path.isdir(entry):
-                self._make_files_writable_if_exists(entry)
-                self._recursivly_remove_directory(entry)
-            else:
-                self.force_remove_file(entry)
-
-        os.rmdir(directory)
+        if not os.path.exists(path):
+            return None
+        if background:
+            return TreeRemove().run_in_background(path)
+        return TreeRemove().run(path)
 
 
     def force_remove_file(self, path):
         '''
         Attempts to remove the specified file.
 
-        It tries to make the file writable before removing it.
+        The file is only made writable if removing it is denied.
 
         @param file_: The file to remove
         @type file_: str
         '''
-        try:
-            self._make_files_writable_if_exists(path)
-        except Exception:
-            pass
-        os.remove(path)
+        remove_file(path)
@@ -0,0 +1,83 @@
+"""
+Reads files as bytes, mapping the large ones instead of copying them.
+
+A L{FileView} holds the content of a file opened in binary mode: the bytes
+themselves for a file smaller than its threshold, else a read-only mmap of
+it. A mapping is only paged in where it is read, and slicing it copies
+just the slice. The view is released when it is closed, at the end of its
+with block, not when it happens to be collected.
+
+>>> with FileView('data/files/databricks.zip') as view:
+...     view.mapped, view.data[:2]
+(True, 'PK')
+"""
+import mmap
+import os
+
+MMAP_THRESHOLD = 1024 * 1024
+
+
+class FileView(object):
+    '''
+    The content of a file, read or mapped when the view is created.
+
+    @ivar path: The file
+    @ivar data: The content, a str, or a read-only mmap for files of at
+                least the threshold; None once closed
+    '''
+
+    def __init__(self, path, threshold=MMAP_THRESHOLD):
+        '''
+        Reads or maps a file.
+
+        @param path: The file.
+        @type path: str
+        @param threshold: Files of this many bytes or more are mapped.
+        @type threshold: int
+        @raise IOError: If the file can't be opened.
+        '''
+        self.path = path
+        with open(path, 'rb') as fp:
+            size = os.fstat(fp.fileno()).st_size
+            if size and size >= threshold:
+                self.data = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self.data = fp.read()
+
+    @property
+    def mapped(self):
+        '''
+        @rtype: bool
+        '''
+        return isinstance(self.data, mmap.mmap)
+
+    @property
+    def closed(self):
+        '''
+        @rtype: bool
+        '''
+        return self.data is None
+
+    def close(self):
+        '''
+        Releases the content, unmapping it if it is mapped.
+        '''
+        if self.mapped:
+            self.data.close()
+        self.data = None
+
+    def __len__(self):
+        if self.data is None:
+            raise ValueError('{p} view is closed'.format(p=self.path))
+        return len(self.data)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self):
+        state = 'closed' if self.closed else \
+            'mapped' if self.mapped else 'read'
+        return '<FileView {p} {s}>'.format(p=self.path, s=state)
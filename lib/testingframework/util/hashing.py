@@ -0,0 +1,239 @@
+"""
+Computes several digests of a file in one pass, and remembers them.
+
+The file is read once, block by block into one reused buffer, and every
+block is fed to all the digests asked for. L{HashCache} keeps the digests
+of each file together with its size, mtime, ctime, inode and device, and
+persists them to a JSON file. A file whose stat is unchanged is never read
+again, across runs too.
+
+>>> hash_file(path, ('crc32', 'sha256'))
+{'crc32': 2553270425, 'sha256': '9f86d0...'}
+>>> default_cache().digests(path, ('md5',))['md5']
+"""
+import atexit
+import binascii
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from testingframework.log import Logging
+
+ALGORITHMS = ('crc32', 'md5', 'sha256')
+BLOCK_SIZE = 1024 * 1024
+CACHE_ENV = 'TESTINGFRAMEWORK_HASH_CACHE'
+_CACHE_FILE = 'hash_cache.json'
+
+
+class _CRC32(object):
+    '''
+    The crc32 of binascii behind the interface of the hashlib digests.
+    '''
+
+    def __init__(self):
+        self._crc = 0
+
+    def update(self, data):
+        self._crc = binascii.crc32(data, self._crc)
+
+    def result(self):
+        return self._crc & 0xffffffff
+
+
+class _Digest(object):
+    '''
+    A hashlib digest, its result is the hex digest.
+    '''
+
+    def __init__(self, name):
+        self._digest = hashlib.new(name)
+        self.update = self._digest.update
+
+    def result(self):
+        return self._digest.hexdigest()
+
+
+def hash_file(path, algorithms=ALGORITHMS, block_size=BLOCK_SIZE):
+    '''
+    Computes digests of a file, reading it once.
+
+    @param path: The file.
+    @type path: str
+    @param algorithms: Names of the digests, crc32 or any hashlib
+                       algorithm.
+    @type algorithms: sequence
+    @param block_size: Number of bytes read at a time.
+    @type block_size: int
+    @return: Maps each algorithm to its digest: an int for crc32, the hex
+             digest for the others.
+    @rtype: dict
+    @raise ValueError: If an algorithm is unknown.
+    '''
+    digests = dict((name, _CRC32() if name == 'crc32' else _Digest(name))
+                   for name in algorithms)
+    buffer_ = bytearray(block_size)
+    view = memoryview(buffer_)
+    updates = [digest.update for digest in digests.values()]
+    with open(path, 'rb', 0) as fp:
+        size = fp.readinto(buffer_)
+        while size:
+            block = view[:size] if size < block_size else view
+            for update in updates:
+                update(block)
+            size = fp.readinto(buffer_)
+    return dict((name, digest.result()) for name, digest in digests.items())
+
+
+class HashCache(Logging):
+    '''
+    Digests of files, valid as long as the stat of the file is unchanged.
+
+    Each entry is keyed by the real path of the file and holds its size,
+    mtime, ctime, inode and device. The cache is loaded from its file when
+    created and written back by L{save}. Processes sharing the file don't
+    merge their entries: the last one to save wins, the others are
+    computed again when needed.
+
+    @ivar path: The file the cache is persisted to, None for memory only
+    @ivar hits: Number of lookups answered from the cache
+    @ivar misses: Number of lookups that read the file
+    '''
+
+    def __init__(self, path=None):
+        '''
+        Creates a cache, loading its entries from path if it exists.
+
+        @param path: The file the cache is persisted to, None to keep the
+                     cache in memory only.
+        @type path: str
+        '''
+        Logging.__init__(self)
+        self.path = path
+        self.hits = self.misses = 0
+        self._entries = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            try:
+                with open(path, 'rb') as fp:
+                    self._entries = json.load(fp)
+            except ValueError:
+                self.logger.warn("Ignoring corrupt hash cache {p}".format(
+                    p=path))
+
+    def digests(self, path, algorithms=ALGORITHMS):
+        '''
+        Returns digests of a file, from the cache if the file did not
+        change since they were computed.
+
+        @param path: The file.
+        @type path: str
+        @param algorithms: Names of the digests.
+        @type algorithms: sequence
+        @return: Maps each algorithm to its digest, see L{hash_file}.
+        @rtype: dict
+        '''
+        key = os.path.realpath(path)
+        signature = _signature(os.stat(key))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry['stat'] == signature and \
+                    all(name in entry['digests'] for name in algorithms):
+                self.hits += 1
+                return dict((name, entry['digests'][name])
+                            for name in algorithms)
+        # read without the lock, other files can be looked up meanwhile
+        digests = hash_file(key, algorithms)
+        if _signature(os.stat(key)) != signature:
+            # changed while it was read, the digests are not kept
+            return digests
+        with self._lock:
+            self.misses += 1
+            entry = self._entries.get(key)
+            if entry is None or entry['stat'] != signature:
+                entry = self._entries[key] = {'stat': signature,
+                                              'digests': {}}
+            entry['digests'].update(digests)
+            self._dirty = True
+        return digests
+
+    def forget(self, path):
+        '''
+        Drops the entry of a file.
+
+        @param path: The file.
+        @type path: str
+        '''
+        with self._lock:
+            if self._entries.pop(os.path.realpath(path), None) is not None:
+                self._dirty = True
+
+    def prune(self):
+        '''
+        Drops the entries of files that no longer exist.
+
+        @return: The number of entries dropped.
+        @rtype: int
+        '''
+        with self._lock:
+            gone = [key for key in self._entries if not os.path.exists(key)]
+            for key in gone:
+                del self._entries[key]
+            self._dirty = self._dirty or bool(gone)
+        return len(gone)
+
+    def save(self):
+        '''
+        Writes the cache to its file, if it changed. The file is replaced
+        atomically, a crash never leaves half of it.
+        '''
+        if self.path is None:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            directory = os.path.dirname(os.path.abspath(self.path))
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            fd, temp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as fp:
+                    json.dump(self._entries, fp, separators=(',', ':'))
+                os.rename(temp, self.path)
+            except Exception:
+                os.remove(temp)
+                raise
+            self._dirty = False
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _signature(stat):
+    return [stat.st_size, stat.st_mtime, stat.st_ctime, stat.st_ino,
+            stat.st_dev]
+
+
+_DEFAULT_CACHE = None
+_LOCK = threading.Lock()
+
+
+def default_cache():
+    '''
+    Returns the cache shared by the process, persisted to the file named
+    by the TESTINGFRAMEWORK_HASH_CACHE environment variable, or else to
+    hash_cache.json in $TEST_ARTIFACTS or the temp directory. It is saved
+    when the process exits.
+
+    @rtype: L{HashCache}
+    '''
+    global _DEFAULT_CACHE
+    with _LOCK:
+        if _DEFAULT_CACHE is None:
+            path = os.environ.get(CACHE_ENV) or os.path.join(
+                os.environ.get('TEST_ARTIFACTS') or tempfile.gettempdir(),
+                _CACHE_FILE)
+            _DEFAULT_CACHE = HashCache(path)
+            atexit.register(_DEFAULT_CACHE.save)
+        return _DEFAULT_CACHE
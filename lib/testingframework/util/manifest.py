@@ -0,0 +1,377 @@
+"""
+Describes directory trees by manifests, to sync and compare them cheaply.
+
+A L{Manifest} maps the relative path of every entry of a tree to its size,
+mtime and, optionally, a digest of its content. Building one stats each
+entry once and reads no file, except to compute digests, which are kept in
+a L{HashCache}. Manifests are saved gzipped, one JSON list per entry.
+
+Two manifests are diffed in one pass over their path dictionaries. On top
+of that L{sync} makes a target tree equal to a source tree by copying only
+the new and changed files and removing the extra ones, and L{compare}
+tells which files of two trees differ.
+
+>>> sync('fixtures/tree', '/tmp/tree')
+<ManifestDiff 1 added, 0 removed, 2 changed>
+>>> compare('/tmp/tree', 'fixtures/tree').identical
+True
+"""
+import gzip
+import json
+import os
+import re
+import tempfile
+import time
+from collections import deque, namedtuple
+from testingframework.log import Logging
+from testingframework.util.hashing import default_cache
+from testingframework.util.scan import scandir
+from testingframework.util.treecopy import TreeCopy, WORKERS
+from testingframework.util.treeremove import TreeRemove, remove_file
+
+DIGEST = 'sha256'
+VERSION = 1
+# mtimes copied with utime can lose the sub-microsecond part
+_MTIME_SLACK = 0.001
+LOGGER = Logging('Manifest').logger
+
+Entry = namedtuple('Entry', 'size mtime digest')
+'''
+An entry of a manifest, a directory when size is None.
+'''
+
+
+class Manifest(object):
+    '''
+    The entries of a directory tree.
+
+    @ivar root: The directory the manifest was built from
+    @ivar digest: The name of the digest in the entries, None for none
+    @ivar entries: Maps the relative path of each entry to its L{Entry}
+    '''
+
+    def __init__(self, root, digest=None, entries=None):
+        self.root = root
+        self.digest = digest
+        self.entries = entries if entries is not None else {}
+
+    @classmethod
+    def build(cls, root, digest=None, ignore=None, cache=None):
+        '''
+        Builds the manifest of a tree. Links are followed.
+
+        @param root: The directory.
+        @type root: str
+        @param digest: The digest of the files to compute, crc32 or any
+                       hashlib algorithm, None for none.
+        @type digest: str
+        @param ignore: Regular expressions, entries whose path matches one
+                       are left out, directories with all they contain.
+        @type ignore: list
+        @param cache: The cache digests are taken from and kept in,
+                      defaults to L{default_cache}.
+        @type cache: L{HashCache}
+        @rtype: L{Manifest}
+        @raise OSError: If a directory can't be listed.
+        '''
+        manifest = cls(root, entries=_walk(root, _skipper(root, ignore)))
+        if digest is not None:
+            manifest.add_digests(digest, cache=cache)
+        return manifest
+
+    @classmethod
+    def load(cls, path):
+        '''
+        Reads a manifest saved by L{save}.
+
+        @param path: The manifest file.
+        @type path: str
+        @rtype: L{Manifest}
+        @raise ValueError: If the file is not a manifest of this version.
+        '''
+        with gzip.open(path, 'rb') as fp:
+            header = json.loads(fp.readline())
+            if header.get('version') != VERSION:
+                raise ValueError('{p} is not a version {v} manifest'.format(
+                    p=path, v=VERSION))
+            entries = {}
+            for line in fp:
+                path_, size, mtime, digest = json.loads(line)
+                entries[path_] = Entry(size, mtime, digest)
+        return cls(header['root'], header['digest'], entries)
+
+    def save(self, path):
+        '''
+        Writes the manifest, gzipped. The file is replaced atomically.
+
+        @param path: The manifest file.
+        @type path: str
+        '''
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as raw, \
+                    gzip.GzipFile(fileobj=raw, mode='wb') as fp:
+                fp.write(json.dumps({'version': VERSION, 'root': self.root,
+                                     'digest': self.digest}) + '\n')
+                for path_ in sorted(self.entries):
+                    fp.write(json.dumps([path_] + list(self.entries[path_]),
+                                        separators=(',', ':')) + '\n')
+            os.rename(temp, path)
+        except Exception:
+            os.remove(temp)
+            raise
+
+    def add_digests(self, digest, paths=None, cache=None):
+        '''
+        Computes the digest of files that don't have it yet. The files are
+        read from the root of the manifest.
+
+        @param digest: The digest, crc32 or any hashlib algorithm.
+        @type digest: str
+        @param paths: The relative paths of the files, all files if None.
+        @type paths: iterable
+        @param cache: The cache digests are taken from and kept in,
+                      defaults to L{default_cache}.
+        @type cache: L{HashCache}
+        @raise ValueError: If the manifest has another digest.
+        '''
+        if self.digest not in (None, digest):
+            raise ValueError('The manifest has {d} digests'.format(
+                d=self.digest))
+        self.digest = digest
+        if cache is None:
+            cache = default_cache()
+        for path in self.entries if paths is None else paths:
+            entry = self.entries[path]
+            if entry.size is None or entry.digest is not None:
+                continue
+            self.entries[path] = entry._replace(digest=cache.digests(
+                os.path.join(self.root, path), (digest,))[digest])
+
+    def copy(self):
+        '''
+        @return: A manifest with the same entries, that can be changed
+                 without changing this one.
+        @rtype: L{Manifest}
+        '''
+        return Manifest(self.root, self.digest, dict(self.entries))
+
+    def drop_digests(self):
+        '''
+        Forgets the digests of the entries, so that another digest can be
+        added.
+        '''
+        self.digest = None
+        for path, entry in self.entries.iteritems():
+            if entry.digest is not None:
+                self.entries[path] = entry._replace(digest=None)
+
+    def diff(self, other):
+        '''
+        Lists what differs from this manifest to another. Files are
+        compared by digest where both manifests have one, else by size and
+        mtime.
+
+        @param other: The other manifest.
+        @type other: L{Manifest}
+        @rtype: L{ManifestDiff}
+        '''
+        added, changed = [], []
+        for path, entry in other.entries.iteritems():
+            mine = self.entries.get(path)
+            if mine is None:
+                added.append(path)
+            elif not _same(mine, entry):
+                changed.append(path)
+        removed = [path for path in self.entries if path not in other.entries]
+        return ManifestDiff(sorted(added), sorted(removed), sorted(changed))
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class ManifestDiff(object):
+    '''
+    The differences from a manifest to another, as sorted relative paths.
+
+    @ivar added: Entries only in the other manifest
+    @ivar removed: Entries only in the first manifest
+    @ivar changed: Files that differ, or entries that changed type
+    '''
+
+    def __init__(self, added, removed, changed):
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+
+    @property
+    def identical(self):
+        '''
+        @rtype: bool
+        '''
+        return not (self.added or self.removed or self.changed)
+
+    def __repr__(self):
+        return '<ManifestDiff {a} added, {r} removed, {c} changed>'.format(
+            a=len(self.added), r=len(self.removed), c=len(self.changed))
+
+
+def _same(first, second):
+    if first.size is None or second.size is None:
+        return first.size is None and second.size is None
+    if first.size != second.size:
+        return False
+    if first.digest is not None and second.digest is not None:
+        return first.digest == second.digest
+    return abs(first.mtime - second.mtime) < _MTIME_SLACK
+
+
+def _skipper(root, ignore):
+    '''
+    Returns whether to leave out an entry, given its relative path, for
+    ignore regular expressions matched against its path under root.
+    '''
+    ignores = [re.compile(name) for name in ignore or []]
+    return lambda path: any(i.search(os.path.join(root, path))
+                            for i in ignores)
+
+
+def _walk(root, skip):
+    '''
+    Stats the entries of a tree, breadth first.
+
+    @param skip: Whether to leave out an entry, given its relative path.
+    @type skip: callable
+    @return: The entries by relative path.
+    @rtype: dict
+    '''
+    entries = {}
+    pending = deque([''])
+    while pending:
+        relative = pending.popleft()
+        for entry in scandir(os.path.join(root, relative)):
+            path = os.path.join(relative, entry.name)
+            if skip(path):
+                continue
+            if entry.is_dir():
+                entries[path] = Entry(None, None, None)
+                pending.append(path)
+            elif entry.is_file():
+                stat = entry.stat()
+                entries[path] = Entry(stat.st_size, stat.st_mtime, None)
+    return entries
+
+
+def sync(source, target, ignore=None, workers=WORKERS):
+    '''
+    Makes a target tree equal to a source tree, copying only the new and
+    changed files and removing the entries the source doesn't have.
+
+    Both trees are stat'ed, no file is read to find what changed: a file is
+    copied again when its size or mtime differs. Copies keep the mtime of
+    the source for that. Entries ignored in the source are left alone in
+    the target.
+
+    @param source: The source directory.
+    @type source: str
+    @param target: The target directory, created if missing.
+    @type target: str
+    @param ignore: Regular expressions, entries whose source path matches
+                   one are neither copied nor removed.
+    @type ignore: list
+    @param workers: Number of threads copying files.
+    @type workers: int
+    @return: What differed from the target to the source.
+    @rtype: L{ManifestDiff}
+    '''
+    start = time.time()
+    # target entries are matched as the source entries they mirror
+    skip = _skipper(source, ignore)
+    wanted = Manifest(source, entries=_walk(source, skip))
+    if os.path.isdir(target):
+        present = Manifest(target, entries=_walk(target, skip))
+    else:
+        os.makedirs(target)
+        present = Manifest(target)
+    diff = present.diff(wanted)
+    removed = set()
+    retyped = [path for path in diff.changed
+               if wanted.entries[path].size is None or
+               present.entries[path].size is None]
+    # parents sort before what they contain
+    for path in sorted(diff.removed + retyped):
+        if _below(path, removed):
+            continue
+        full = os.path.join(target, path)
+        if present.entries[path].size is None:
+            TreeRemove().run(full)
+            removed.add(path)
+        else:
+            remove_file(full)
+    files = []
+    for path in diff.added + diff.changed:
+        if wanted.entries[path].size is None:
+            if not os.path.isdir(os.path.join(target, path)):
+                os.makedirs(os.path.join(target, path))
+        else:
+            files.append(path)
+    copier = TreeCopy(workers=workers, force=True, preserve=True)
+    stats = copier.copy_files((os.path.join(source, path),
+                               os.path.join(target, path))
+                              for path in files)
+    LOGGER.info("Synced {s} to {t} in {e:.3f}s: {d}, {c}".format(
+        s=source, t=target, e=time.time() - start, d=diff, c=stats))
+    return diff
+
+
+def _below(path, directories):
+    '''
+    Whether path is in one of the directories, at any depth.
+    '''
+    parent = os.path.dirname(path)
+    while parent:
+        if parent in directories:
+            return True
+        parent = os.path.dirname(parent)
+    return False
+
+
+def compare(first, second, digest=DIGEST, cache=None):
+    '''
+    Compares two trees, or their manifests. Only the files with the same
+    size on both sides are compared by content, through their digests.
+    The manifests given are not changed, digests they lack are computed
+    on copies of them.
+
+    @param first: The first directory or its L{Manifest}.
+    @param second: The second directory or its L{Manifest}.
+    @param digest: The digest the contents are compared by, None to
+                   compare sizes and mtimes only. When only one digest is
+                   carried by the manifests given, that one is used so
+                   that their files need not be read again.
+    @type digest: str
+    @param cache: The cache digests are taken from and kept in, defaults
+                  to L{default_cache}.
+    @type cache: L{HashCache}
+    @return: What differs from the first tree to the second.
+    @rtype: L{ManifestDiff}
+    '''
+    manifests = [tree.copy() if isinstance(tree, Manifest) else
+                 Manifest.build(tree) for tree in (first, second)]
+    first, second = manifests
+    if digest is not None:
+        carried = set(manifest.digest for manifest in manifests) - set([None])
+        if len(carried) == 1:
+            digest = carried.pop()
+        common = []
+        for path, entry in first.entries.iteritems():
+            other = second.entries.get(path)
+            if other is not None and entry.size is not None and \
+                    entry.size == other.size:
+                common.append(path)
+        for manifest in manifests:
+            if manifest.digest not in (None, digest):
+                manifest.drop_digests()
+            manifest.add_digests(digest, common, cache)
+    return first.diff(second)
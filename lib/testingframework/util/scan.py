@@ -0,0 +1,75 @@
+"""
+Lists directories with the file types the OS already reports.
+
+C{scandir} (the backport of C{os.scandir}, optional) returns the type of
+each entry from the directory listing itself, so walking a tree needs no
+stat call per entry. Without it the entries are listed with C{os.listdir}
+and each is stat'ed once, on first use.
+
+>>> for entry in scandir(path):
+...     if entry.is_dir():
+...         walk(entry.path)
+"""
+import os
+import stat
+
+try:
+    from scandir import scandir as _scandir
+except ImportError:
+    _scandir = None
+
+
+class _DirEntry(object):
+    '''
+    The parts of C{os.DirEntry} used here, for when scandir is missing.
+    The lstat of the entry is taken once, its stat once if it is a link.
+    '''
+
+    def __init__(self, directory, name):
+        self.name = name
+        self.path = os.path.join(directory, name)
+        self._lstat = None
+        self._stat = None
+
+    def is_dir(self, follow_symlinks=True):
+        return self._is(stat.S_ISDIR, follow_symlinks)
+
+    def is_file(self, follow_symlinks=True):
+        return self._is(stat.S_ISREG, follow_symlinks)
+
+    def is_symlink(self):
+        return stat.S_ISLNK(self.stat(follow_symlinks=False).st_mode)
+
+    def stat(self, follow_symlinks=True):
+        if self._lstat is None:
+            self._lstat = os.lstat(self.path)
+        if not follow_symlinks or not stat.S_ISLNK(self._lstat.st_mode):
+            return self._lstat
+        if self._stat is None:
+            self._stat = os.stat(self.path)
+        return self._stat
+
+    def _is(self, check, follow_symlinks):
+        try:
+            return check(self.stat(follow_symlinks).st_mode)
+        except OSError:
+            # a broken link is neither
+            return False
+
+    def __repr__(self):
+        return '<DirEntry {n!r}>'.format(n=self.name)
+
+
+def scandir(path):
+    '''
+    Lists a directory.
+
+    @param path: The directory.
+    @type path: str
+    @return: Entries with name, path, is_dir(), is_file(), is_symlink()
+             and stat(), like C{os.DirEntry}.
+    @rtype: iterator
+    '''
+    if _scandir is not None:
+        return _scandir(path)
+    return (_DirEntry(path, name) for name in os.listdir(path))
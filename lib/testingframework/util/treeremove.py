@@ -0,0 +1,272 @@
+"""
+Removes directory trees with a pool of threads.
+
+The tree is walked with L{scan.scandir}, which reports the type of each
+entry from the listing, and its files are unlinked in batches by worker
+threads while the walk goes on. The directories are removed last, deepest
+first. Nothing is chmod'ed up front: only an unlink or rmdir that fails
+with EACCES or EPERM gives the owner write permission on the entry and its
+directory, and is tried again. Only the directories of the tree itself are
+left changed, they are removed anyway.
+
+A tree can also be renamed aside at once and removed by a background
+thread, so the path is free again right away.
+
+>>> stats = TreeRemove().run('/tmp/scratch')
+>>> stats.files_per_second
+>>> TreeRemove().run_in_background('/tmp/scratch')
+"""
+import errno
+import itertools
+import os
+import stat
+import threading
+import time
+import Queue
+from testingframework.log import Logging
+from testingframework.util.scan import scandir
+
+WORKERS = 8
+BATCH_SIZE = 256
+_ASIDE_SUFFIX = '.removing'
+_DENIED = (errno.EACCES, errno.EPERM)
+_ASIDE_COUNTER = itertools.count()
+
+
+def remove_file(path):
+    '''
+    Removes a file, or a link. Only if removing it is denied is the owner
+    given write permission on it and on its directory, whose permissions
+    are put back afterwards.
+
+    @param path: The file.
+    @type path: str
+    @return: Whether permissions had to be changed.
+    @rtype: bool
+    @raise OSError: If the file can't be removed.
+    '''
+    return _retry_denied(os.remove, path)
+
+
+def _retry_denied(remove, path, restore=True):
+    '''
+    Removes an entry, and again after giving the owner write permission if
+    that is denied.
+
+    @param remove: C{os.remove} or C{os.rmdir}.
+    @type remove: function
+    @param path: The entry.
+    @type path: str
+    @param restore: Put the permissions of the directory of the entry back
+                    afterwards, not needed if it is about to be removed too.
+    @type restore: bool
+    @return: Whether permissions had to be changed.
+    @rtype: bool
+    '''
+    try:
+        remove(path)
+        return False
+    except OSError as err:
+        if err.errno not in _DENIED:
+            raise
+    # posix checks the directory, windows the entry itself
+    parent = os.path.dirname(path) or os.curdir
+    parent_mode = _allow_owner(parent, stat.S_IRWXU)
+    if not os.path.islink(path):
+        _allow_owner(path, stat.S_IWUSR)
+    try:
+        remove(path)
+    finally:
+        if restore and parent_mode is not None:
+            try:
+                os.chmod(parent, parent_mode)
+            except OSError:
+                pass
+    return True
+
+
+def _allow_owner(path, bits):
+    '''
+    Adds permission bits for the owner of an entry.
+
+    @return: The permissions before, None if they couldn't be changed.
+    @rtype: int
+    '''
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+        os.chmod(path, mode | bits)
+        return mode
+    except OSError:
+        return None
+
+
+class RemoveStats(object):
+    '''
+    What a removal did and how fast.
+
+    @ivar files: Number of files and links removed
+    @ivar directories: Number of directories removed
+    @ivar chmods: Number of removals that needed a chmod first
+    @ivar seconds: How long the removal took
+    '''
+
+    def __init__(self):
+        self.files = 0
+        self.directories = 0
+        self.chmods = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add_files(self, files, chmods):
+        with self._lock:
+            self.files += files
+            self.chmods += chmods
+
+    @property
+    def files_per_second(self):
+        '''
+        @rtype: float
+        '''
+        return self.files / self.seconds if self.seconds else 0.0
+
+    def __repr__(self):
+        return ('<RemoveStats {f} files, {d} directories, {c} chmods in '
+                '{s:.3f}s: {fps:.1f} files/s>'.format(
+                    f=self.files, d=self.directories, c=self.chmods,
+                    s=self.seconds, fps=self.files_per_second))
+
+
+class TreeRemove(Logging):
+    '''
+    Removes a directory tree, like C{rm -rf}.
+
+    Links are removed, never followed.
+
+    @ivar workers: Number of threads removing files
+    @ivar batch_size: Number of files handed to a thread at a time
+    '''
+
+    def __init__(self, workers=WORKERS, batch_size=BATCH_SIZE):
+        '''
+        Creates a new removal engine.
+
+        @param workers: Number of threads removing files.
+        @type workers: int
+        @param batch_size: Number of files handed to a thread at a time.
+        @type batch_size: int
+        '''
+        Logging.__init__(self)
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+
+    def run(self, path):
+        '''
+        Removes the tree at path.
+
+        @param path: The directory.
+        @type path: str
+        @return: What was removed and how fast.
+        @rtype: L{RemoveStats}
+        @raise OSError: If an entry can't be removed. The removal stops at
+                        the first error.
+        '''
+        stats = RemoveStats()
+        start = time.time()
+        batches = Queue.Queue(maxsize=self.workers * 4)
+        errors = []
+
+        def work():
+            while True:
+                batch = batches.get()
+                if batch is None:
+                    return
+                if errors:
+                    continue
+                chmods = 0
+                try:
+                    for file_ in batch:
+                        # the directories are removed next
+                        chmods += _retry_denied(os.remove, file_,
+                                                restore=False)
+                except Exception as err:
+                    errors.append(err)
+                stats.add_files(len(batch), chmods)
+
+        threads = [threading.Thread(target=work, name='tree remove %d' % i)
+                   for i in range(self.workers)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        directories = []
+        try:
+            pending = [path]
+            batch = []
+            while pending and not errors:
+                directory = pending.pop()
+                directories.append(directory)
+                for entry in self._scan(directory):
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                        continue
+                    batch.append(entry.path)
+                    if len(batch) == self.batch_size:
+                        batches.put(batch)
+                        batch = []
+            if batch:
+                batches.put(batch)
+        finally:
+            for _ in threads:
+                batches.put(None)
+            for thread in threads:
+                thread.join()
+        if errors:
+            raise errors[0]
+        # a directory is always found after its parent, only the parent of
+        # the tree stays
+        for directory in reversed(directories):
+            stats.chmods += _retry_denied(os.rmdir, directory,
+                                          restore=directory == path)
+        stats.directories = len(directories)
+        stats.seconds = time.time() - start
+        self.logger.info("Removed {p}: {r}".format(p=path, r=stats))
+        return stats
+
+    def run_in_background(self, path):
+        '''
+        Renames the tree at path aside, next to it, and removes it in a
+        thread. The path can be used again as soon as this returns. The
+        thread is not a daemon: the process waits for it before exiting.
+
+        @param path: The directory.
+        @type path: str
+        @return: The thread removing the tree, already started.
+        @rtype: C{threading.Thread}
+        @raise OSError: If the tree can't be renamed.
+        '''
+        aside = '{p}{s}-{pid}-{n}'.format(p=path.rstrip(os.sep),
+                                           s=_ASIDE_SUFFIX, pid=os.getpid(),
+                                           n=next(_ASIDE_COUNTER))
+        os.rename(path, aside)
+
+        def remove():
+            try:
+                self.run(aside)
+            except Exception:
+                self.logger.exception("Could not remove {p}".format(p=aside))
+
+        thread = threading.Thread(target=remove, name='remove ' + aside)
+        thread.start()
+        return thread
+
+    def _scan(self, directory):
+        '''
+        Lists a directory, making it readable for the owner if listing it is
+        denied. It is about to be removed.
+        '''
+        try:
+            return list(scandir(directory))
+        except OSError as err:
+            if err.errno not in _DENIED:
+                raise
+        _allow_owner(directory, stat.S_IRWXU)
+        return list(scandir(directory))
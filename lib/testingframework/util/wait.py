@@ -0,0 +1,214 @@
+"""
+Contains a polling engine to wait for a condition with exponential backoff.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+from testingframework.exceptions.wait import WaitTimedOut
+from testingframework.log import Logging
+
+LOGGER = Logging('Wait').logger
+
+DEADLINE = 100
+INTERVAL = 0.2
+MAX_INTERVAL = 10
+BACKOFF = 2.0
+JITTER = 0.5
+
+
+def wait_until(predicate, deadline=DEADLINE, interval=INTERVAL,
+               max_interval=MAX_INTERVAL, backoff=BACKOFF, jitter=JITTER,
+               retry_on=(), description=None, stats=None, sleep=None):
+    '''
+    Calls predicate until it returns a true value or the deadline is reached.
+
+    The sleep between two calls starts at interval and is multiplied by
+    backoff after every call, up to max_interval. With a jitter of 0.5 each
+    sleep is picked at random between half and all of that value, so that
+    parallel runs don't poll in lock step. The last sleep is cut short so
+    that the predicate is called one final time right at the deadline.
+
+    >>> wait_until(lambda: filename in list_files(), deadline=60,
+    ...            retry_on=(SSLError,), description='files.list')
+
+    @param predicate: Function called without arguments.
+    @type predicate: function
+    @param deadline: Max number of seconds to wait in total.
+    @type deadline: float
+    @param interval: Seconds to sleep after the first call.
+    @type interval: float
+    @param max_interval: Max seconds to sleep between two calls.
+    @type max_interval: float
+    @param backoff: Factor the sleep grows by after every call.
+    @type backoff: float
+    @param jitter: Fraction of every sleep that is randomized, 0 to 1.
+    @type jitter: float
+    @param retry_on: Exception types that count as "not yet" when raised by
+                     predicate, any other exception is raised right away.
+    @type retry_on: tuple
+    @param description: What is waited for, used in logs, errors and stats.
+    @type description: str
+    @param stats: Where to record the wait, defaults to L{WAIT_STATS}.
+    @type stats: L{WaitStats}
+    @param sleep: Function used to sleep, defaults to C{time.sleep}, or to
+                  not sleeping at all within L{skipped_sleeps}.
+    @type sleep: function
+    @return: The first true value returned by predicate.
+    @raise WaitTimedOut: If predicate didn't return a true value in time.
+                         Its C{last_error} is the exception raised by the
+                         last call, if any.
+    '''
+    description = description or getattr(predicate, '__name__', 'wait')
+    stats = stats if stats is not None else WAIT_STATS
+    sleep = sleep or _CLOCK.sleep
+    start = _CLOCK.time()
+    attempts = 0
+    last_error = None
+    while True:
+        attempts += 1
+        try:
+            result = predicate()
+            last_error = None
+        except retry_on as err:
+            result = None
+            last_error = err
+        elapsed = _CLOCK.time() - start
+        if result:
+            stats.record(description, elapsed, attempts, True)
+            LOGGER.debug('{d} done after {e:.3f}s and {a} attempts'.format(
+                d=description, e=elapsed, a=attempts))
+            return result
+        remaining = deadline - elapsed
+        if remaining <= 0:
+            break
+        pause = interval * (1 - jitter * random.random())
+        sleep(min(pause, remaining))
+        interval = min(interval * backoff, max_interval)
+
+    stats.record(description, elapsed, attempts, False)
+    LOGGER.warn('{d} timed out after {e:.3f}s and {a} attempts'.format(
+        d=description, e=elapsed, a=attempts))
+    raise WaitTimedOut(round(elapsed, 3), description=description,
+                       last_error=last_error)
+
+
+@contextmanager
+def skipped_sleeps():
+    '''
+    Context manager in which waits don't sleep: the clock waits are timed
+    with moves on by the seconds they would have slept instead. Used when
+    replaying recorded requests, where polling again is free.
+
+    >>> with skipped_sleeps():
+    ...     wait_until(file_is_listed, deadline=100)
+    '''
+    _CLOCK.skip(True)
+    try:
+        yield
+    finally:
+        _CLOCK.skip(False)
+
+
+class _Clock(object):
+    '''
+    The time waits are measured with: the wall clock plus the sleeps that
+    were skipped.
+    '''
+
+    def __init__(self):
+        self._skipping = 0
+        self._skipped = 0.0
+        self._lock = threading.Lock()
+
+    def time(self):
+        return time.time() + self._skipped
+
+    def sleep(self, seconds):
+        if self._skipping:
+            with self._lock:
+                self._skipped += seconds
+        else:
+            time.sleep(seconds)
+
+    def skip(self, skipping):
+        with self._lock:
+            self._skipping += 1 if skipping else -1
+
+
+_CLOCK = _Clock()
+
+
+class WaitStats(object):
+    '''
+    Records how long waits took, grouped by their description, to help tune
+    deadlines and intervals.
+
+    @ivar _records: Maps a description to a list of
+                    (seconds, attempts, succeeded) tuples.
+    '''
+
+    def __init__(self):
+        self._records = {}
+        self._lock = threading.Lock()
+
+    def record(self, description, seconds, attempts, succeeded):
+        '''
+        Records one finished wait.
+
+        @param description: What was waited for.
+        @type description: str
+        @param seconds: How long the wait took.
+        @type seconds: float
+        @param attempts: How many times the predicate was called.
+        @type attempts: int
+        @param succeeded: False if the wait timed out.
+        @type succeeded: bool
+        '''
+        with self._lock:
+            self._records.setdefault(description, []).append(
+                (seconds, attempts, succeeded))
+
+    def records(self, description):
+        '''
+        Returns the recorded waits for a description.
+
+        @rtype: list
+        '''
+        with self._lock:
+            return list(self._records.get(description, []))
+
+    def summary(self):
+        '''
+        Summarizes the recorded waits per description.
+
+        @return: Maps a description to a dict with count, timeouts, total,
+                 mean, max and p90 seconds and the mean attempts.
+        @rtype: dict
+        '''
+        with self._lock:
+            records = dict((d, list(r)) for d, r in self._records.items())
+        summary = {}
+        for description, waits in records.items():
+            seconds = sorted(w[0] for w in waits)
+            summary[description] = {
+                'count': len(waits),
+                'timeouts': len([w for w in waits if not w[2]]),
+                'total': sum(seconds),
+                'mean': sum(seconds) / len(seconds),
+                'max': seconds[-1],
+                'p90': seconds[min(len(seconds) - 1,
+                                   int(len(seconds) * 0.9))],
+                'attempts': float(sum(w[1] for w in waits)) / len(waits),
+            }
+        return summary
+
+    def clear(self):
+        '''
+        Forgets all recorded waits.
+        '''
+        with self._lock:
+            self._records.clear()
+
+
+WAIT_STATS = WaitStats()
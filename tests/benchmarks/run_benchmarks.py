@@ -0,0 +1,377 @@
+'''
+Offline benchmarks of the framework's own overhead.
+
+Starts a local stand-in for files.upload, files.list and files.delete (see
+L{slacktest.server.standin}) and measures requests per second, p50/p99
+latency and peak memory of:
+
+ - list:      RESTConnector.make_request of files.list, at each concurrency
+ - delete:    RESTConnector.make_request of files.delete, at each concurrency
+ - upload:    FilesAPI.upload of a file of each size, streamed as multipart
+ - multipart: reading an encoded multipart body of each size
+ - json:      decoding files.list responses, whole and by key extraction;
+              the run fails if extracting a key is slower than decoding
+
+Every case runs in its own process, so the peak memory is that of the case
+alone. The results are written as JSON, together with the commit and the
+interpreter they were measured with, so runs can be compared across commits:
+
+    python tests/benchmarks/run_benchmarks.py --output results.json
+    python tests/benchmarks/run_benchmarks.py --max-size 1GB \\
+        --concurrency 1,16,256 --cases upload,list
+
+Needs lib on the PYTHONPATH, as the tests do (see setTestEnv).
+'''
+
+import argparse
+import gc
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from multiprocessing.pool import ThreadPool
+
+from testingframework.slack.aws import AWSSlack
+from testingframework.connector.base import Connector
+from testingframework.connector.response import extract_keys
+from slacktest.server.base import SlackAPIServer
+from slacktest.server.standin import StandInAPI, canned_list
+from slacktest.util.files_api import FilesAPI
+from slacktest.util.multipart_formdata import encode_multipart_formdata_stream
+
+CASES = ('list', 'delete', 'upload', 'multipart', 'json')
+SIZES = (1 << 10, 64 << 10, 1 << 20, 16 << 20, 256 << 20, 1 << 30)
+CONCURRENCY = (1, 4, 16, 64, 256)
+LIST_SIZES = (100, 1000, 10000)
+UPLOAD_CONCURRENCY = (1, 16)
+# upper bound of the bytes one upload or multipart case moves, the number
+# of requests is cut down for the large sizes
+BYTES_PER_CASE = 2 << 30
+_UNITS = {'KB': 1 << 10, 'MB': 1 << 20, 'GB': 1 << 30}
+_READ_SIZE = 64 * 1024
+# extracting a key must be at least as fast as decoding the whole response,
+# compared by their fastest calls, within the noise of one run
+EXTRACT_TOLERANCE = 1.1
+# fewest calls of a json or extract case
+MIN_DECODES = 30
+
+
+def main():
+    args = _parse_args()
+    if args.case:
+        result = run_case(args.case, args.uri, args.size, args.concurrency,
+                          args.requests)
+        json.dump(result, sys.stdout)
+        return
+    api = StandInAPI(list_size=args.list_size)
+    server = SlackAPIServer(api, certfile=args.certfile,
+                            keyfile=args.keyfile).start()
+    tmpdir = tempfile.mkdtemp(prefix='slack-bench-')
+    results = []
+    try:
+        for case, size, concurrency in _plan(args):
+            result = _spawn(case, server.uri_base, size, concurrency,
+                            args.requests, tmpdir)
+            results.append(result)
+            sys.stderr.write(_summary(result) + '\n')
+    finally:
+        server.stop()
+        for name in os.listdir(tmpdir):
+            os.remove(os.path.join(tmpdir, name))
+        os.rmdir(tmpdir)
+    report = {'meta': _meta(args), 'results': results}
+    with open(args.output, 'w') as out:
+        json.dump(report, out, indent=2, sort_keys=True)
+    slower = slower_extracts(results)
+    for size, extract, decode in slower:
+        sys.stderr.write('extract is slower than json at {n} files: '
+                         '{e:.4f}s vs {d:.4f}s\n'.format(n=size, e=extract,
+                                                          d=decode))
+    if slower:
+        sys.exit(1)
+
+
+def slower_extracts(results):
+    '''
+    Finds the list sizes at which extracting a key was slower than decoding
+    the whole response. Both are timed in the extract case, taking turns,
+    and compared by their fastest calls: the other calls are slowed down
+    by whatever else runs on the machine.
+
+    @param results: The results of the cases.
+    @type results: list
+    @return: (size, extract seconds, json seconds) of each such size.
+    @rtype: list
+    '''
+    return [(r['size'], r['best'], r['json_best']) for r in results
+            if r['case'] == 'extract' and
+            r['best'] > r['json_best'] * EXTRACT_TOLERANCE]
+
+
+def run_case(case, uri, size, concurrency, requests):
+    '''
+    Runs one case in this process.
+
+    @param case: One of L{CASES}.
+    @type case: str
+    @param uri: URI base of the stand-in, or for upload and multipart the
+                file to send.
+    @type uri: str
+    @param size: Payload size in bytes, files on the list for json.
+    @type size: int
+    @param concurrency: Number of requests in flight.
+    @type concurrency: int
+    @param requests: Number of requests, or of repetitions.
+    @type requests: int
+    @return: The measured numbers.
+    @rtype: dict
+    '''
+    uri_base, _, path = uri.partition('|')
+    if case in ('list', 'delete'):
+        conn = _connector(uri_base, concurrency)
+        api_method = 'files.' + case
+        http_method = 'GET' if case == 'list' else 'POST'
+        call = lambda: conn.make_request(
+            http_method, 'api/' + api_method,
+            urlparam={'token': 'token', 'file': 'F00000000'}).json
+    elif case == 'upload':
+        files = FilesAPI(_connector(uri_base, concurrency), 'token',
+                         api_uri='api/')
+        call = lambda: files.upload(path)
+    elif case == 'multipart':
+        call = lambda: _drain(path)
+    elif case == 'json':
+        content = json.dumps(canned_list(size))
+        call = lambda: json.loads(content)['files']
+        concurrency = 1
+    elif case == 'extract':
+        content = json.dumps(canned_list(size))
+        call = lambda: extract_keys(content, ['ok'])
+        decode = lambda: json.loads(content)['ok']
+        concurrency = 1
+    else:
+        raise ValueError('Unknown case {c}'.format(c=case))
+    call()
+    latencies, seconds = _timed(call, requests, concurrency)
+    latencies.sort()
+    result = {'case': case, 'size': size, 'concurrency': concurrency,
+            'requests': requests, 'seconds': seconds,
+            'rps': requests / seconds if seconds else 0.0,
+            'mb_per_s': (size * requests / seconds / (1 << 20)
+                         if seconds and case in ('upload', 'multipart')
+                         else None),
+            'p50': _percentile(latencies, 0.5),
+            'p99': _percentile(latencies, 0.99),
+            'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+    if case == 'extract':
+        result['best'], result['json_best'] = _fastest([call, decode],
+                                                        requests)
+    return result
+
+
+def _fastest(calls, rounds):
+    '''
+    Times calls against each other: they take turns, in a changing order,
+    so that whatever slows the machine down slows all of them. The garbage
+    collector is off meanwhile, as in C{timeit}.
+
+    @return: The fastest time of each call, in seconds.
+    @rtype: list
+    '''
+    best = [float('inf')] * len(calls)
+    gc.disable()
+    try:
+        for round_ in range(rounds):
+            order = range(len(calls))
+            if round_ % 2:
+                order.reverse()
+            for index in order:
+                start = time.time()
+                calls[index]()
+                best[index] = min(best[index], time.time() - start)
+    finally:
+        gc.enable()
+    return best
+
+
+def _timed(call, requests, concurrency):
+    '''
+    Calls call requests times from concurrency threads.
+
+    @return: The latency of each call and the seconds all of them took.
+    @rtype: tuple
+    '''
+    def timed(_):
+        start = time.time()
+        call()
+        return time.time() - start
+
+    if concurrency == 1:
+        start = time.time()
+        latencies = [timed(i) for i in range(requests)]
+        return latencies, time.time() - start
+    pool = ThreadPool(concurrency)
+    try:
+        start = time.time()
+        latencies = pool.map(timed, range(requests), chunksize=1)
+        return latencies, time.time() - start
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _connector(uri_base, concurrency):
+    slack = AWSSlack('http://127.0.0.1')
+    slack.uri_base = lambda: uri_base
+    conn = slack.create_connector(Connector.REST, test_token='token')
+    conn.disable_ssl_certificate(True)
+    conn.pool_limits(max_connections=concurrency, max_idle=concurrency)
+    # the stand-in has no rate limits, the client must not add its own
+    conn.rate_limits({}, max_concurrency=concurrency)
+    return conn
+
+
+def _drain(path):
+    _, body = encode_multipart_formdata_stream(
+        [('channels', 'C0001')], [('file', os.path.basename(path), path)])
+    try:
+        while body.read(_READ_SIZE):
+            pass
+    finally:
+        body.close()
+
+
+def _percentile(ordered, q):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _plan(args):
+    '''
+    Yields the (case, size, concurrency) of every case to run.
+    '''
+    sizes = [s for s in SIZES if s <= args.max_size]
+    for case in args.cases:
+        if case in ('list', 'delete'):
+            for concurrency in args.concurrency:
+                yield case, 0, concurrency
+        elif case == 'upload':
+            for size in sizes:
+                for concurrency in UPLOAD_CONCURRENCY:
+                    yield case, size, concurrency
+        elif case == 'multipart':
+            for size in sizes:
+                yield case, size, 1
+        elif case == 'json':
+            for count in LIST_SIZES:
+                yield 'json', count, 1
+                yield 'extract', count, 1
+
+
+def _spawn(case, uri_base, size, concurrency, requests, tmpdir):
+    '''
+    Runs a case in a new process and returns its result.
+    '''
+    uri = uri_base
+    if case in ('upload', 'multipart'):
+        requests = max(1, min(requests, BYTES_PER_CASE // size))
+        uri += '|' + _payload(tmpdir, size)
+    elif case in ('json', 'extract'):
+        requests = max(MIN_DECODES, requests * LIST_SIZES[0] // size)
+    command = [sys.executable, os.path.abspath(__file__), '--case', case,
+               '--uri', uri, '--size', str(size),
+               '--concurrency', str(concurrency),
+               '--requests', str(requests)]
+    output = subprocess.check_output(command)
+    return json.loads(output)
+
+
+def _payload(tmpdir, size):
+    '''
+    Returns a sparse file of size bytes, so that even 1 GB payloads cost no
+    disk space.
+    '''
+    path = os.path.join(tmpdir, 'payload-{n}.bin'.format(n=size))
+    if not os.path.exists(path):
+        with open(path, 'wb') as out:
+            out.truncate(size)
+    return path
+
+
+def _meta(args):
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit, 'python': platform.python_version(),
+            'platform': platform.platform(), 'cpus': _cpu_count(),
+            'tls': args.certfile is not None,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())}
+
+
+def _cpu_count():
+    try:
+        import multiprocessing
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return None
+
+
+def _summary(result):
+    return ('{case:9} size={size:<10} concurrency={concurrency:<3} '
+            'rps={rps:10.1f} p50={p50:.4f}s p99={p99:.4f}s '
+            'rss={peak_rss_kb}KB'.format(**result))
+
+
+def _size(value):
+    value = value.strip().upper()
+    for unit, factor in _UNITS.items():
+        if value.endswith(unit):
+            return int(float(value[:-len(unit)]) * factor)
+    return int(value)
+
+
+def _numbers(value):
+    return [int(v) for v in value.split(',') if v]
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmarks the framework against a local stand-in of '
+                    'the slack files API.')
+    parser.add_argument('--output', default='benchmark-results.json',
+                        help='file the JSON results are written to')
+    parser.add_argument('--cases', type=lambda v: v.split(','),
+                        default=list(CASES),
+                        help='cases to run, out of ' + ','.join(CASES))
+    parser.add_argument('--max-size', type=_size, default=16 << 20,
+                        help='largest payload, e.g. 1GB (default 16MB)')
+    parser.add_argument('--concurrency', type=_numbers,
+                        default=list(CONCURRENCY),
+                        help='comma separated concurrency levels of the '
+                             'list and delete cases')
+    parser.add_argument('--requests', type=int, default=1000,
+                        help='requests per case')
+    parser.add_argument('--list-size', type=int, default=100,
+                        help='files on the files.list page of the stand-in')
+    parser.add_argument('--certfile', help='PEM certificate, serves HTTPS')
+    parser.add_argument('--keyfile', help='PEM key of the certificate')
+    # used by the child processes running one case each
+    parser.add_argument('--case', help=argparse.SUPPRESS)
+    parser.add_argument('--uri', help=argparse.SUPPRESS)
+    parser.add_argument('--size', type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.case:
+        args.concurrency = args.concurrency[0]
+    return args
+
+
+if __name__ == '__main__':
+    main()
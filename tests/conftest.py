@@ -9,6 +9,11 @@ import socket
 import json
 import subprocess
 from testingframework.log import Logging
+from testingframework.util.wait import WAIT_STATS
+from testingframework.connector.metrics import METRICS
+from testingframework.slack.aws import AWSSlack
+from slacktest.server.base import SlackAPIServer
+from slacktest.server.fake import FakeSlackAPI
 
 LOGGER = Logging().logger
 
@@ -45,3 +50,106 @@ def pytest_addoption(parser):
     splk_group.addoption('--test_token', dest='test_token',
                      help='test token to access slack APIs',
                      default='')
+    splk_group.addoption('--metrics_file', dest='metrics_file',
+                     help='file to write the request latency metrics to, '
+                          'in the OpenMetrics text format',
+                     default='')
+    splk_group.addoption('--fake_slack', dest='fake_slack',
+                     action='store_true', default=False,
+                     help='run against an in-memory fake of the slack files '
+                          'API instead of the real service, with a new '
+                          'workspace for every test')
+    splk_group.addoption('--cassette', dest='cassette', default='',
+                     help='path of a cassette to record the requests of the '
+                          'session to, or to replay them from')
+    splk_group.addoption('--cassette_mode', dest='cassette_mode',
+                     choices=['record', 'replay'], default='replay',
+                     help='record the requests to the cassette, or replay '
+                          'them from it without the network (default)')
+    splk_group.addoption('--cassette_lenient', dest='cassette_lenient',
+                     action='store_true', default=False,
+                     help='send requests that were not recorded over the '
+                          'network instead of failing when replaying')
+
+
+@pytest.fixture(scope="session")
+def fake_slack(request):
+    '''
+    Starts the in-memory fake of the slack files API for the session.
+    Create a workspace per test with L{fake_workspace}.
+
+    @rtype: L{SlackAPIServer}, its api is the L{FakeSlackAPI}
+    '''
+    server = SlackAPIServer(FakeSlackAPI()).start()
+    request.addfinalizer(server.stop)
+    return server
+
+
+@pytest.fixture
+def fake_workspace(request, fake_slack):
+    '''
+    A new empty workspace of the fake slack, removed with its files at the
+    end of the test.
+
+    @rtype: L{Workspace}
+    '''
+    workspace = fake_slack.api.create_workspace()
+    request.addfinalizer(
+        lambda: fake_slack.api.remove_workspace(workspace.token))
+    return workspace
+
+
+@pytest.fixture
+def fake_deployment(fake_slack):
+    '''
+    A slack deployment pointed at the fake slack. Its connectors need the
+    token of a L{fake_workspace}.
+
+    @rtype: L{AWSSlack}
+    '''
+    return _deployment(fake_slack)
+
+
+@pytest.fixture
+def local_slack(request):
+    '''
+    Serves API objects on local L{SlackAPIServer}s for the test. Returns a
+    function taking the API object, whose C{handle(request)} answers the
+    requests, and returning a slack deployment pointed at its server.
+
+    >>> slack = local_slack(api)
+    >>> conn = slack.create_connector(Connector.REST, test_token='token')
+
+    @rtype: function
+    '''
+    def serve(api):
+        server = SlackAPIServer(api).start()
+        request.addfinalizer(server.stop)
+        return _deployment(server)
+    return serve
+
+
+def _deployment(server):
+    '''
+    Returns a slack deployment sending its requests to a local server.
+    '''
+    slack = AWSSlack('http://127.0.0.1')
+    slack.uri_base = lambda: server.uri_base
+    return slack
+
+
+def pytest_sessionfinish(session, exitstatus):
+    '''
+    This is a pytest hook called at the end of the test session, it logs how
+    long the polls took so their deadlines and intervals can be tuned, and
+    writes the request metrics if --metrics_file is given.
+    '''
+    for description, wait in sorted(WAIT_STATS.summary().items()):
+        LOGGER.info("Wait '{d}': {count} waits, {timeouts} timed out, "
+                    "mean {mean:.3f}s, p90 {p90:.3f}s, max {max:.3f}s, "
+                    "{attempts:.1f} attempts".format(d=description, **wait))
+    metrics_file = getattr(session.config.option, 'metrics_file', '')
+    if metrics_file:
+        with open(metrics_file, 'w') as fp:
+            fp.write(METRICS.openmetrics())
+        LOGGER.info("Request metrics written to {f}".format(f=metrics_file))
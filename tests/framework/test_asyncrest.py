@@ -0,0 +1,115 @@
+from testingframework.connector.base import Connector
+from testingframework.connector.response import RESTResponse
+from slacktest.util.VerifierBase import VerifierBase
+from multiprocessing import TimeoutError
+from multiprocessing.pool import AsyncResult
+import threading
+import time
+import pytest
+
+verifier = VerifierBase()
+
+
+class SlowAPI(object):
+    '''
+    Local stand-in that answers after the delay asked for in the query, and
+    counts the requests it handles at once. Requests to files.hold wait
+    until released.
+    '''
+
+    def __init__(self):
+        self.in_flight = self.peak = 0
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+
+    def handle(self, request):
+        with self._lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            if request.api_method == 'files.hold':
+                self.release.wait(10)
+            else:
+                time.sleep(float(request.query.get('delay', 0)))
+            return 200, {'ok': True, 'n': request.query.get('n')}
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+@pytest.fixture
+def slow_api(request):
+    api = SlowAPI()
+    request.addfinalizer(api.release.set)
+    return api
+
+
+@pytest.fixture
+def asyncconn(request, slow_api, local_slack):
+    slack = local_slack(slow_api)
+    conn = slack.create_connector(Connector.ASYNC, test_token='token')
+    request.addfinalizer(conn.close)
+    return conn
+
+
+class TestAsyncRequests(object):
+
+    def test_make_request_returns_handle(self, asyncconn):
+        handle = asyncconn.make_request('GET', 'api/files.list',
+                                        urlparam={'n': '1', 'delay': '0.05'})
+        verifier.verify_true(isinstance(handle, AsyncResult))
+        result = handle.get(5)
+        verifier.verify_true(isinstance(result, RESTResponse))
+        verifier.verify_true(result.ok)
+        verifier.verify_equals(result.json['n'], '1')
+
+    def test_gather_keeps_order(self, asyncconn):
+        # the first requests answer last
+        handles = [asyncconn.make_request(
+            'GET', 'api/files.list',
+            urlparam={'n': str(n), 'delay': str(0.05 * (4 - n))})
+            for n in range(5)]
+        results = asyncconn.gather(*handles)
+        verifier.verify_equals([r.json['n'] for r in results],
+                               [str(n) for n in range(5)])
+
+    def test_gather_return_exceptions(self, asyncconn):
+        # a body that can't be encoded fails in the worker thread
+        handles = [asyncconn.make_request('GET', 'api/files.list'),
+                   asyncconn.make_request('POST', 'api/files.list', body=5),
+                   asyncconn.make_request('GET', 'api/files.list')]
+        results = asyncconn.gather(*handles, return_exceptions=True)
+        verifier.verify_true(results[0].ok)
+        verifier.verify_true(isinstance(results[1], TypeError))
+        verifier.verify_true(results[2].ok)
+        with pytest.raises(TypeError):
+            asyncconn.gather(*handles)
+        with pytest.raises(TypeError):
+            asyncconn.gather(*handles, retries=1)
+
+    def test_gather_timeout(self, asyncconn, slow_api):
+        handle = asyncconn.make_request('GET', 'api/files.hold')
+        with pytest.raises(TimeoutError):
+            asyncconn.gather(handle, timeout=0.1)
+        slow_api.release.set()
+        verifier.verify_true(asyncconn.gather(handle, timeout=5)[0].ok)
+
+    def test_max_in_flight(self, asyncconn, slow_api):
+        asyncconn.max_in_flight(3)
+        verifier.verify_equals(asyncconn.pool.max_connections, 3)
+        handles = [asyncconn.make_request('GET', 'api/files.list',
+                                          urlparam={'delay': '0.05'})
+                   for _ in range(12)]
+        asyncconn.gather(*handles, timeout=5)
+        verifier.verify_equals(slow_api.peak, 3)
+
+    def test_close_finishes_queued_requests(self, asyncconn, slow_api):
+        handles = [asyncconn.make_request('GET', 'api/files.hold')
+                   for _ in range(3)]
+        asyncconn.close()
+        slow_api.release.set()
+        verifier.verify_true(all(r.ok for r in asyncconn.gather(
+            *handles, timeout=5)))
+        # the next request starts new workers
+        handle = asyncconn.make_request('GET', 'api/files.list')
+        verifier.verify_true(handle.get(5).ok)
@@ -0,0 +1,64 @@
+from testingframework.connector.base import Connector
+from testingframework.connector.batch import run_batch
+from testingframework.connector.response import RESTResponse
+from slacktest.util.VerifierBase import VerifierBase
+import pytest
+
+verifier = VerifierBase()
+
+
+class InfoAPI(object):
+    '''
+    Local stand-in answering files.info, files whose id starts with "x"
+    are not found.
+    '''
+
+    def handle(self, request):
+        file_id = request.query.get('file', '')
+        if file_id.startswith('x'):
+            return 404, {'ok': False, 'error': 'file_not_found'}
+        return 200, {'ok': True, 'file': {'id': file_id}}
+
+
+@pytest.fixture
+def restconn(local_slack):
+    slack = local_slack(InfoAPI())
+    return slack.create_connector(Connector.REST, test_token='token')
+
+
+class TestBatch(object):
+
+    def test_failed_request_keeps_its_place(self, restconn):
+        batch = [('GET', 'api/files.info', None, {'file': 'F0'}),
+                 # a body that can't be encoded raises in make_request
+                 {'method': 'POST', 'uri': 'api/files.info', 'body': 5},
+                 ('GET', 'api/files.info', None, {'file': 'x1'}),
+                 {'method': 'GET', 'uri': 'api/files.info',
+                  'urlparam': {'file': 'F3'}}]
+        results = restconn.make_requests(batch, workers=4)
+        verifier.verify_equals([r.spec for r in results], batch)
+        verifier.verify_equals([r.failed for r in results],
+                               [False, True, False, False])
+        verifier.verify_true(isinstance(results[1].error, TypeError))
+        verifier.verify_equals(results[1].response, None)
+        with pytest.raises(TypeError):
+            results[1].json
+        with pytest.raises(TypeError):
+            response, content = results[1]
+        verifier.verify_equals(results[0].json['file']['id'], 'F0')
+        verifier.verify_equals(results[3].json['file']['id'], 'F3')
+        verifier.verify_equals([results[2].status, results[2].ok],
+                               [404, False])
+
+    def test_results_keep_responses(self, restconn):
+        results = restconn.make_requests(
+            [('GET', 'api/files.info', None, {'file': 'F0'})])
+        verifier.verify_true(isinstance(results[0].result, RESTResponse))
+        response, content = results[0]
+        verifier.verify_equals(response.status, 200)
+        verifier.verify_equals(content, results[0].result.content)
+
+    def test_plain_tuples_are_wrapped(self):
+        results = run_batch(lambda n: ({'status': 200}, '{"ok": true}'),
+                            [(1,), (2,)], 2)
+        verifier.verify_true(all(r.ok for r in results))
@@ -0,0 +1,86 @@
+from testingframework.connector.base import Connector
+from testingframework.connector.cache import ResponseCache
+from slacktest.util.VerifierBase import VerifierBase
+import httplib2
+import pytest
+
+verifier = VerifierBase()
+
+
+class ETagAPI(object):
+    '''
+    Local stand-in for files.list and files.delete that sends ETags.
+    '''
+
+    def __init__(self):
+        self.requests, self.version = [], 0
+
+    def handle(self, request):
+        self.requests.append('/api/' + request.api_method)
+        if request.api_method == 'files.delete':
+            self.version += 1
+        etag = '"v%d"' % self.version
+        if request.headers.get('if-none-match') == etag:
+            return 304, '', {'ETag': etag}
+        return 200, '{"ok": true, "version": %d}' % self.version, \
+            {'ETag': etag}
+
+
+@pytest.fixture
+def files_api():
+    return ETagAPI()
+
+
+@pytest.fixture
+def restconn(files_api, local_slack):
+    slack = local_slack(files_api)
+    return slack.create_connector(Connector.REST, test_token='token')
+
+
+class TestResponseCache(object):
+
+    def test_lru_eviction_within_budget(self):
+        cache = ResponseCache(max_bytes=250, ttls={'files.info': 60})
+        response = httplib2.Response({'status': '200'})
+        keys = [cache.key('GET', 'http://h/api/files.info?file=%d' % i, 't')
+                for i in range(3)]
+        cache.store(keys[0], 'files.info', response, 'a' * 100)
+        cache.store(keys[1], 'files.info', response, 'b' * 100)
+        cache.get(keys[0])
+        cache.store(keys[2], 'files.info', response, 'c' * 100)
+        verifier.verify_true(cache.get(keys[0]) is not None)
+        verifier.verify_true(cache.get(keys[1]) is None)
+        verifier.verify_equals(cache.stats()['evictions'], 1)
+
+    def test_key_ignores_param_order(self):
+        cache = ResponseCache()
+        verifier.verify_equals(
+            cache.key('GET', 'http://h/api/files.list?a=1&b=2', 't'),
+            cache.key('get', 'http://h/api/files.list?b=2&a=1', 't'))
+
+
+class TestCachedRequests(object):
+
+    def test_hit_and_invalidation(self, files_api, restconn):
+        restconn.enable_cache()
+        urlparam = {'token': 'token', 'count': 100}
+        for _ in range(3):
+            response, content = restconn.make_request(
+                'GET', 'api/files.list', urlparam=urlparam)
+        verifier.verify_equals(files_api.requests, ['/api/files.list'])
+        restconn.make_request('GET', 'api/files.delete',
+                              urlparam={'token': 'token', 'file': 'F1'})
+        response, content = restconn.make_request(
+            'GET', 'api/files.list', urlparam=urlparam)
+        verifier.verify_equals(content, '{"ok": true, "version": 1}')
+        stats = restconn.cache.stats()
+        verifier.verify_equals((stats['hits'], stats['misses']), (2, 2))
+        verifier.verify_equals(stats['invalidations'], 1)
+
+    def test_expired_entry_is_revalidated(self, files_api, restconn):
+        restconn.enable_cache(ttls={'files.list': 0})
+        first = restconn.make_request('GET', 'api/files.list')
+        second = restconn.make_request('GET', 'api/files.list')
+        verifier.verify_equals(second[1], first[1])
+        verifier.verify_equals(second[0].status, 200)
+        verifier.verify_equals(restconn.cache.stats()['revalidations'], 1)
@@ -0,0 +1,79 @@
+from testingframework.slack.aws import AWSSlack
+from testingframework.connector.base import Connector
+from testingframework.connector.cassette import Cassette, CassetteMiss, \
+    normalize
+from testingframework.util.wait import wait_until, WaitStats
+from slacktest.server.base import SlackAPIServer
+from slacktest.server.fake import FakeSlackAPI
+from slacktest.util.files_api import FilesAPI
+from slacktest.util.VerifierBase import VerifierBase
+import time
+import pytest
+
+verifier = VerifierBase()
+
+
+@pytest.fixture
+def fake(request):
+    server = SlackAPIServer(FakeSlackAPI()).start()
+    request.addfinalizer(server.stop)
+    return server
+
+
+def connector(server):
+    slack = AWSSlack('http://127.0.0.1')
+    slack.uri_base = lambda: server.uri_base
+    return slack.create_connector(Connector.REST, test_token='token')
+
+
+class TestCassette(object):
+
+    def test_record_then_replay_offline(self, fake, tmpdir):
+        path = str(tmpdir.join('files'))
+        token = fake.api.create_workspace().token
+        restconn = connector(fake)
+        files = FilesAPI(restconn, token, api_uri='api/')
+        with Cassette(path, Cassette.RECORD).use(restconn):
+            files.upload(content='hello', filename='a.txt')
+            listed = [f['name'] for f in files.iter_files()]
+            files.upload(content='again', filename='b.txt')
+            relisted = [f['name'] for f in files.iter_files()]
+        fake.stop()
+        files = FilesAPI(connector(fake), 'another-token', api_uri='api/')
+        with Cassette(path).use(files._connector) as cassette:
+            files.upload(content='hello', filename='a.txt')
+            # the same request is answered as it was, in order
+            verifier.verify_equals([f['name'] for f in files.iter_files()],
+                                   listed)
+            files.upload(content='again', filename='b.txt')
+            verifier.verify_equals([f['name'] for f in files.iter_files()],
+                                   relisted)
+            verifier.verify_equals([f['name'] for f in files.iter_files()],
+                                   relisted)
+            with pytest.raises(CassetteMiss):
+                files.delete('F1')
+        verifier.verify_equals(cassette.unmatched,
+                               ['POST /api/files.delete?file=F1'])
+        verifier.verify_true('0 recorded exchanges not played'
+                             in cassette.report())
+
+    def test_normalize(self):
+        first = normalize('get', 'http://a:1/api/files.list?b=2&token=x&a=1',
+                          '', {})
+        second = normalize('GET', 'https://b/api/files.list?a=1&b=2&token=y',
+                           '', {})
+        verifier.verify_equals(first, second)
+        verifier.verify_equals(first[0], 'GET /api/files.list?a=1&b=2')
+        verifier.verify_true(normalize('POST', 'http://a/x', 'one', {})[1] !=
+                             normalize('POST', 'http://a/x', 'two', {})[1])
+
+    def test_replay_skips_sleeps(self, fake, tmpdir):
+        path = str(tmpdir.join('empty'))
+        Cassette(path, Cassette.RECORD).close()
+        restconn = connector(fake)
+        calls = []
+        start = time.time()
+        with Cassette(path).use(restconn):
+            wait_until(lambda: calls.append(1) or len(calls) == 5,
+                       interval=10, backoff=1, jitter=0, stats=WaitStats())
+        verifier.verify_true(time.time() - start < 1)
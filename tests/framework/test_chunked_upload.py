@@ -0,0 +1,83 @@
+from testingframework.connector.base import Connector
+from slacktest.util.VerifierBase import VerifierBase
+from slacktest.util.chunked_upload import ChunkedUpload, ChunkUploadError
+import json
+import os
+import pytest
+
+verifier = VerifierBase()
+
+
+class ChunkAPI(object):
+    '''
+    Local stand-in that stores the chunks it receives per upload id.
+    '''
+
+    def __init__(self):
+        self.uploads, self.received, self.completed = {}, [], []
+        self.failing, self.garbled = set(), set()
+
+    def handle(self, request):
+        params = request.params()
+        if request.api_method == 'files.uploadDone':
+            chunks = self.uploads.get(params['upload_id'], {})
+            data = ''.join(chunks[i] for i in sorted(chunks))
+            self.completed.append(data)
+            return 200, {'ok': len(chunks) == int(params['chunks'])}
+        index = int(params['chunk'])
+        self.received.append(index)
+        if index in self.failing:
+            return 200, {'ok': False, 'error': 'internal_error'}
+        if index in self.garbled:
+            return 200, '<html>502 Bad Gateway</html>'
+        upload = self.uploads.setdefault(params['upload_id'], {})
+        upload[index] = request.form()['file'].value
+        return 200, {'ok': True}
+
+
+@pytest.fixture
+def chunk_api():
+    return ChunkAPI()
+
+
+@pytest.fixture
+def restconn(chunk_api, local_slack):
+    slack = local_slack(chunk_api)
+    return slack.create_connector(Connector.REST, test_token='token')
+
+
+class TestChunkedUpload(object):
+
+    def _upload(self, restconn, path, journal):
+        return ChunkedUpload(restconn, 'api/files.uploadChunk', path,
+                             chunk_size=64 * 1024, concurrency=3,
+                             journal_path=journal,
+                             complete_uri='api/files.uploadDone')
+
+    def test_upload_and_resume(self, chunk_api, restconn, tmpdir):
+        path = str(tmpdir.join('artifact.bin'))
+        with open(path, 'wb') as fp:
+            fp.write(os.urandom(64 * 1024 * 7 + 123))
+        journal = str(tmpdir.join('artifact.journal'))
+        chunk_api.failing = set([2])
+        # a 2xx answer that is not slack's JSON is no acceptance either
+        chunk_api.garbled = set([5])
+
+        upload = self._upload(restconn, path, journal)
+        verifier.verify_equals(upload.chunks, 8)
+        with pytest.raises(ChunkUploadError):
+            upload.run()
+        verifier.verify_true(os.path.exists(journal))
+
+        chunk_api.failing, chunk_api.garbled = set(), set()
+        del chunk_api.received[:]
+        resumed = self._upload(restconn, path, journal)
+        verifier.verify_equals(resumed.upload_id, upload.upload_id)
+        verifier.verify_equals(resumed.pending_chunks, [2, 5])
+        response, content = resumed.run()
+        verifier.verify_true(json.loads(content)['ok'])
+        verifier.verify_equals(sorted(chunk_api.received), [2, 5])
+        with open(path, 'rb') as fp:
+            verifier.verify_true(chunk_api.completed[-1] == fp.read(),
+                                 'reassembled upload differs')
+        verifier.verify_false(os.path.exists(journal))
@@ -0,0 +1,38 @@
+from testingframework.util.compare import files_equal, identical_groups
+from testingframework.util.hashing import HashCache
+from slacktest.util.VerifierBase import VerifierBase
+import os
+
+verifier = VerifierBase()
+
+
+class TestCompare(object):
+
+    def test_files_equal(self, tmpdir):
+        data = os.urandom(10000)
+        first, same, other, shorter = [tmpdir.join(name) for name in
+                                       ('a', 'b', 'c', 'd')]
+        first.write(data, mode='wb')
+        same.write(data, mode='wb')
+        other.write(data[:-1] + chr(ord(data[-1]) ^ 1), mode='wb')
+        shorter.write(data[:-1], mode='wb')
+        for block_size in (7, 4096, 10000, 1 << 20):
+            verifier.verify_true(files_equal(str(first), str(same),
+                                             block_size))
+            verifier.verify_false(files_equal(str(first), str(other),
+                                              block_size))
+        verifier.verify_false(files_equal(str(first), str(shorter)))
+
+    def test_only_same_sizes_are_hashed(self, tmpdir):
+        paths = []
+        for name, content in [('a', 'xx'), ('b', 'yyy'), ('c', 'xx'),
+                              ('d', 'zz'), ('e', ''), ('f', '')]:
+            path = tmpdir.join(name)
+            path.write(content, mode='wb')
+            paths.append(str(path))
+        cache = HashCache()
+        groups = identical_groups(paths, cache)
+        verifier.verify_equals(groups, [[paths[0], paths[2]],
+                                        [paths[4], paths[5]]])
+        # b has a size of its own, empty files need no hash
+        verifier.verify_equals(len(cache), 3)
@@ -0,0 +1,82 @@
+from testingframework.connector.base import Connector
+from slacktest.util.VerifierBase import VerifierBase
+from slacktest.util.files_api import FilesAPI, SlackAPIError
+from slacktest.util.file_mirror import FileMirror
+import pytest
+
+verifier = VerifierBase()
+
+
+class ListAPI(object):
+    '''
+    Local stand-in for a paged files.list.
+    '''
+
+    def __init__(self):
+        self.pages = []
+        self.files = [{'id': 'F%03d' % i, 'name': 'file%d.txt' % i}
+                      for i in range(25)]
+
+    def handle(self, request):
+        query = request.query
+        if query.get('token') != 'token':
+            return 200, {'ok': False, 'error': 'invalid_auth'}
+        page, count = int(query['page']), int(query['count'])
+        self.pages.append(page)
+        files = self.files[(page - 1) * count:page * count]
+        pages = -(-len(self.files) // count)
+        return 200, {'ok': True, 'files': files,
+                     'paging': {'count': count, 'page': page, 'pages': pages,
+                                'total': len(self.files)}}
+
+
+@pytest.fixture
+def list_api():
+    return ListAPI()
+
+
+@pytest.fixture
+def restconn(list_api, local_slack):
+    slack = local_slack(list_api)
+    return slack.create_connector(Connector.REST, test_token='token')
+
+
+class TestIterFiles(object):
+
+    def test_all_pages_in_order(self, list_api, restconn):
+        files = FilesAPI(restconn, 'token', api_uri='api/')
+        ids = [record['id'] for record in files.iter_files(count=10)]
+        verifier.verify_equals(ids, [f['id'] for f in list_api.files])
+        verifier.verify_equals(sorted(list_api.pages), [1, 2, 3])
+
+    def test_early_termination(self, list_api, restconn):
+        files = FilesAPI(restconn, 'token', api_uri='api/')
+        for record in files.iter_files(count=10, prefetch=False):
+            if record['id'] == 'F003':
+                break
+        verifier.verify_equals(list_api.pages, [1])
+
+    def test_error(self, restconn):
+        files = FilesAPI(restconn, 'revoked', api_uri='api/')
+        with pytest.raises(SlackAPIError) as err:
+            list(files.iter_files())
+        verifier.verify_equals(err.value.error, 'invalid_auth')
+
+
+class TestFileMirror(object):
+
+    def test_sync_and_lookups(self, list_api, restconn):
+        files = FilesAPI(restconn, 'token', api_uri='api/',
+                         mirror=FileMirror())
+        verifier.verify_equals(files.sync(count=10), 25)
+        verifier.verify_equals(files.mirror.first_by_name('file7.txt')['id'],
+                               'F007')
+        files.mirror.add({'id': 'F007', 'name': 'renamed.txt',
+                          'filetype': 'text', 'user': 'U1'})
+        verifier.verify_equals(files.mirror.by_name('file7.txt'), [])
+        verifier.verify_equals([r['id'] for r in files.mirror.by_user('U1')],
+                               ['F007'])
+        files.mirror.remove('F007')
+        verifier.verify_false('F007' in files.mirror)
+        verifier.verify_equals(files.mirror.by_filetype('text'), [])
+        verifier.verify_equals(len(files.mirror), 24)
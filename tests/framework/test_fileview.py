@@ -0,0 +1,47 @@
+from testingframework.util.fileview import FileView
+from testingframework.util.fileutils import FileUtils
+from slacktest.util.VerifierBase import VerifierBase
+import os
+import pytest
+
+verifier = VerifierBase()
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        '..', '..', 'data', 'files')
+
+
+class TestFileView(object):
+
+    def test_small_files_are_read(self, tmpdir):
+        path = tmpdir.join('small')
+        path.write('\r\n\x00\xff', mode='wb')
+        with FileView(str(path), threshold=5) as view:
+            verifier.verify_false(view.mapped)
+            verifier.verify_equals(view.data, '\r\n\x00\xff')
+            verifier.verify_equals(len(view), 4)
+        verifier.verify_true(view.closed)
+
+    def test_large_files_are_mapped(self):
+        path = os.path.join(DATA_DIR, 'slack_api_test.png')
+        with open(path, 'rb') as fp:
+            expected = fp.read()
+        with FileUtils().read_file(path, threshold=1024) as view:
+            verifier.verify_true(view.mapped)
+            verifier.verify_equals(len(view), len(expected))
+            verifier.verify_true(view.data[:] == expected)
+            data = view.data
+        # the mapping is released at the end of the block
+        verifier.verify_true(view.closed)
+        with pytest.raises(ValueError):
+            data[:1]
+
+    def test_empty_file(self, tmpdir):
+        path = tmpdir.join('empty')
+        path.write('')
+        with FileView(str(path), threshold=0) as view:
+            verifier.verify_equals(view.data, '')
+
+    def test_get_file_contents_is_binary(self):
+        path = os.path.join(DATA_DIR, 'LeaseRental.pdf')
+        with open(path, 'rb') as fp:
+            expected = fp.read()
+        verifier.verify_true(FileUtils().get_file_contents(path) == expected)
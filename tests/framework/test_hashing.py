@@ -0,0 +1,43 @@
+from testingframework.util.hashing import hash_file, HashCache
+from slacktest.util.VerifierBase import VerifierBase
+import binascii
+import hashlib
+import os
+
+verifier = VerifierBase()
+
+
+class TestHashing(object):
+
+    def test_digests_in_one_pass(self, tmpdir):
+        data = os.urandom(300000)
+        path = tmpdir.join('data.bin')
+        path.write(data, mode='wb')
+        digests = hash_file(str(path), block_size=4096)
+        verifier.verify_equals(digests, {
+            'crc32': binascii.crc32(data) & 0xffffffff,
+            'md5': hashlib.md5(data).hexdigest(),
+            'sha256': hashlib.sha256(data).hexdigest()})
+
+    def test_unchanged_files_are_not_read_again(self, tmpdir):
+        path = tmpdir.join('data.bin')
+        path.write('first', mode='wb')
+        cache_file = str(tmpdir.join('cache.json'))
+        cache = HashCache(cache_file)
+        first = cache.digests(str(path), ('md5',))
+        verifier.verify_equals(cache.digests(str(path), ('md5',)), first)
+        verifier.verify_equals((cache.hits, cache.misses), (1, 1))
+        cache.save()
+        reloaded = HashCache(cache_file)
+        verifier.verify_equals(reloaded.digests(str(path), ('md5',)), first)
+        verifier.verify_equals(reloaded.hits, 1)
+        # another digest of the same file, or a changed file, is computed
+        reloaded.digests(str(path), ('crc32',))
+        path.write('second file', mode='wb')
+        changed = reloaded.digests(str(path), ('md5',))
+        verifier.verify_equals(changed['md5'],
+                               hashlib.md5('second file').hexdigest())
+        verifier.verify_equals(reloaded.misses, 2)
+        path.remove()
+        verifier.verify_equals(reloaded.prune(), 1)
+        verifier.verify_equals(len(reloaded), 0)
@@ -0,0 +1,30 @@
+from testingframework.log import Logging, TestingFrameworkFormatter
+from slacktest.util.VerifierBase import VerifierBase
+import logging
+import time
+
+verifier = VerifierBase()
+
+
+class Producer(Logging):
+    pass
+
+
+class TestLogging(object):
+
+    def test_handler_installed_once(self):
+        first, second = Producer(), Producer()
+        verifier.verify_true(first.logger is second.logger)
+        verifier.verify_equals(len(first.logger.handlers), 1)
+
+    def test_time_of_record_is_used(self):
+        formatter = TestingFrameworkFormatter('%(asctime)s %(message)s')
+        record = logging.LogRecord('x', logging.INFO, __file__, 1, 'hello',
+                                   None, None)
+        record.created = time.mktime((2016, 10, 13, 9, 30, 5, 0, 0, -1))
+        record.msecs = 42
+        verifier.verify_equals(formatter.format(record),
+                               '2016-10-13 09:30:05.042 hello')
+        record.msecs = 999
+        verifier.verify_equals(formatter.formatTime(record),
+                               '2016-10-13 09:30:05.999')
@@ -0,0 +1,90 @@
+from testingframework.util.manifest import Manifest, compare, sync
+from testingframework.util.hashing import HashCache
+from testingframework.util.fileutils import FileUtils
+from slacktest.util.VerifierBase import VerifierBase
+import os
+
+verifier = VerifierBase()
+
+
+class TestManifest(object):
+
+    def _tree(self, root):
+        root.join('a', 'b').ensure(dir=True)
+        root.join('a', 'one').write('one')
+        root.join('a', 'b', 'two').write('two')
+        root.join('three').write('three')
+        return root
+
+    def test_save_load(self, tmpdir):
+        root = self._tree(tmpdir.join('tree'))
+        manifest = Manifest.build(str(root), digest='md5', cache=HashCache())
+        path = str(tmpdir.join('tree.manifest'))
+        manifest.save(path)
+        loaded = Manifest.load(path)
+        verifier.verify_equals(loaded.entries, manifest.entries)
+        verifier.verify_equals(loaded.digest, 'md5')
+        verifier.verify_equals(len(loaded), 5)
+        verifier.verify_true(manifest.diff(loaded).identical)
+
+    def test_compare(self, tmpdir):
+        first = self._tree(tmpdir.join('first'))
+        second = self._tree(tmpdir.join('second'))
+        second.join('a', 'one').write('eno')
+        second.join('three').write('longer')
+        second.join('a', 'b', 'two').remove()
+        second.join('new').write('new')
+        cache = HashCache()
+        diff = compare(str(first), str(second), cache=cache)
+        verifier.verify_equals(diff.added, ['new'])
+        verifier.verify_equals(diff.removed, [os.path.join('a', 'b', 'two')])
+        verifier.verify_equals(diff.changed, [os.path.join('a', 'one'),
+                                              'three'])
+        # only the files of the same size were read
+        verifier.verify_equals(len(cache), 2)
+
+    def test_compare_manifests(self, tmpdir):
+        first = self._tree(tmpdir.join('first'))
+        second = self._tree(tmpdir.join('second'))
+        second.join('three').write('THREE')
+        cache = HashCache()
+        manifest = Manifest.build(str(first), digest='md5', cache=cache)
+        entries = dict(manifest.entries)
+        diff = compare(manifest, str(second), cache=cache)
+        verifier.verify_equals(diff.changed, ['three'])
+        # the manifest given is left as it was
+        verifier.verify_equals(manifest.entries, entries)
+        other = Manifest.build(str(second), digest='sha1', cache=cache)
+        verifier.verify_equals(compare(manifest, other).changed, ['three'])
+        verifier.verify_equals(other.digest, 'sha1')
+
+    def test_sync(self, tmpdir):
+        source = self._tree(tmpdir.join('source'))
+        source.join('skip.pyc').write('skip')
+        target = tmpdir.join('target')
+        utils = FileUtils()
+        diff = utils.sync_directory(str(source), str(target),
+                                    ignore=[r'\.pyc$'])
+        verifier.verify_equals(len(diff.added), 5)
+        verifier.verify_true(utils.compare_directories(
+            str(source), str(target)).removed == ['skip.pyc'])
+        # a second sync has nothing to do
+        verifier.verify_true(sync(str(source), str(target),
+                                  ignore=[r'\.pyc$']).identical)
+        source.join('three').write('changed')
+        source.join('a', 'b').remove()
+        source.join('a', 'b').write('now a file')
+        target.join('extra', 'deep').ensure(dir=True)
+        target.join('kept.pyc').write('kept')
+        diff = sync(str(source), str(target), ignore=[r'\.pyc$'])
+        verifier.verify_equals(diff.added, [])
+        verifier.verify_equals(diff.changed, [os.path.join('a', 'b'),
+                                              'three'])
+        verifier.verify_equals(diff.removed, [os.path.join('a', 'b', 'two'),
+                                              'extra',
+                                              os.path.join('extra', 'deep')])
+        verifier.verify_equals(target.join('a', 'b').read(), 'now a file')
+        verifier.verify_true(target.join('kept.pyc').check())
+        verifier.verify_false(target.join('extra').check())
+        verifier.verify_true(sync(str(source), str(target),
+                                  ignore=[r'\.pyc$']).identical)
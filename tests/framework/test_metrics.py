@@ -0,0 +1,55 @@
+from testingframework.connector.base import Connector
+from testingframework.connector.metrics import METRICS, Histogram
+from slacktest.util.VerifierBase import VerifierBase
+import threading
+import pytest
+
+verifier = VerifierBase()
+
+
+class SlowAPI(object):
+    '''
+    Local stand-in that takes a while before answering.
+    '''
+
+    def __init__(self):
+        self.delay = threading.Event()
+
+    def handle(self, request):
+        request.drain()
+        self.delay.wait(0.05)
+        return 200, '{"ok": true}'
+
+
+@pytest.fixture
+def restconn(request, local_slack):
+    METRICS.clear()
+    request.addfinalizer(METRICS.clear)
+    slack = local_slack(SlowAPI())
+    return slack.create_connector(Connector.REST, test_token='token')
+
+
+class TestRequestMetrics(object):
+
+    def test_phases_per_endpoint(self, restconn):
+        for _ in range(3):
+            restconn.make_request('POST', 'api/files.upload', body='x' * 1000)
+        endpoint = METRICS.snapshot()['files.upload']
+        verifier.verify_equals(endpoint['statuses'], {'200': 3})
+        verifier.verify_equals(endpoint['phases']['connect']['count'], 1)
+        verifier.verify_equals(endpoint['phases']['ttfb']['count'], 3)
+        verifier.verify_true(endpoint['phases']['ttfb']['mean'] >= 0.05)
+        verifier.verify_true(endpoint['bytes_sent'] > 3000)
+        verifier.verify_equals(endpoint['bytes_received'], 3 * 12)
+        text = METRICS.openmetrics()
+        verifier.verify_true('slack_request_phase_seconds_count{endpoint='
+                             '"files.upload",phase="ttfb"} 3' in text)
+        verifier.verify_true(text.endswith('# EOF\n'))
+
+    def test_histogram_quantiles(self):
+        histogram = Histogram(buckets=(0.1, 1.0, float('inf')))
+        for value in [0.05] * 98 + [0.5, 5]:
+            histogram.observe(value)
+        verifier.verify_equals(histogram.quantile(0.5), 0.1)
+        verifier.verify_equals(histogram.quantile(0.99), 1.0)
+        verifier.verify_equals(histogram.snapshot()['buckets'][-1][1], 100)
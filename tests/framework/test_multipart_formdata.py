@@ -0,0 +1,54 @@
+from slacktest.util.VerifierBase import VerifierBase
+from slacktest.util.multipart_formdata import encode_multipart_formdata, \
+    encode_multipart_formdata_stream
+from testingframework.util.fileview import FileView
+import os
+
+verifier = VerifierBase()
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        '..', '..', 'data', 'files')
+
+
+class TestMultipartFormdataStream(object):
+
+    def _encode_both(self, filename):
+        path = os.path.join(DATA_DIR, filename)
+        fields = [('channels', 'C024BE91L'), ('title', 'test')]
+        with open(path, 'rb') as fp:
+            expected = encode_multipart_formdata(
+                fields, [('file', filename, fp.read())])
+        streamed = encode_multipart_formdata_stream(
+            fields, [('file', filename, path)])
+        return expected, streamed
+
+    def test_stream_matches_joined_body(self):
+        (content_type, body), (stream_type, stream) = \
+            self._encode_both('slack_api_test.png')
+        verifier.verify_equals(stream_type, content_type)
+        verifier.verify_equals(len(stream), len(body))
+        verifier.verify_true(stream.read() == body, 'streamed body differs')
+
+    def test_small_reads_and_rewind(self):
+        (_, body), (_, stream) = self._encode_both('LeaseRental.pdf')
+        blocks = []
+        block = stream.read(1000)
+        while block:
+            blocks.append(block)
+            block = stream.read(1000)
+        verifier.verify_true(''.join(blocks) == body, 'block reads differ')
+        stream.seek(len(body) - 10)
+        verifier.verify_true(stream.read() == body[-10:], 'seek failed')
+        stream.seek(0)
+        verifier.verify_true(''.join(stream) == body, 'rewind failed')
+
+    def test_file_view(self):
+        (_, body), _ = self._encode_both('slack_api_test.png')
+        path = os.path.join(DATA_DIR, 'slack_api_test.png')
+        for threshold in (1, 1 << 30):
+            with FileView(path, threshold) as view:
+                _, stream = encode_multipart_formdata_stream(
+                    [('channels', 'C024BE91L'), ('title', 'test')],
+                    [('file', 'slack_api_test.png', view)])
+                verifier.verify_equals(view.mapped, threshold == 1)
+                verifier.verify_true(stream.read(999) + stream.read() == body,
+                                     'view body differs')
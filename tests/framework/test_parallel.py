@@ -0,0 +1,59 @@
+from testingframework.parallel import namespaced, worker_count, RUN_ENV, \
+    WORKERS_ENV
+from testingframework.parallel.runner import merge_junitxml
+from testingframework.parallel.workqueue import WorkQueue, serve, connect
+from slacktest.util.VerifierBase import VerifierBase
+import os
+
+verifier = VerifierBase()
+
+
+class TestParallel(object):
+
+    def test_queue_is_filled_once(self):
+        queue = WorkQueue()
+        verifier.verify_true(queue.fill(['a', 'b']))
+        verifier.verify_false(queue.fill(['a', 'b']))
+        verifier.verify_equals([queue.take(), queue.take(), queue.take()],
+                               ['a', 'b', None])
+        verifier.verify_equals(queue.stats(), {'taken': 2, 'left': 0})
+
+    def test_queue_is_shared(self):
+        manager = serve('key')
+        try:
+            first = connect(manager.address, 'key')
+            second = connect(manager.address, 'key')
+            first.fill(['a', 'b', 'c'])
+            verifier.verify_equals(second.take(), 'a')
+            verifier.verify_equals(first.take(), 'b')
+            verifier.verify_equals(manager.work_queue().stats(),
+                                   {'taken': 2, 'left': 1})
+        finally:
+            manager.shutdown()
+
+    def test_namespaced(self, monkeypatch):
+        monkeypatch.delenv(RUN_ENV, raising=False)
+        verifier.verify_equals(namespaced('a.png'), 'a.png')
+        monkeypatch.setenv(RUN_ENV, 'r1f')
+        verifier.verify_equals(namespaced('a.png'), 'r1f-a.png')
+
+    def test_worker_count(self, monkeypatch):
+        monkeypatch.delenv(WORKERS_ENV, raising=False)
+        verifier.verify_equals(worker_count(), 1)
+        monkeypatch.setenv(WORKERS_ENV, '4')
+        verifier.verify_equals(worker_count(), 4)
+
+    def test_merge_junitxml(self, tmpdir):
+        paths = []
+        for i, failures in enumerate((0, 1)):
+            path = tmpdir.join('worker-w{i}.xml'.format(i=i))
+            path.write('<testsuite errors="0" failures="{f}" skips="1" '
+                       'tests="2" time="1.0"><testcase name="t{i}a"/>'
+                       '<testcase name="t{i}b"/></testsuite>'.format(
+                           f=failures, i=i))
+            paths.append(str(path))
+        suite = merge_junitxml(paths)
+        verifier.verify_equals([suite.get('tests'), suite.get('failures'),
+                                suite.get('skips')], ['4', '1', '2'])
+        verifier.verify_equals([case.get('name') for case in suite],
+                               ['t0a', 't0b', 't1a', 't1b'])
@@ -0,0 +1,91 @@
+from testingframework.connector.pool import ConnectionPool, PoolTimeout
+from slacktest.util.VerifierBase import VerifierBase
+import threading
+import time
+import pytest
+
+verifier = VerifierBase()
+HOST = 'https://slack.com'
+
+
+class FakeConn(object):
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeHttp(object):
+    '''
+    Stands in for httplib2.Http, holding one connection per host.
+    '''
+    def __init__(self):
+        self.connections = {'https:slack.com': FakeConn()}
+
+
+class TestConnectionPool(object):
+
+    def test_idle_connection_is_reused(self):
+        pool = ConnectionPool(FakeHttp, max_connections=2, max_idle=2)
+        first = pool.checkout(HOST)
+        pool.checkin(HOST, first)
+        verifier.verify_true(pool.checkout(HOST) is first)
+        verifier.verify_equals(pool.stats()['created'], 1)
+        verifier.verify_equals(pool.stats()['reused'], 1)
+
+    def test_checkout_blocks_at_max_connections(self):
+        pool = ConnectionPool(FakeHttp, max_connections=1)
+        held = pool.checkout(HOST)
+        with pytest.raises(PoolTimeout):
+            pool.checkout(HOST, timeout=0.05)
+        released = []
+
+        def release():
+            time.sleep(0.05)
+            released.append(True)
+            pool.checkin(HOST, held)
+        threading.Thread(target=release).start()
+        verifier.verify_true(pool.checkout(HOST, timeout=5) is held)
+        verifier.verify_true(released)
+
+    def test_hosts_are_limited_separately(self):
+        pool = ConnectionPool(FakeHttp, max_connections=1)
+        pool.checkout(HOST)
+        other = pool.checkout('https://files.slack.com', timeout=0.05)
+        verifier.verify_true(other is not None)
+
+    def test_max_idle_closes_surplus(self):
+        pool = ConnectionPool(FakeHttp, max_connections=3, max_idle=1)
+        conns = [pool.checkout(HOST) for _ in range(3)]
+        for conn in conns:
+            pool.checkin(HOST, conn)
+        verifier.verify_equals(pool.stats()['idle'], 1)
+        closed = [c for c in conns if c.connections == {}]
+        verifier.verify_equals(len(closed), 2)
+
+    def test_idle_eviction(self):
+        pool = ConnectionPool(FakeHttp, idle_timeout=0)
+        conn = pool.checkout(HOST)
+        pool.checkin(HOST, conn)
+        time.sleep(0.01)
+        pool.evict_idle()
+        verifier.verify_equals(pool.stats()['idle'], 0)
+        verifier.verify_equals(conn.connections, {})
+
+    def test_failed_request_discards_connection(self):
+        pool = ConnectionPool(FakeHttp)
+        with pytest.raises(IOError):
+            with pool.connection(HOST) as conn:
+                raise IOError('connection reset')
+        verifier.verify_equals(pool.stats()['idle'], 0)
+        verifier.verify_equals(pool.stats()['in_use'], 0)
+        verifier.verify_equals(conn.connections, {})
+
+    def test_clear_closes_checked_out_on_return(self):
+        pool = ConnectionPool(FakeHttp)
+        conn = pool.checkout(HOST)
+        pool.clear()
+        pool.checkin(HOST, conn)
+        verifier.verify_equals(pool.stats()['idle'], 0)
+        verifier.verify_equals(conn.connections, {})
@@ -0,0 +1,101 @@
+from testingframework.connector import response as response_module
+from testingframework.connector.response import RESTResponse, extract_keys
+from slacktest.util.VerifierBase import VerifierBase
+import httplib2
+import json
+import pytest
+
+verifier = VerifierBase()
+
+CONTENT = json.dumps({
+    'files': [{'id': 'F1', 'name': 'a "quoted" {brace} [x].txt',
+               'thumbs': {'thumb_64': 'http://x/y'}}],
+    'paging': {'count': 100, 'pages': 3},
+    'note': 'escaped \\" end',
+    'ok': True,
+    'total': -12.5e3,
+})
+# slack sends "ok" first
+OK_FIRST = '{"ok": true, "warning": "superfluous_charset", "files": [{}]}'
+
+
+class CountingDecoder(object):
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, content):
+        self.calls += 1
+        return json.loads(content)
+
+
+class TestRESTResponse(object):
+
+    def test_unpacks_like_a_tuple(self):
+        response = httplib2.Response({'status': '200'})
+        result = RESTResponse(response, CONTENT)
+        resp, cont = result
+        verifier.verify_true(resp is response)
+        verifier.verify_equals(cont, CONTENT)
+        verifier.verify_equals(result[1], CONTENT)
+
+    def test_json_decoded_once(self):
+        decoder = CountingDecoder()
+        result = RESTResponse(httplib2.Response({'status': '200'}), OK_FIRST,
+                              decoder=decoder)
+        verifier.verify_true(result.ok)
+        verifier.verify_equals(result.get('warning'), 'superfluous_charset')
+        verifier.verify_equals(decoder.calls, 0)
+        verifier.verify_equals(result.json['files'], [{}])
+        verifier.verify_true(result.json is result.json)
+        verifier.verify_equals(result.error, None)
+        verifier.verify_equals(decoder.calls, 1)
+
+    def test_nested_value_is_decoded_not_skipped(self):
+        decoder = CountingDecoder()
+        result = RESTResponse(httplib2.Response({'status': '200'}),
+                              '{"files": [{"id": "F1"}], "ok": true}',
+                              decoder=decoder)
+        verifier.verify_true(result.ok)
+        verifier.verify_equals(decoder.calls, 1)
+        verifier.verify_equals(result.error, None)
+        verifier.verify_equals(result.json['files'][0]['id'], 'F1')
+        verifier.verify_equals(decoder.calls, 1)
+
+    def test_extracted_keys_are_memoized(self, monkeypatch):
+        scans = []
+
+        def counting_extract(content, keys, decode=None):
+            scans.append(sorted(keys))
+            return extract_keys(content, keys, decode)
+        monkeypatch.setattr(response_module, 'extract_keys',
+                            counting_extract)
+        result = RESTResponse(httplib2.Response({'status': '200'}),
+                              '{"ok": false, "error": "file_not_found"}')
+        for _ in range(3):
+            if not result.ok:
+                verifier.verify_equals(result.error, 'file_not_found')
+        verifier.verify_equals(result.get('missing', 'default'), 'default')
+        verifier.verify_equals(result.get('missing'), None)
+        verifier.verify_equals(scans, [['ok'], ['error'], ['missing']])
+
+    def test_json_decoded_once_out_of_order(self):
+        decoder = CountingDecoder()
+        result = RESTResponse(httplib2.Response({'status': '200'}), CONTENT,
+                              decoder=decoder)
+        verifier.verify_true(result.ok)
+        verifier.verify_equals(result.json['paging']['pages'], 3)
+        verifier.verify_true(result.json is result.json)
+        verifier.verify_equals(result.get('total'), -12500)
+        verifier.verify_equals(decoder.calls, 1)
+
+    def test_extract_skips_nested_values(self):
+        verifier.verify_equals(
+            extract_keys(CONTENT, ['ok', 'total', 'missing']),
+            {'ok': True, 'total': -12500})
+        verifier.verify_equals(extract_keys(CONTENT, ['note']),
+                               {'note': 'escaped \\" end'})
+        verifier.verify_equals(extract_keys('{"ok": false, "error": "x"',
+                                            ['ok']), {'ok': False})
+        with pytest.raises(ValueError):
+            extract_keys('[1, 2]', ['ok'])
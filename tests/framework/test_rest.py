@@ -0,0 +1,46 @@
+from testingframework.connector.base import Connector
+from slacktest.util.VerifierBase import VerifierBase
+import json
+import pytest
+
+verifier = VerifierBase()
+
+
+class EchoAPI(object):
+    '''
+    Local stand-in that answers with the headers it received.
+    '''
+
+    def handle(self, request):
+        return 200, dict(request.headers.items())
+
+
+@pytest.fixture
+def slack(local_slack):
+    return local_slack(EchoAPI())
+
+
+class TestHeaders(object):
+
+    def test_headers_are_per_connector(self, slack):
+        first = slack.create_connector(Connector.REST, test_token='first')
+        second = slack.create_connector(Connector.REST, test_token='second')
+        first.update_headers('Content-Type', 'multipart/form-data')
+        verifier.verify_equals(first.headers['content-type'],
+                               'multipart/form-data')
+        verifier.verify_equals(second.headers['content-type'],
+                               'text/xml; charset=utf-8')
+        echoed = second.make_request('GET', 'api/api.test').json
+        verifier.verify_equals(echoed['content-type'],
+                               'text/xml; charset=utf-8')
+
+    def test_request_headers_leave_connector_alone(self, slack):
+        conn = slack.create_connector(Connector.REST, test_token='token')
+        before = conn.headers
+        results = conn.make_requests(
+            [{'method': 'GET', 'uri': 'api/api.test',
+              'headers': {'X-Worker': str(i)}} for i in range(20)])
+        verifier.verify_equals(
+            [json.loads(r.content)['x-worker']
+             for r in results], [str(i) for i in range(20)])
+        verifier.verify_equals(conn.headers, before)
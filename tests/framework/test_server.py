@@ -0,0 +1,142 @@
+from testingframework.connector.base import Connector
+from slacktest.server.standin import StandInAPI
+from slacktest.util.files_api import FilesAPI, SlackAPIError
+from slacktest.util.chunked_upload import ChunkedUpload
+from slacktest.util.VerifierBase import VerifierBase
+from testingframework.util.fileview import FileView
+import json
+import os
+import pytest
+
+verifier = VerifierBase()
+
+
+@pytest.fixture
+def standin():
+    return StandInAPI(list_size=3)
+
+
+@pytest.fixture
+def restconn(standin, local_slack):
+    slack = local_slack(standin)
+    return slack.create_connector(Connector.REST, test_token='token')
+
+
+class TestStandIn(object):
+
+    def test_list_and_delete(self, restconn):
+        listed = restconn.make_request('GET', 'api/files.list',
+                                       urlparam={'token': 'token'})
+        verifier.verify_equals(listed.status, 200)
+        verifier.verify_equals(len(listed.json['files']), 3)
+        deleted = restconn.make_request('POST', 'api/files.delete',
+                                        urlparam={'file': 'F00000000'})
+        verifier.verify_true(deleted.ok)
+
+    def test_upload_body_is_drained(self, restconn, standin, tmpdir):
+        path = tmpdir.join('payload.bin')
+        path.write('x' * 100000)
+        files = FilesAPI(restconn, 'token', api_uri='api/')
+        for _ in range(3):
+            verifier.verify_equals(files.upload(str(path))['id'],
+                                   'F00000000')
+        # the connection is kept alive across the uploads
+        verifier.verify_true(standin.received > 3 * 100000)
+        verifier.verify_equals(restconn.make_request(
+            'GET', 'api/files.list').status, 200)
+
+    def test_unknown_method(self, restconn):
+        response = restconn.make_request('GET', 'api/chat.postMessage')
+        verifier.verify_equals(response.status, 404)
+        verifier.verify_equals(response.error, 'unknown_method')
+
+
+@pytest.fixture
+def files(fake_deployment, fake_workspace):
+    restconn = fake_deployment.create_connector(Connector.REST,
+                                                test_token='token')
+    return FilesAPI(restconn, fake_workspace.token, api_uri='api/')
+
+
+class TestFakeSlack(object):
+
+    def test_upload_list_delete(self, files, fake_workspace, tmpdir):
+        path = tmpdir.join('Logo.png')
+        path.write('\x89PNG' + 'x' * 5000, mode='wb')
+        image = files.upload(str(path), title='logo')
+        snippet = files.upload(content='hello', filename='notes.txt')
+        verifier.verify_equals(image['size'], 5004)
+        verifier.verify_true('logo_64.png' in image['thumb_64'])
+        verifier.verify_equals(snippet['filetype'], 'text')
+        verifier.verify_equals(fake_workspace.contents[snippet['id']],
+                               'hello')
+        verifier.verify_equals([f['id'] for f in files.iter_files()],
+                               [snippet['id'], image['id']])
+        verifier.verify_equals(
+            [f['id'] for f in files.iter_files(types='images')],
+            [image['id']])
+        files.delete(image['id'])
+        with pytest.raises(SlackAPIError) as err:
+            files.delete(image['id'])
+        verifier.verify_equals(err.value.error, 'file_not_found')
+        verifier.verify_equals(len(fake_workspace.files), 1)
+
+    def test_upload_file_view(self, files, fake_workspace, tmpdir):
+        path = tmpdir.join('report.pdf')
+        data = '%PDF-1.4\r\n\x00\xff' * 1000
+        path.write(data, mode='wb')
+        with FileView(str(path), threshold=1) as view:
+            record = files.upload(view)
+        verifier.verify_equals(record['name'], 'report.pdf')
+        verifier.verify_true(fake_workspace.contents[record['id']] == data,
+                             'uploaded content differs')
+
+    def test_chunked_upload(self, files, fake_workspace, tmpdir):
+        path = tmpdir.join('big.bin')
+        data = os.urandom(10 * 1024 + 7)
+        path.write(data, mode='wb')
+        upload = ChunkedUpload(files._connector, 'api/files.uploadChunk',
+                               str(path), chunk_size=1024,
+                               journal_path=str(tmpdir.join('journal')),
+                               urlparam={'token': fake_workspace.token},
+                               complete_uri='api/files.uploadDone')
+        response, content = upload.run()
+        record = json.loads(content)['file']
+        verifier.verify_equals(record['name'], 'big.bin')
+        verifier.verify_true(fake_workspace.contents[record['id']] == data,
+                             'reassembled upload differs')
+        verifier.verify_equals(fake_workspace.chunks, {})
+
+    def test_paging(self, files):
+        for i in range(5):
+            files.upload(content=str(i), filename='{i}.txt'.format(i=i))
+        page = files.list_page(page=2, count=2)
+        verifier.verify_equals(page['paging'], {'count': 2, 'total': 5,
+                                                'page': 2, 'pages': 3})
+        verifier.verify_equals([f['name'] for f in page['files']],
+                               ['2.txt', '1.txt'])
+        verifier.verify_equals(len(list(files.iter_files(count=2))), 5)
+
+    def test_workspaces_are_isolated(self, files, fake_slack):
+        files.upload(content='mine', filename='mine.txt')
+        other = fake_slack.api.create_workspace()
+        verifier.verify_equals(len(other.files), 0)
+        fake_slack.api.remove_workspace(other.token)
+
+    def test_add_file_seeds_workspace(self, files, fake_slack,
+                                      fake_workspace):
+        record = fake_slack.api.add_file(fake_workspace.token, 'seed.png',
+                                         'png')
+        verifier.verify_true('thumb_64' in record)
+        verifier.verify_equals([f['id'] for f in files.iter_files()],
+                               [record['id']])
+
+    def test_auth_errors(self, files, fake_slack, fake_workspace):
+        bad = FilesAPI(files._connector, 'xoxp-unknown', api_uri='api/')
+        with pytest.raises(SlackAPIError) as err:
+            bad.list_page()
+        verifier.verify_equals(err.value.error, 'invalid_auth')
+        fake_slack.api.revoke(fake_workspace.token)
+        with pytest.raises(SlackAPIError) as err:
+            files.upload(content='x')
+        verifier.verify_equals(err.value.error, 'token_revoked')
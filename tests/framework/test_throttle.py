@@ -0,0 +1,75 @@
+from testingframework.connector.base import Connector
+from testingframework.connector.throttle import TokenBucket, \
+    RequestScheduler, parse_retry_after, worker_share
+from testingframework.parallel import WORKERS_ENV
+from slacktest.util.VerifierBase import VerifierBase
+import pytest
+
+verifier = VerifierBase()
+
+
+class RateLimitedAPI(object):
+    '''
+    Local stand-in that answers 429 to the first requests it gets.
+    '''
+
+    def __init__(self, limited):
+        self.requests, self.limited = 0, limited
+
+    def handle(self, request):
+        self.requests += 1
+        if self.requests <= self.limited:
+            return 429, {'ok': False, 'error': 'ratelimited'}, \
+                {'Retry-After': '0.1'}
+        return 200, {'ok': True}
+
+
+@pytest.fixture
+def restconn(local_slack):
+    slack = local_slack(RateLimitedAPI(limited=2))
+    return slack.create_connector(Connector.REST, test_token='token')
+
+
+class TestTokenBucket(object):
+
+    def test_empty_bucket_queues_callers(self):
+        now = [100.0]
+        bucket = TokenBucket(2.0, 2, clock=lambda: now[0])
+        delays = [bucket.reserve() for _ in range(5)]
+        verifier.verify_equals(delays, [0, 0, 0.5, 1.0, 1.5])
+        now[0] += 10
+        verifier.verify_equals(bucket.reserve(), 0)
+
+    def test_pause_delays_next_token(self):
+        now = [100.0]
+        bucket = TokenBucket(None, 1, clock=lambda: now[0])
+        verifier.verify_equals(bucket.reserve(), 0)
+        bucket.pause(3)
+        verifier.verify_equals(bucket.reserve(), 3)
+        now[0] += 3
+        verifier.verify_equals(bucket.reserve(), 0)
+
+    def test_parse_retry_after(self):
+        verifier.verify_equals(parse_retry_after('30'), 30)
+        verifier.verify_equals(parse_retry_after(None), 1)
+        verifier.verify_equals(
+            parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0)
+
+    def test_workers_share_rate_limits(self, monkeypatch):
+        verifier.verify_equals(worker_share({'files.list': 50}, 4),
+                               {'files.list': 12.5})
+        monkeypatch.setenv(WORKERS_ENV, '5')
+        scheduler = RequestScheduler()
+        verifier.verify_equals(scheduler._bucket('files.upload').rate,
+                               4 / 60.0)
+
+
+class TestThrottledRequests(object):
+
+    def test_429_is_retried_after_pause(self, restconn):
+        response, content = restconn.make_request('GET', 'api/files.list')
+        verifier.verify_equals(response.status, 200)
+        stats = restconn.scheduler.stats()['files.list']
+        verifier.verify_equals(stats['requests'], 3)
+        verifier.verify_equals(stats['rate_limited'], 2)
+        verifier.verify_true(stats['retry_after_seconds'] >= 0.2)
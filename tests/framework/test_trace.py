@@ -0,0 +1,49 @@
+from testingframework.connector.trace import RequestTracer
+from slacktest.util.multipart_formdata import encode_multipart_formdata_stream
+from slacktest.util.VerifierBase import VerifierBase
+import logging
+
+verifier = VerifierBase()
+
+
+class RecordingLogger(logging.Logger):
+
+    def __init__(self, level):
+        logging.Logger.__init__(self, 'trace', level)
+        self.messages = []
+
+    def handle(self, record):
+        self.messages.append(record.getMessage())
+
+
+class TestRequestTracer(object):
+
+    def test_off_level_is_not_sampled(self):
+        tracer = RequestTracer(RecordingLogger(logging.WARN))
+        verifier.verify_false(tracer.sample())
+        # traces are DEBUG by default, a logger at INFO skips them
+        tracer = RequestTracer(RecordingLogger(logging.INFO))
+        verifier.verify_false(tracer.sample())
+
+    def test_sampling(self):
+        tracer = RequestTracer(RecordingLogger(logging.DEBUG), sample=3)
+        verifier.verify_equals([tracer.sample() for _ in range(6)],
+                               [True, False, False, True, False, False])
+
+    def test_bodies_and_redaction(self, tmpdir):
+        logger = RecordingLogger(logging.DEBUG)
+        tracer = RequestTracer(logger, max_body=20)
+        path = tmpdir.join('upload.bin')
+        path.write('x' * 5000)
+        content_type, body = encode_multipart_formdata_stream(
+            [], [('file', 'upload.bin', str(path))])
+        tracer.request('POST', 'http://h/api/files.upload?token=xoxp-1&a=b',
+                       {'Authorization': 'Slack s3cret'}, body)
+        verifier.verify_false('xoxp-1' in logger.messages[0])
+        verifier.verify_false('s3cret' in logger.messages[0])
+        verifier.verify_true('<streamed body of %d bytes>' % len(body)
+                             in logger.messages[0])
+        verifier.verify_equals(tracer.summarize('token=abc&content=' + 'y' * 50),
+                               'token=<redacted>&content=yy... <68 bytes>')
+        tracer.digest = True
+        verifier.verify_true(tracer.summarize('abc').startswith('<sha1 a9993e'))
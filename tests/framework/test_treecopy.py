@@ -0,0 +1,91 @@
+from testingframework.util.treecopy import TreeCopy
+from testingframework.util.fileutils import FileUtils
+from slacktest.util.VerifierBase import VerifierBase
+import os
+import shutil
+import stat
+import pytest
+
+verifier = VerifierBase()
+
+
+def _tree(root):
+    '''
+    Maps the relative path of every file below root to its content.
+    '''
+    files = {}
+    for directory, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(directory, name)
+            with open(path, 'rb') as fp:
+                files[os.path.relpath(path, root)] = fp.read()
+    return files
+
+
+class TestTreeCopy(object):
+
+    def _source(self, tmpdir):
+        source = tmpdir.join('source')
+        source.join('a', 'b').ensure(dir=True)
+        source.join('big').write(os.urandom(3 * 1024 * 1024), mode='wb')
+        source.join('a', 'b', 'small.txt').write('small')
+        source.join('a', 'empty').write('')
+        source.join('a', 'skip.pyc').write('compiled')
+        source.join('cache').ensure(dir=True)
+        source.join('cache', 'entry').write('cached')
+        return source
+
+    def test_copy(self, tmpdir):
+        source = self._source(tmpdir)
+        os.chmod(str(source.join('a', 'b', 'small.txt')), 0750)
+        target = tmpdir.join('target')
+        stats = TreeCopy(workers=3).run(str(source), str(target))
+        verifier.verify_equals(_tree(str(target)), _tree(str(source)))
+        verifier.verify_equals(stats.files, 5)
+        verifier.verify_equals(stats.directories, 4)
+        verifier.verify_equals(stats.bytes, 3 * 1024 * 1024 + 19)
+        verifier.verify_true(stats.files_per_second > 0)
+        mode = os.stat(str(target.join('a', 'b', 'small.txt'))).st_mode
+        verifier.verify_equals(stat.S_IMODE(mode), 0750)
+
+    def test_ignore(self, tmpdir):
+        source = self._source(tmpdir)
+        target = tmpdir.join('target')
+        stats = FileUtils().copy_directory(str(source), str(target),
+                                           ignore=[r'\.pyc$', r'cache$'])
+        copied = _tree(str(target))
+        verifier.verify_equals(sorted(copied),
+                               sorted(['big', os.path.join('a', 'empty'),
+                                       os.path.join('a', 'b', 'small.txt')]))
+        verifier.verify_equals(stats.skipped, 2)
+
+    def test_force_overwrites_read_only(self, tmpdir):
+        source = self._source(tmpdir)
+        target = tmpdir.join('target')
+        target.join('a').ensure(dir=True)
+        existing = target.join('a', 'empty')
+        existing.write('old')
+        os.chmod(str(existing), 0444)
+        os.utime(str(source.join('big')), (1000000000, 1000000000))
+        FileUtils().force_copy_directory(str(source), str(target))
+        verifier.verify_equals(_tree(str(target)), _tree(str(source)))
+        verifier.verify_equals(os.stat(str(target.join('big'))).st_mtime,
+                               1000000000)
+
+    def test_error_stops_copy(self, tmpdir):
+        source = self._source(tmpdir)
+        target = tmpdir.join('target')
+        # a directory where the file goes
+        target.join('big').ensure(dir=True)
+        with pytest.raises(IOError):
+            TreeCopy().run(str(source), str(target))
+
+    def test_special_files(self, tmpdir):
+        source = self._source(tmpdir)
+        os.mkfifo(str(source.join('a', 'pipe')))
+        with pytest.raises(shutil.SpecialFileError):
+            TreeCopy().run(str(source), str(tmpdir.join('target')))
+        os.remove(str(source.join('a', 'pipe')))
+        os.symlink(str(tmpdir.join('missing')), str(source.join('broken')))
+        with pytest.raises(shutil.SpecialFileError):
+            TreeCopy().run(str(source), str(tmpdir.join('target')))
@@ -0,0 +1,93 @@
+from testingframework.util.treeremove import TreeRemove, remove_file, \
+    _retry_denied
+from testingframework.util.fileutils import FileUtils
+from slacktest.util.VerifierBase import VerifierBase
+import errno
+import os
+import stat
+
+verifier = VerifierBase()
+
+
+class TestTreeRemove(object):
+
+    def _tree(self, tmpdir, name='tree'):
+        root = tmpdir.join(name)
+        for directory in ('a', 'a/b', 'a/b/c', 'd'):
+            root.join(directory).ensure(dir=True)
+            for index in range(10):
+                root.join(directory, 'f%d' % index).write('data')
+        return root
+
+    def test_remove(self, tmpdir):
+        root = self._tree(tmpdir)
+        stats = TreeRemove(workers=3, batch_size=4).run(str(root))
+        verifier.verify_false(root.check())
+        verifier.verify_equals(stats.files, 40)
+        verifier.verify_equals(stats.directories, 5)
+        verifier.verify_equals(stats.chmods, 0)
+        verifier.verify_true(stats.files_per_second > 0)
+
+    def test_links_are_not_followed(self, tmpdir):
+        root = self._tree(tmpdir)
+        kept = tmpdir.join('kept').ensure(dir=True)
+        kept.join('file').write('keep me')
+        os.symlink(str(kept), str(root.join('a', 'link')))
+        os.symlink(str(tmpdir.join('missing')), str(root.join('broken')))
+        TreeRemove().run(str(root))
+        verifier.verify_false(root.check())
+        verifier.verify_equals(kept.join('file').read(), 'keep me')
+
+    def test_read_only(self, tmpdir):
+        root = self._tree(tmpdir)
+        read_only = root.join('a', 'b')
+        for name in os.listdir(str(read_only)):
+            os.chmod(str(read_only.join(name)), 0444)
+        os.chmod(str(read_only), 0555)
+        FileUtils().force_remove_directory(str(root))
+        verifier.verify_false(root.check())
+
+    def test_remove_file(self, tmpdir):
+        file_ = tmpdir.join('file')
+        file_.write('data')
+        os.chmod(str(file_), 0444)
+        remove_file(str(file_))
+        verifier.verify_false(file_.check())
+
+    def test_denied_removal_restores_directory(self, tmpdir):
+        directory = tmpdir.join('dir').ensure(dir=True)
+        file_ = directory.join('file')
+        file_.write('data')
+        os.chmod(str(file_), 0444)
+        os.chmod(str(directory), 0555)
+        modes = []
+
+        # root is never denied, the first try is made to fail instead
+        def remove(path):
+            if not modes:
+                modes.append(None)
+                raise OSError(errno.EACCES, 'denied', path)
+            modes.append((stat.S_IMODE(os.stat(str(directory)).st_mode),
+                          stat.S_IMODE(os.stat(path).st_mode)))
+            os.remove(path)
+
+        verifier.verify_true(_retry_denied(remove, str(file_)))
+        verifier.verify_false(file_.check())
+        # only the owner was given write permission, and only meanwhile
+        verifier.verify_equals(modes[1], (0755, 0644))
+        verifier.verify_equals(
+            stat.S_IMODE(os.stat(str(directory)).st_mode), 0555)
+
+    def test_background(self, tmpdir):
+        root = self._tree(tmpdir)
+        thread = FileUtils().force_remove_directory(str(root),
+                                                    background=True)
+        # the path is free at once
+        verifier.verify_false(root.check())
+        root.ensure(dir=True)
+        thread.join()
+        verifier.verify_equals(os.listdir(str(tmpdir)), ['tree'])
+
+    def test_missing(self, tmpdir):
+        verifier.verify_equals(
+            FileUtils().force_remove_directory(str(tmpdir.join('no'))), None)
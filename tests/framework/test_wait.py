@@ -0,0 +1,60 @@
+from testingframework.util.wait import wait_until, WaitStats
+from testingframework.exceptions.wait import WaitTimedOut
+from slacktest.util.VerifierBase import VerifierBase
+from ssl import SSLError
+import pytest
+
+verifier = VerifierBase()
+
+
+class Countdown(object):
+    '''
+    A predicate that becomes true after a number of calls.
+    '''
+    def __init__(self, calls, error=None):
+        self.calls = calls
+        self.error = error
+
+    def __call__(self):
+        self.calls -= 1
+        if self.calls > 0 and self.error:
+            raise self.error
+        return self.calls <= 0
+
+
+class TestWaitUntil(object):
+
+    def test_backoff_is_capped(self):
+        sleeps = []
+        stats = WaitStats()
+        wait_until(Countdown(7), interval=0.2, max_interval=1, jitter=0,
+                   sleep=sleeps.append, stats=stats, description='cap')
+        verifier.verify_equals(sleeps, [0.2, 0.4, 0.8, 1, 1, 1])
+        verifier.verify_equals(stats.records('cap')[0][1:], (7, True))
+
+    def test_jitter_stays_within_interval(self):
+        sleeps = []
+        wait_until(Countdown(20), interval=1, backoff=1, jitter=0.5,
+                   sleep=sleeps.append, stats=WaitStats())
+        verifier.verify_true(all(0.5 <= s <= 1 for s in sleeps))
+
+    def test_retry_on_exceptions(self):
+        sleeps = []
+        wait_until(Countdown(3, SSLError('reset')), retry_on=(SSLError,),
+                   sleep=sleeps.append, stats=WaitStats())
+        verifier.verify_equals(len(sleeps), 2)
+        with pytest.raises(ValueError):
+            wait_until(Countdown(3, ValueError('bug')), retry_on=(SSLError,),
+                       sleep=sleeps.append, stats=WaitStats())
+
+    def test_timeout_reports_elapsed_time(self):
+        stats = WaitStats()
+        with pytest.raises(WaitTimedOut) as info:
+            wait_until(Countdown(10 ** 6, AssertionError('missing')),
+                       deadline=0.05, interval=0.01,
+                       retry_on=(AssertionError,), description='slow',
+                       stats=stats)
+        verifier.verify_true(info.value.seconds_waited >= 0.05)
+        verifier.verify_true(isinstance(info.value.last_error, AssertionError))
+        summary = stats.summary()['slow']
+        verifier.verify_equals(summary['timeouts'], 1)
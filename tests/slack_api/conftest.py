@@ -1,5 +1,6 @@
 import time
 import os
+import random
 import platform
 import pytest
 import os
@@ -11,9 +12,13 @@ import subprocess
 from testingframework.slack.base import Slack
 from testingframework.slack.aws import AWSSlack
 from testingframework.connector.base import Connector
+from testingframework.connector.cassette import Cassette
+from testingframework.parallel import namespaced
 from testingframework.log import Logging
 
 LOGGER = Logging().logger
+DATA_FILES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                          '..', 'data', 'files')
 
 
 @pytest.fixture(scope="session")
@@ -30,8 +35,62 @@ def remote_slack(request):
             ''
     remote_slack= AWSSlack(slack_base_url)
     remote_slack.set_test_token_to_use(test_token)
+    if _fake_slack(request):
+        # every test gets a workspace of its own, see slack_workspace
+        server = request.getfuncargvalue('fake_slack')
+        remote_slack.uri_base = lambda: server.uri_base
     return remote_slack
 
+@pytest.fixture(autouse=True)
+def slack_workspace(request, remote_slack):
+    '''
+    With --fake_slack, points the test token at a new workspace of the
+    fake for the duration of the test. The workspace is empty, but for the
+    file of a test case marked 'existing', which it expects an earlier test
+    to have uploaded.
+    '''
+    if not _fake_slack(request):
+        return None
+    workspace = request.getfuncargvalue('fake_workspace')
+    funcargs = getattr(getattr(request.node, 'callspec', None),
+                       'funcargs', {})
+    if funcargs.get('existing'):
+        _seed(request.getfuncargvalue('fake_slack').api, workspace,
+              funcargs['filename'])
+    test_token = remote_slack.test_token
+    remote_slack.set_test_token_to_use(workspace.token)
+    request.addfinalizer(
+        lambda: remote_slack.set_test_token_to_use(test_token))
+    return workspace
+
+def _seed(api, workspace, filename):
+    '''
+    Adds a file to a fake workspace, with the content of the data file of
+    that name if there is one.
+    '''
+    path = os.path.join(DATA_FILES, filename)
+    if os.path.isfile(path):
+        with open(path, 'rb') as fp:
+            api.add_file(workspace.token, namespaced(filename), fp.read())
+    else:
+        api.add_file(workspace.token, namespaced(filename), filename,
+                     mode='snippet')
+
+@pytest.fixture(autouse=True)
+def cassette_random(request):
+    '''
+    With --cassette, seeds random per test so that the random names tests
+    make up are the same when recording and when replaying.
+    '''
+    if _cassette_path(request):
+        random.seed(request.node.nodeid)
+
+def _cassette_path(request):
+    return getattr(request.config.option, 'cassette', '')
+
+def _fake_slack(request):
+    return getattr(request.config.option, 'fake_slack', False)
+
 @pytest.fixture(scope="session")
 def connector_slack(request, remote_slack):
     '''
@@ -47,14 +106,29 @@ def connector_slack(request, remote_slack):
             ''
 
     xstr = lambda s: s is not '' and s or None
-    if(xstr(slack_base_url) != '' and xstr(test_token) != ''):
+    if(_fake_slack(request) or _cassette_path(request) or
+       xstr(slack_base_url) != '' and xstr(test_token) != ''):
         remote_slack.create_logged_in_connector(contype=Connector.REST,
                                                test_token=test_token)
 
     restconn = remote_slack.connector(Connector.REST, test_token)
     restconn.config = request.config
+    if _fake_slack(request):
+        # the fake has no rate limits to keep to
+        restconn.rate_limits({})
+    cassette = None
+    if _cassette_path(request):
+        cassette = Cassette(_cassette_path(request),
+                            mode=request.config.option.cassette_mode,
+                            strict=not request.config.option.cassette_lenient)
+        use_cassette = cassette.use(restconn)
+        use_cassette.__enter__()
 
     def fin():
+        if cassette is not None:
+            use_cassette.__exit__(None, None, None)
+            if cassette.replaying:
+                LOGGER.info("Cassette replayed:\n%s" % cassette.report())
         try:
             LOGGER.info("Teardown: removing remote slack connectors")
             remote_slack.remove_connector(Connector.REST, test_token)
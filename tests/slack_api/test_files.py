@@ -1,8 +1,12 @@
 from testingframework.connector.base import Connector
 from testingframework.log import Logging
 from testingframework.util.fileutils import FileUtils
+from testingframework.util.wait import wait_until
+from testingframework.exceptions.wait import WaitTimedOut
 from slacktest.util.VerifierBase import VerifierBase
-from slacktest.util.multipart_formdata import encode_multipart_formdata
+from slacktest.util.multipart_formdata import encode_multipart_formdata_stream
+from slacktest.util.files_api import FilesAPI, SlackAPIError
+from testingframework.parallel import namespaced
 import pytest
 import time
 import os
@@ -19,8 +23,8 @@ logging = Logging("TestFiles")
 LOGGER = logging.logger
 verifier = VerifierBase()
 fileutils = FileUtils()
-tries = 10
-time_to_wait = 10
+# max seconds to poll for a change to show up, polls back off from 0.2s to 10s
+wait_deadline = 100
 
 class TestFiles(object):
     '''
@@ -44,20 +48,21 @@ class TestFiles(object):
         LOGGER.info("Upload a PNG file located at data/files directory.")
         # upload a file in different format via REST
         path_to_file = os.path.abspath(os.path.join(os.path.abspath(os.path.curdir), '..', '..', 'data', 'files', filename))
-        content = fileutils.get_file_contents(path_to_file)
+        # Parallel workers upload under names of their own
+        filename = namespaced(filename)
         restconn = connector_slack
         # This is to get the correct content type as well as the HTTP body for multipart formdata
+        # The body streams the file from disk while it is being sent
         fields = []
-        files = [('file', filename, content)]
-        content_type, body = encode_multipart_formdata(fields, files)
-        restconn.update_headers('accept', '*/*')
-        restconn.update_headers('content-type', '%s' % content_type)
+        files = [('file', filename, path_to_file)]
+        content_type, body = encode_multipart_formdata_stream(fields, files)
+        headers = {'accept': '*/*', 'content-type': content_type}
         # This is to add the test token to access Slack APIs
         urlparams = {'token': remote_slack.test_token}
         # This is to actually issue the HTTP request to Slack's APIs
-        resp, cont = restconn.make_request("POST", slack_uri_upload, body=body, urlparam=urlparams)
-        verifier.verify_true(int(resp['status']) == 200)
-        cont_dic = json.loads(cont)
+        resp = restconn.make_request("POST", slack_uri_upload, body=body, urlparam=urlparams, headers=headers)
+        verifier.verify_true(resp.status == 200)
+        cont_dic = resp.json
         try:
             verifier.verify_true(cont_dic['ok'])
         except AssertionError as e:
@@ -70,27 +75,22 @@ class TestFiles(object):
         # the files.list result, consider using pooling
         # List only by type:images when calling the endpoint
         urlparams.update({'types':'images'})
-        for i in range(tries):
-            try:
-                resp, cont = restconn.make_request("GET", slack_uri_list, urlparam=urlparams)
-                cont_dict = json.loads(cont)
-                thumbs_dic = cont_dic['file']
-                for j in thumbs_dic.keys():
-                    # Matching thumbnail URLs
-                    # thumbnail URLs appear to be the filename in lowercase
-                    if(re.match('thumb_[\d]+$', str(j))):
-                        verifier.verify_true(filename.lower().split('.')[0] in str(thumbs_dic[j]))
-                break
-            except AssertionError as e:
-                if(i < tries - 1):
-                    time.sleep(time_to_wait)
-                else:
-                    raise type(e)("filename %s does not exist in files.list result." % filename)
-            except SSLError as e:
-                if(i < tries - 1):
-                    time.sleep(time_to_wait)
-                else:
-                    raise type(e)("Internet connection is still not there.")
+        def file_is_listed():
+            restconn.make_request("GET", slack_uri_list, urlparam=urlparams)
+            thumbs_dic = cont_dic['file']
+            for j in thumbs_dic.keys():
+                # Matching thumbnail URLs
+                # thumbnail URLs appear to be the filename in lowercase
+                if(re.match('thumb_[\d]+$', str(j))):
+                    verifier.verify_true(filename.lower().split('.')[0] in str(thumbs_dic[j]))
+            return True
+        try:
+            wait_until(file_is_listed, deadline=wait_deadline,
+                       retry_on=(AssertionError, SSLError), description='files.list shows upload')
+        except WaitTimedOut as e:
+            if isinstance(e.last_error, SSLError):
+                raise SSLError("Internet connection is still not there.")
+            raise AssertionError("filename %s does not exist in files.list result." % filename)
 
     @params([
         { 'slack_uri_list': 'slack.com/api/files.list', 
@@ -104,15 +104,15 @@ class TestFiles(object):
         This is to test upload through Content field, not File field
         '''
         LOGGER.info("Upload Content.")
+        filename = namespaced(filename)
         # upload a file defined in Content via REST
         restconn = connector_slack
-        # Update HTTP request headers
-        restconn.update_headers('accept', '*/*')
-        restconn.update_headers('content-type', 'application/json')
+        # HTTP request headers of the upload
+        headers = {'accept': '*/*', 'content-type': 'application/json'}
         urlparams = {'token': remote_slack.test_token, 'content': content, 'filename': filename}
-        resp, cont = restconn.make_request("POST", slack_uri_upload, urlparam=urlparams)
-        verifier.verify_true(int(resp['status']) == 200)
-        cont_dic = json.loads(cont)
+        resp = restconn.make_request("POST", slack_uri_upload, urlparam=urlparams, headers=headers)
+        verifier.verify_true(resp.status == 200)
+        cont_dic = resp.json
         try:
             verifier.verify_true(cont_dic['ok'])
         except AssertionError as e:
@@ -121,90 +121,80 @@ class TestFiles(object):
             elif(cont_dic['error'] == 'invalid_auth'):
                 raise type(e)("invalid auth")
         # Verify that files.list shows the file
-        for i in range(tries):
-            try:
-                resp, cont = restconn.make_request("GET", slack_uri_list, urlparam=urlparams)
-                verifier.verify_true(filename in cont)
-                break
-            except AssertionError as e:
-                if(i < tries - 1):
-                    time.sleep(time_to_wait)
-                else:
-                    raise type(e)("filename %s does not exist in files.list result." % filename)
+        def file_is_listed():
+            resp, cont = restconn.make_request("GET", slack_uri_list, urlparam=urlparams)
+            return verifier.verify_true(filename in cont)
+        try:
+            wait_until(file_is_listed, deadline=wait_deadline,
+                       retry_on=(AssertionError,), description='files.list shows content upload')
+        except WaitTimedOut:
+            raise AssertionError("filename %s does not exist in files.list result." % filename)
 
     @params([
         { 'slack_uri_list': 'slack.com/api/files.list', 
             'slack_uri_delete': 'slack.com/api/files.delete', 
-            'filename': 'slack_api_test.png', 
+            'filename': 'slack_api_test.png', 'existing': True,
             'testname': 'delete PNG file' },
         { 'slack_uri_list': 'slack.com/api/files.list', 
             'slack_uri_delete': 'slack.com/api/files.delete', 
-            'filename': 'content.txt', 
+            'filename': 'content.txt', 'existing': True,
             'testname': 'delete file uploaded through Content' },
         { 'slack_uri_list': 'slack.com/api/files.list', 
             'slack_uri_delete': 'slack.com/api/files.delete', 
-            'filename': 'nonexistence.txt', 
+            'filename': 'nonexistence.txt', 'existing': False,
             'testname': 'delete nonexistent file' },
     ])
-    def test_files_delete(self, remote_slack, connector_slack, slack_uri_list, slack_uri_delete, filename, testname):
+    def test_files_delete(self, remote_slack, connector_slack, slack_uri_list, slack_uri_delete, filename, existing, testname):
         '''
         This is to test files.delete API, and both the PNG file and file uploaded through
-        Content field are deleted.
+        Content field are deleted. The existing files are the ones the upload tests upload.
         '''
         restconn = connector_slack
-        urlparams = {'token': remote_slack.test_token}
-        resp, cont = restconn.make_request("GET", slack_uri_list, urlparam=urlparams)
-        cont_dic = json.loads(cont)
+        filename = namespaced(filename)
+        # Walk all pages of files.list, the next page is fetched while the
+        # current one is searched and the walk stops at the first match
+        files_api = FilesAPI(restconn, remote_slack.test_token,
+                             api_uri=slack_uri_list[:-len('files.list')])
         try:
-            verifier.verify_true(cont_dic['ok'])
-        except AssertionError as e:
-            if(cont_dic['error'] == 'token_revoked'):
-                raise type(e)("test token is revoked")
-            elif(cont_dic['error'] == 'invalid_auth'):
-                raise type(e)("invalid auth")
-        files_list = cont_dic['files']
-        found = False
-        for file in files_list:
-            if(str(file['name']) == filename):
-                urlparams = {'token': remote_slack.test_token, 'file': str(file['id'])}
-                for i in range(tries):
-                    try:
-                        resp, cont = restconn.make_request("DELETE", slack_uri_delete, urlparam=urlparams)
-                        verifier.verify_true(int(resp['status']) == 200)
-                        cont_dic = json.loads(cont)
-                        verifier.verify_true(cont_dic['ok'])
-                        break
-                    except SSLError as e:
-                        if(i < tries - 1):
-                            time.sleep(time_to_wait)
-                        else:
-                            raise type(e)("Internet connection is still broken.")
-                # This is the normal path where the file to be deleted exists
-                for i in range(tries):
-                    try:
-                        resp, cont = restconn.make_request("GET", slack_uri_list, urlparam=urlparams)
-                        verifier.verify_false(filename in cont)
-                    except SSLError as e:
-                        if(i < tries - 1):
-                            time.sleep(time_to_wait)
-                        else:
-                            raise type(e)("Internet connection is still broken.")
-                found = True
-                break
-
-        if(not found):
+            match = next((file for file in files_api.iter_files()
+                          if str(file['name']) == filename), None)
+        except SlackAPIError as e:
+            if(e.error == 'token_revoked'):
+                raise AssertionError("test token is revoked")
+            elif(e.error == 'invalid_auth'):
+                raise AssertionError("invalid auth")
+            raise AssertionError(str(e))
+        if match is None and existing:
+            LOGGER.warn("%s was not uploaded, it is deleted as a nonexistent file." % filename)
+        if match is not None:
+            urlparams = {'token': remote_slack.test_token, 'file': str(match['id'])}
+            def file_is_deleted():
+                resp = restconn.make_request("DELETE", slack_uri_delete, urlparam=urlparams)
+                verifier.verify_true(resp.status == 200)
+                return verifier.verify_true(resp.ok)
+            self._wait_for_connection(file_is_deleted, 'files.delete')
+            # This is the normal path where the file to be deleted exists
+            def file_is_not_listed():
+                resp, cont = restconn.make_request("GET", slack_uri_list, urlparam=urlparams)
+                return verifier.verify_false(filename in cont)
+            self._wait_for_connection(file_is_not_listed, 'files.list after delete')
+        else:
             # Handle the non-existent file
             # Generate a alphanumeric string with length of 10
             thumb_id = ''.join(random.sample((string.ascii_uppercase+string.digits),10))
             urlparams = {'token': remote_slack.test_token, 'file': thumb_id}
-            for i in range(tries):
-                try:
-                    resp, cont = restconn.make_request("DELETE", slack_uri_delete, urlparam=urlparams)
-                    cont_dic = json.loads(cont)
-                    verifier.verify_true(str(cont_dic['error']) == "file_not_found")
-                    break
-                except SSLError as e:
-                    if(i < tries - 1):
-                        time.sleep(time_to_wait)
-                    else:
-                        raise type(e)("Internet connection is still broken.")
+            def file_is_not_found():
+                resp = restconn.make_request("DELETE", slack_uri_delete, urlparam=urlparams)
+                return verifier.verify_true(str(resp.error) == "file_not_found")
+            self._wait_for_connection(file_is_not_found, 'files.delete nonexistent')
+
+    def _wait_for_connection(self, request, description):
+        '''
+        Retries the request while the connection is broken (SSLError),
+        any other failure fails the test right away.
+        '''
+        try:
+            wait_until(request, deadline=wait_deadline, retry_on=(SSLError,),
+                       description=description)
+        except WaitTimedOut:
+            raise SSLError("Internet connection is still broken.")